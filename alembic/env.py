@@ -0,0 +1,53 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+import app.database.models  # noqa: F401  (registers every table on Base.metadata)
+from app.database.database import DATABASE_URL, Base, make_engine
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def _url() -> str:
+    return config.get_main_option("sqlalchemy.url") or DATABASE_URL
+
+
+def _configure(**kwargs) -> None:
+    # SQLite cannot ALTER most constraints in place; batch mode rebuilds the table
+    context.configure(target_metadata=target_metadata, render_as_batch=kwargs.pop("sqlite"), **kwargs)
+
+
+def run_migrations_offline() -> None:
+    _configure(url=_url(), literal_binds=True, dialect_opts={"paramstyle": "named"}, sqlite=_url().startswith("sqlite"))
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run(connection) -> None:
+    _configure(connection=connection, sqlite=connection.dialect.name == "sqlite")
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    # app.database.schema passes an open connection; the alembic CLI does not
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    engine = make_engine(_url())
+    try:
+        with engine.connect() as connection:
+            _run(connection)
+    finally:
+        engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,317 @@
+"""baseline schema
+
+Creates every table as of the Alembic switch-over. Databases created by the
+old import-time create_all are adopted in place: tables that already exist
+are skipped and market_prices is brought up to date, so `alembic upgrade
+head` works on fresh and existing databases alike.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 04:34:50.382175
+"""
+import json
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen as of this revision: the data steps below must keep doing what they
+# did here even after the models and app.services.market_data move on.
+ROLLUP_WINDOW = 10
+BATCH = 1000
+MARKET_PRICE_INDEXES = {
+    'ix_market_prices_crop': ['crop'],
+    'ix_market_prices_crop_key_id': ['crop_key', 'id'],
+    'ix_market_prices_crop_mandi_date': ['crop', 'mandi', 'date'],
+    'ix_market_prices_crop_mandi_id': ['crop', 'mandi', 'id'],
+    'ix_market_prices_mandi_id': ['mandi', 'id'],
+}
+
+market_prices = sa.table(
+    'market_prices',
+    sa.column('id', sa.Integer()),
+    sa.column('crop', sa.String()),
+    sa.column('crop_key', sa.String()),
+    sa.column('mandi', sa.String()),
+    sa.column('price_per_quintal', sa.Float()),
+)
+market_price_rollups = sa.table(
+    'market_price_rollups',
+    sa.column('crop', sa.String()),
+    sa.column('mandi', sa.String()),
+    sa.column('latest_id', sa.Integer()),
+    sa.column('latest_price', sa.Float()),
+    sa.column('avg_price', sa.Float()),
+    sa.column('points', sa.Integer()),
+    sa.column('total_count', sa.Integer()),
+    sa.column('window', sa.Text()),
+    sa.column('updated_at', sa.DateTime()),
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    existing = set() if context.is_offline_mode() else set(sa.inspect(bind).get_table_names())
+
+    def _create(name: str) -> bool:
+        return name not in existing
+
+    if _create('badges'):
+        op.create_table(
+            'badges',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('code', sa.String(), nullable=True),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('code')
+        )
+
+    if _create('input_suppliers'):
+        op.create_table(
+            'input_suppliers',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('category', sa.String(), nullable=True),
+            sa.Column('contact', sa.String(), nullable=True),
+            sa.Column('location', sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if _create('market_price_rollups'):
+        op.create_table(
+            'market_price_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('crop', sa.String(), nullable=False),
+            sa.Column('mandi', sa.String(), nullable=False),
+            sa.Column('latest_id', sa.Integer(), nullable=False),
+            sa.Column('latest_price', sa.Float(), nullable=False),
+            sa.Column('avg_price', sa.Float(), nullable=False),
+            sa.Column('points', sa.Integer(), nullable=False),
+            sa.Column('total_count', sa.Integer(), nullable=False),
+            sa.Column('window', sa.Text(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('crop', 'mandi', name='uq_market_price_rollups_crop_mandi')
+        )
+        op.create_index('ix_market_price_rollups_crop', 'market_price_rollups', ['crop'], unique=False)
+
+    if _create('market_prices'):
+        op.create_table(
+            'market_prices',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('crop', sa.String(), nullable=True),
+            sa.Column('crop_key', sa.String(), nullable=True),
+            sa.Column('mandi', sa.String(), nullable=True),
+            sa.Column('price_per_quintal', sa.Float(), nullable=True),
+            sa.Column('date', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        for name, columns in MARKET_PRICE_INDEXES.items():
+            op.create_index(name, 'market_prices', columns, unique=False)
+    else:
+        # Pre-crop_key tables: add and backfill crop_key, add the composite indexes
+        _adopt_market_prices(bind)
+        if _create('market_price_rollups'):
+            _backfill_rollups(bind)
+
+    if _create('otp_codes'):
+        op.create_table(
+            'otp_codes',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('phone', sa.String(), nullable=True),
+            sa.Column('code', sa.String(), nullable=True),
+            sa.Column('purpose', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_otp_codes_code', 'otp_codes', ['code'], unique=False)
+        op.create_index('ix_otp_codes_phone', 'otp_codes', ['phone'], unique=False)
+
+    if _create('users'):
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(), nullable=False),
+            sa.Column('phone', sa.String(), nullable=True),
+            sa.Column('hashed_password', sa.String(), nullable=True),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+        op.create_index('ix_users_id', 'users', ['id'], unique=False)
+        op.create_index('ix_users_phone', 'users', ['phone'], unique=True)
+
+    if _create('crop_plans'):
+        op.create_table(
+            'crop_plans',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('crop', sa.String(), nullable=True),
+            sa.Column('season', sa.String(), nullable=True),
+            sa.Column('start_date', sa.DateTime(), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if _create('expert_consultations'):
+        op.create_table(
+            'expert_consultations',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('expert_name', sa.String(), nullable=True),
+            sa.Column('topic', sa.String(), nullable=True),
+            sa.Column('status', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if _create('farm_fields'):
+        op.create_table(
+            'farm_fields',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('area_acres', sa.Float(), nullable=True),
+            sa.Column('latitude', sa.Float(), nullable=True),
+            sa.Column('longitude', sa.Float(), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if _create('insurance_policies'):
+        op.create_table(
+            'insurance_policies',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('policy_number', sa.String(), nullable=True),
+            sa.Column('crop', sa.String(), nullable=True),
+            sa.Column('coverage_amount', sa.Float(), nullable=True),
+            sa.Column('premium', sa.Float(), nullable=True),
+            sa.Column('status', sa.String(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('policy_number')
+        )
+
+    if _create('soil_tests'):
+        op.create_table(
+            'soil_tests',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('ph', sa.Float(), nullable=True),
+            sa.Column('nitrogen', sa.Float(), nullable=True),
+            sa.Column('phosphorus', sa.Float(), nullable=True),
+            sa.Column('potassium', sa.Float(), nullable=True),
+            sa.Column('recommendation', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if _create('user_badges'):
+        op.create_table(
+            'user_badges',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('badge_id', sa.Integer(), nullable=True),
+            sa.Column('awarded_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['badge_id'], ['badges.id'], ),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if _create('weather_alerts'):
+        op.create_table(
+            'weather_alerts',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('title', sa.String(), nullable=True),
+            sa.Column('severity', sa.String(), nullable=True),
+            sa.Column('message', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def _adopt_market_prices(bind) -> None:
+    insp = sa.inspect(bind)
+    if 'crop_key' not in {c['name'] for c in insp.get_columns('market_prices')}:
+        op.add_column('market_prices', sa.Column('crop_key', sa.String(), nullable=True))
+    pending = (
+        sa.select(market_prices.c.id, market_prices.c.crop)
+        .where(market_prices.c.crop_key.is_(None), market_prices.c.crop.isnot(None))
+        .order_by(market_prices.c.id)
+        .limit(BATCH)
+    )
+    fill = (
+        market_prices.update()
+        .where(market_prices.c.id == sa.bindparam('row_id'))
+        .values(crop_key=sa.bindparam('key'))
+    )
+    last_id = None
+    while True:
+        stmt = pending if last_id is None else pending.where(market_prices.c.id > last_id)
+        rows = bind.execute(stmt).all()
+        if not rows:
+            break
+        bind.execute(fill, [{'row_id': row_id, 'key': crop.strip().lower()} for row_id, crop in rows])
+        last_id = rows[-1][0]
+    existing = {ix['name'] for ix in insp.get_indexes('market_prices')}
+    for name, columns in MARKET_PRICE_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'market_prices', columns, unique=False)
+
+
+def _backfill_rollups(bind) -> None:
+    """Seed market_price_rollups from the prices already in the table: one
+    row per crop (mandi ''), holding its newest ROLLUP_WINDOW prices."""
+    groups = {}
+    newest_first = (
+        sa.select(market_prices.c.crop, market_prices.c.id, market_prices.c.price_per_quintal)
+        .where(market_prices.c.crop.isnot(None), market_prices.c.price_per_quintal.isnot(None))
+        .order_by(market_prices.c.id.desc())
+        .execution_options(stream_results=True)
+    )
+    for crop, row_id, price in bind.execute(newest_first):
+        window, total = groups.get(crop, ([], 0))
+        if len(window) < ROLLUP_WINDOW:
+            window.append([row_id, float(price)])
+        groups[crop] = (window, total + 1)
+    now = datetime.utcnow()
+    rows = [
+        {
+            'crop': crop,
+            'mandi': '',
+            'window': json.dumps(window),
+            'latest_id': window[0][0],
+            'latest_price': window[0][1],
+            'avg_price': sum(p for _, p in window) / len(window),
+            'points': len(window),
+            'total_count': total,
+            'updated_at': now,
+        }
+        for crop, (window, total) in groups.items()
+    ]
+    if rows:
+        op.bulk_insert(market_price_rollups, rows)
+
+
+def downgrade() -> None:
+    for name in ('weather_alerts', 'user_badges', 'soil_tests', 'insurance_policies', 'farm_fields',
+                 'expert_consultations', 'crop_plans', 'users', 'otp_codes', 'market_prices',
+                 'market_price_rollups', 'input_suppliers', 'badges'):
+        op.drop_table(name)
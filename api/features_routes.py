@@ -1,16 +1,23 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+import asyncio
 import datetime
+import hashlib
+import json
 import os
-import requests
+import unicodedata
 from settings import get_settings
 import logging
-import re
-import unicodedata
 from app.services.kb_data import KB_EXTRA_ENTRIES
+from app.services.kb_engine import KBIndex, is_hindi
+from app.services.llm_client import LLMError, get_llm_client
+from app.services.market_data import record_prices
+from app.services.ttl_cache import TTLCache
 from sqlalchemy.orm import Session
 from app.database.database import get_db
+from app.api.deps import get_read_db
 from app.database.models import InputSupplier
 
 router = APIRouter()
@@ -31,6 +38,24 @@ class ChatResponse(BaseModel):
     timestamp: str
     assistant: str = "KhetGuru"
 
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatRequest]
+
+
+class ChatBatchItem(BaseModel):
+    index: int
+    status: str  # ok | error
+    reply: Optional[str] = None
+    source: Optional[str] = None  # cache | kb | rule | llm | hedged | fallback
+    detail: Optional[str] = None
+
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
+    timestamp: str
+    assistant: str = "KhetGuru"
+
 class ContactMessage(BaseModel):
     name: str
     email: str
@@ -526,56 +551,23 @@ KB_ENTRIES: List[Dict[str, Any]] = [
 # Extend with extra curated entries
 KB_ENTRIES.extend(KB_EXTRA_ENTRIES)
 
-def _normalize(txt: str) -> str:
-    # Unicode normalize then keep basic latin letters, digits, whitespace, Devanagari.
-    txt = unicodedata.normalize('NFC', txt)
-    return re.sub(r"[^a-z0-9\s\u0900-\u097F]", " ", txt.lower())
-
-def _is_hindi(txt: str) -> bool:
-    return any('\u0900' <= ch <= '\u097F' for ch in txt)
+# Built once at import; KB_ENTRIES is not mutated afterwards.
+_KB_INDEX = KBIndex(KB_ENTRIES)
 
 def kb_find_answer(message: str) -> Optional[str]:
-    norm = _normalize(message)
-    hindi = _is_hindi(message)
-    best = None
-    best_score = 0
-    
-    # Try exact word matching first
-    words = set(norm.split())
-    
-    for entry in KB_ENTRIES:
-        score = 0
-        matched_patterns = []
-        
-        for pat in entry["patterns"]:
-            pat_norm = _normalize(pat)
-            pat_words = set(pat_norm.split())
-            
-            # Check if all pattern words are in the message
-            if pat_words.issubset(words):
-                score = len(pat_words)  # Score based on number of matching words
-                matched_patterns.append(pat)
-            # Also check substring matching for partial matches
-            elif pat_norm in norm:
-                score = max(score, 1)
-                matched_patterns.append(pat)
-        
-        if score > best_score:
-            best_score = score
-            best = entry
-    
-    if best and best_score > 0:
-        return best["answer_hi" if hindi else "answer_en"]
-    
-    return None
+    return _KB_INDEX.find_answer(message)
 
 
 def generate_rule_based_reply(message: str) -> str:
-    text = message.lower().strip()
     # First attempt knowledge base direct answer
     kb_ans = kb_find_answer(message)
     if kb_ans:
         return kb_ans
+    return keyword_fallback_reply(message)
+
+
+def keyword_fallback_reply(message: str) -> str:
+    text = message.lower().strip()
     # Hindi keyword fallbacks (basic domain triggers)
     if any(k in text for k in ["मिट्टी", "उर्वरता"]):
         return "मिट्टी pH 6.0-7.5 रखें, जैविक खाद व फसल चक्र अपनाएँ। किस फसल की योजना है?"
@@ -600,53 +592,257 @@ def generate_rule_based_reply(message: str) -> str:
     return "I noted your query. Could you clarify the crop or topic (soil, weather, mandi, insurance)?"
 
 
-def generate_reply(message: str, history: Optional[List[ChatMessage]] = None) -> str:
-    api_key = settings.openai_api_key or os.getenv("OPENAI_API_KEY")
-    if api_key:
+SYSTEM_PROMPT = "You are KhetGuru, a concise helpful agriculture assistant for Indian farmers. Keep answers short and actionable."
+
+
+def build_llm_messages(message: str, history: Optional[List[ChatMessage]] = None) -> List[Dict[str, str]]:
+    msgs = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if history:
+        for m in history[-8:]:
+            msgs.append({"role": m.role, "content": m.content})
+    msgs.append({"role": "user", "content": message})
+    return msgs
+
+
+# Answers keyed on (normalized message, language, history fingerprint).
+_reply_cache = TTLCache(settings.chat_cache_size, settings.chat_cache_ttl_s)
+
+
+def reply_cache_key(message: str, history: Optional[List[ChatMessage]] = None) -> Tuple[str, str, str]:
+    lang = "hi" if is_hindi(message) else "en"
+    fingerprint = ""
+    if history:
+        h = hashlib.sha1()
+        for m in history[-8:]:
+            h.update(f"{m.role}\x1f{m.content}\x1e".encode("utf-8"))
+        fingerprint = h.hexdigest()
+    return _cache_text(message), lang, fingerprint
+
+
+def _cache_text(message: str) -> str:
+    # NFC + casefold with punctuation dropped and whitespace collapsed. Unlike
+    # normalize_text this keeps every script, so e.g. Tamil and Bengali
+    # questions do not all collapse to the same empty key.
+    text = unicodedata.normalize("NFC", message).casefold()
+    return " ".join("".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text).split())
+
+
+_hedge_tasks: set = set()
+_hedge_stats = {"hedged": 0}
+
+
+def _hedge_done(task: "asyncio.Task") -> None:
+    _hedge_tasks.discard(task)
+    if not task.cancelled():
+        task.exception()  # outcome is already recorded by the breaker
+
+
+async def _llm_reply(message: str, history: Optional[List[ChatMessage]]) -> Tuple[Optional[str], str]:
+    """Ask the LLM, or answer from the KB when hedging and the LLM is slower
+    than LLM_HEDGE_MS. The late LLM call keeps running so the breaker still
+    sees its outcome."""
+    client = get_llm_client()
+    call = client.chat(build_llm_messages(message, history))
+    kb_answer = kb_find_answer(message) if settings.llm_hedge_ms > 0 else None
+    if kb_answer is None:
+        return await call, "llm"
+    task = asyncio.ensure_future(call)
+    done, _ = await asyncio.wait({task}, timeout=settings.llm_hedge_ms / 1000)
+    if done:
+        return task.result(), "llm"
+    _hedge_tasks.add(task)
+    task.add_done_callback(_hedge_done)
+    _hedge_stats["hedged"] += 1
+    logger.info("KhetGuru: OpenAI over hedge budget - answering from KB")
+    return kb_answer, "hedged"
+
+
+async def _resolve_reply(message: str, history: Optional[List[ChatMessage]] = None) -> Tuple[str, str]:
+    client = get_llm_client()
+    if client.enabled:
         try:
-            logger.info("KhetGuru: attempting OpenAI completion")
-            msgs = [
-                {"role": "system", "content": "You are KhetGuru, a concise helpful agriculture assistant for Indian farmers. Keep answers short and actionable."}
-            ]
-            if history:
-                for m in history[-8:]:
-                    msgs.append({"role": m.role, "content": m.content})
-            msgs.append({"role": "user", "content": message})
-            payload = {
-                "model": settings.model_name or "gpt-3.5-turbo",
-                "messages": msgs,
-                "temperature": 0.7,
-                "max_tokens": 300
-            }
-            r = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json=payload,
-                timeout=20
-            )
-            if r.status_code == 200:
-                data = r.json()
+            reply, source = await _llm_reply(message, history)
+            if source == "llm":
                 logger.info("KhetGuru: OpenAI success")
-                return data["choices"][0]["message"]["content"].strip()
-            else:
-                logger.warning("KhetGuru: OpenAI API non-200 status %s - falling back", r.status_code)
-        except Exception as exc:
-            logger.error("KhetGuru: OpenAI request failed %s - falling back", exc)
-    return generate_rule_based_reply(message)
+            return reply, source
+        except LLMError as exc:
+            logger.warning("KhetGuru: OpenAI request failed %s - falling back", exc)
+            return generate_rule_based_reply(message), "fallback"
+    return generate_rule_based_reply(message), "rule"
+
+
+def _cacheable(key: Tuple[str, str, str], source: str) -> bool:
+    # Fallback and hedged answers are never cached so a brief outage cannot mask
+    # the LLM, and neither is anything keyed on an empty (punctuation-only) message.
+    if not key[0]:
+        return False
+    return source == "rule" or (source == "llm" and settings.chat_cache_llm)
+
+
+async def agenerate_reply(message: str, history: Optional[List[ChatMessage]] = None) -> str:
+    key = reply_cache_key(message, history)
+    cached = _reply_cache.get(key)
+    if cached is not None:
+        return cached
+    reply, source = await _resolve_reply(message, history)
+    if _cacheable(key, source):
+        _reply_cache.set(key, reply)
+    return reply
 
 @router.post("/chat", response_model=ChatResponse)
-def chat_with_khetguru(payload: ChatRequest):
+async def chat_with_khetguru(payload: ChatRequest):
     if not payload.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
-    reply = generate_reply(payload.message, payload.history)
+    reply = await agenerate_reply(payload.message, payload.history)
     return ChatResponse(
         reply=reply,
         timestamp=datetime.datetime.utcnow().isoformat() + "Z"
     )
 
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_reply(message: str, history: Optional[List[ChatMessage]] = None) -> AsyncIterator[str]:
+    key = reply_cache_key(message, history)
+    reply = _reply_cache.get(key)
+    source = "cache"
+    if reply is None:
+        client = get_llm_client()
+        parts: List[str] = []
+        if client.enabled:
+            source = "llm"
+            try:
+                async for delta in client.stream_chat(build_llm_messages(message, history)):
+                    parts.append(delta)
+                    yield _sse("token", {"delta": delta})
+            except LLMError as exc:
+                logger.warning("KhetGuru: OpenAI stream failed %s - falling back", exc)
+                if parts:
+                    # Tokens already reached the client; close with what we have.
+                    source = "partial"
+                    yield _sse("error", {"detail": "upstream stream interrupted"})
+                else:
+                    source = "fallback"
+        else:
+            source = "rule"
+        if parts:
+            reply = "".join(parts).strip()
+        else:
+            reply = generate_rule_based_reply(message)
+            yield _sse("token", {"delta": reply})
+        if _cacheable(key, source) and reply:
+            _reply_cache.set(key, reply)
+    else:
+        yield _sse("token", {"delta": reply})
+    yield _sse("done", {
+        "reply": reply,
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "assistant": "KhetGuru",
+        "source": source,
+    })
+
+@router.post("/chat/stream")
+async def chat_with_khetguru_stream(payload: ChatRequest):
+    """Server-Sent Events variant of /chat: `token` events carry reply deltas,
+    a final `done` event carries the full ChatResponse fields."""
+    if not payload.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    return StreamingResponse(
+        _stream_reply(payload.message, payload.history),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _batch_error(i: int) -> ChatBatchItem:
+    return ChatBatchItem(index=i, status="error", detail="Could not answer this message")
+
+@router.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_with_khetguru_batch(payload: ChatBatchRequest):
+    """Answer queued field-agent messages in one round trip.
+
+    KB hits for the whole batch are resolved up front and answered from the
+    KB; only the remaining items go to the LLM, at most
+    CHAT_BATCH_CONCURRENCY at a time. Results keep the request order.
+    """
+    items = payload.items
+    if len(items) > settings.chat_batch_max:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {settings.chat_batch_max} items)")
+    results: List[Optional[ChatBatchItem]] = [None] * len(items)
+    keys: Dict[int, Tuple[str, str, str]] = {}
+    pending: List[int] = []
+    for i, item in enumerate(items):
+        if not item.message.strip():
+            results[i] = ChatBatchItem(index=i, status="error", detail="Message cannot be empty")
+            continue
+        keys[i] = reply_cache_key(item.message, item.history)
+        cached = _reply_cache.get(keys[i])
+        if cached is not None:
+            results[i] = ChatBatchItem(index=i, status="ok", reply=cached, source="cache")
+        else:
+            pending.append(i)
+
+    client = get_llm_client()
+    misses: List[int] = []
+    kb_answers = _KB_INDEX.find_answers([items[i].message for i in pending])
+    for i, answer in zip(pending, kb_answers):
+        if answer is None:
+            misses.append(i)
+        elif client.enabled:
+            results[i] = ChatBatchItem(index=i, status="ok", reply=answer, source="kb")
+        else:
+            results[i] = ChatBatchItem(index=i, status="ok", reply=answer, source="rule")
+            if _cacheable(keys[i], "rule"):
+                _reply_cache.set(keys[i], answer)
+
+    if client.enabled:
+        slots = asyncio.Semaphore(settings.chat_batch_concurrency)
+
+        async def resolve(i: int) -> None:
+            try:
+                async with slots:
+                    reply, source = await _resolve_reply(items[i].message, items[i].history)
+            except Exception:
+                # One bad item must not fail the rest of the batch
+                logger.exception("KhetGuru: batch item %d failed", i)
+                results[i] = _batch_error(i)
+                return
+            if _cacheable(keys[i], source):
+                _reply_cache.set(keys[i], reply)
+            results[i] = ChatBatchItem(index=i, status="ok", reply=reply, source=source)
+
+        await asyncio.gather(*(resolve(i) for i in misses))
+    else:
+        for i in misses:
+            try:
+                reply = keyword_fallback_reply(items[i].message)
+            except Exception:
+                logger.exception("KhetGuru: batch item %d failed", i)
+                results[i] = _batch_error(i)
+                continue
+            if _cacheable(keys[i], "rule"):
+                _reply_cache.set(keys[i], reply)
+            results[i] = ChatBatchItem(index=i, status="ok", reply=reply, source="rule")
+
+    return ChatBatchResponse(
+        results=results,
+        timestamp=datetime.datetime.utcnow().isoformat() + "Z"
+    )
+
+@router.get("/chat/breaker", response_model=Dict[str, Any])
+def chat_breaker_stats():
+    client = get_llm_client()
+    return {"status": "success", "data": {
+        **client.breaker.stats(),
+        "llm_enabled": client.enabled,
+        "hedge_ms": settings.llm_hedge_ms,
+        "hedged": _hedge_stats["hedged"],
+    }}
+
+@router.get("/chat/cache/stats", response_model=Dict[str, Any])
+def chat_cache_stats():
+    return {"status": "success", "data": {**_reply_cache.stats(), "cache_llm": settings.chat_cache_llm}}
+
 @router.get("/soil-testing", response_model=Dict[str, Any])
 def get_soil_testing():
     return {"status": "success", "data": {"ph": 6.5, "nutrients": "optimal", "recommendation": "Add organic matter for better soil structure and fertility"}}
@@ -682,8 +878,8 @@ def get_weather_alerts():
     return {"status": "success", "data": current_alerts}
 
 @router.get("/quality-input", response_model=Dict[str, Any])
-def get_quality_input(db: Session = Depends(get_db)):
-    # Prefer DB-backed suppliers; seed a small demo if table is empty
+def get_quality_input(db: Session = Depends(get_read_db), primary: Session = Depends(get_db)):
+    # Prefer DB-backed suppliers; seed a small demo (on the primary) if table is empty
     q = db.query(InputSupplier).limit(50).all()
     if not q:
         demo = [
@@ -693,12 +889,12 @@ def get_quality_input(db: Session = Depends(get_db)):
             InputSupplier(name="Organic Plus", category="Pesticides", contact="9876543213", location="Pune"),
         ]
         for s in demo:
-            db.add(s)
+            primary.add(s)
         try:
-            db.commit()
-            q = db.query(InputSupplier).limit(50).all()
+            primary.commit()
+            q = primary.query(InputSupplier).limit(50).all()
         except Exception:
-            db.rollback()
+            primary.rollback()
             # Fallback to in-memory if DB write fails
             suppliers = [
                 {"name": s.name, "category": s.category, "contact": s.contact, "location": s.location, "rating": 4.5}
@@ -731,24 +927,26 @@ def get_crop_insurance():
     return {"status": "success", "data": {"insurance_plans": insurance_options, "government_subsidy": "50%"}}
 
 @router.get("/mandi-rate", response_model=Dict[str, Any])
-def get_mandi_rate(db: Session = Depends(get_db)):
+def get_mandi_rate(db: Session = Depends(get_read_db), primary: Session = Depends(get_db)):
     from app.database.models import MarketPrice
     rows = db.query(MarketPrice).order_by(MarketPrice.id.desc()).limit(50).all()
     if not rows:
-        # Seed a tiny set if empty
+        # Seed a tiny set (on the primary) if empty
         seeds = [
             ("Wheat", "Delhi", 2200.0),
             ("Rice", "Mumbai", 2800.0),
             ("Cotton", "Ahmedabad", 6200.0),
             ("Sugarcane", "Pune", 3200.0),
         ]
-        for c, m, p in seeds:
-            db.add(MarketPrice(crop=c, mandi=m, price_per_quintal=p))
+        seeded = [MarketPrice(crop=c, mandi=m, price_per_quintal=p) for c, m, p in seeds]
+        primary.add_all(seeded)
         try:
-            db.commit()
-            rows = db.query(MarketPrice).order_by(MarketPrice.id.desc()).limit(50).all()
+            primary.flush()
+            record_prices(primary, seeded)
+            primary.commit()
+            rows = primary.query(MarketPrice).order_by(MarketPrice.id.desc()).limit(50).all()
         except Exception:
-            db.rollback()
+            primary.rollback()
             market_rates = [
                 {"crop": c, "rate": p, "mandi": m, "quality": "A", "trend": "stable"}
                 for c, m, p in seeds
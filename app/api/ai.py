@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
-from sqlalchemy.orm import Session
+from typing import Optional, List
+from datetime import date
+from sqlalchemy.orm import Session, sessionmaker
 from app.database.database import get_db
-from app.database.models import CropPlan, User
-from app.services.auth_service import decode_token
-from app.services.ai_planner import PlannerInput, recommend_crops, mandi_rates, demo_seed_prices
+from app.database.models import CropPlan
+from app.api.deps import Principal, get_principal, get_read_db, get_read_sessionmaker
+from app.services.ai_planner import PlannerInput, recommend_crops, recommend_crops_batch, mandi_rates, demo_seed_prices, plan_cache_stats
+from app.services.market_data import EXPORT_FORMATS, export_price_history
 
 
 router = APIRouter(prefix="/ai", tags=["ai"])
@@ -20,48 +23,86 @@ class CropPlanRequest(BaseModel):
     district: Optional[str] = None
 
 
+class CropPlanBatchItem(CropPlanRequest):
+    member_id: Optional[str] = None
+
+
+class CropPlanBatchRequest(BaseModel):
+    members: List[CropPlanBatchItem] = Field(..., max_length=1000)
+
+
+def _planner_input(payload: CropPlanRequest) -> PlannerInput:
+    return PlannerInput(
+        season=payload.season,
+        area_acres=payload.area_acres,
+        ph=payload.ph,
+        water_availability=(payload.water_availability or '').lower() or None,
+        state=payload.state,
+        district=payload.district,
+    )
+
+
 @router.post("/crop-planner/recommendations")
 def crop_recommendations(payload: CropPlanRequest, db: Session = Depends(get_db)):
     try:
-        p = PlannerInput(
-            season=payload.season,
-            area_acres=payload.area_acres,
-            ph=payload.ph,
-            water_availability=(payload.water_availability or '').lower() or None,
-            state=payload.state,
-            district=payload.district,
-        )
-        recs = recommend_crops(p, db)
+        recs = recommend_crops(_planner_input(payload), db)
         return {"count": len(recs), "recommendations": recs}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/crop-planner/recommendations/batch")
+def crop_recommendations_batch(payload: CropPlanBatchRequest, db: Session = Depends(get_db)):
+    """Recommendations for many cooperative members: market prices are read
+    once and every member is scored in the same array pass."""
+    try:
+        batch = recommend_crops_batch([_planner_input(m) for m in payload.members], db)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    results = [
+        {"member_id": m.member_id, "count": len(recs), "recommendations": recs}
+        for m, recs in zip(payload.members, batch)
+    ]
+    return {"count": len(results), "results": results}
+
+
+@router.get("/crop-planner/cache/stats")
+def crop_planner_cache_stats():
+    return plan_cache_stats()
+
+
 @router.get("/mandi-rates")
-def list_mandi_rates(crop: Optional[str] = None, mandi: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+def list_mandi_rates(crop: Optional[str] = None, mandi: Optional[str] = None, limit: int = 50, db: Session = Depends(get_read_db)):
     rows = mandi_rates(db, crop=crop, mandi=mandi, limit=min(max(limit, 1), 200))
     return {"count": len(rows), "items": rows}
 
 
+@router.get("/mandi-rates/export")
+def export_mandi_rates(
+    crop: Optional[str] = None,
+    mandi: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    format: str = "ndjson",
+    factory: sessionmaker = Depends(get_read_sessionmaker),
+):
+    """Full price history as streamed NDJSON or CSV, oldest first."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from is after date_to")
+    # The stream runs after this handler returns, so it opens its own session
+    body = export_price_history(factory, format, crop=crop, mandi=mandi, date_from=date_from, date_to=date_to)
+    headers = {"Content-Disposition": f'attachment; filename="mandi-rates.{format}"'}
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers=headers)
+
+
 @router.post("/seed-demo")
 def seed_demo(db: Session = Depends(get_db)):
     inserted = demo_seed_prices(db)
     return {"inserted": inserted}
 
 
-def _current_user(authorization: str = Header(None), db: Session = Depends(get_db)) -> User:
-    if not authorization or not authorization.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Missing token")
-    token = authorization.split()[1]
-    sub = decode_token(token)
-    if not sub:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).get(int(sub))
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
-
-
 class SavePlanRequest(BaseModel):
     crop: str
     season: str
@@ -69,7 +110,7 @@ class SavePlanRequest(BaseModel):
 
 
 @router.post("/crop-planner/save")
-def save_crop_plan(payload: SavePlanRequest, user: User = Depends(_current_user), db: Session = Depends(get_db)):
+def save_crop_plan(payload: SavePlanRequest, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     plan = CropPlan(user_id=user.id, crop=payload.crop, season=payload.season, notes=payload.notes)
     db.add(plan)
     db.commit()
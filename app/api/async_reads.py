@@ -0,0 +1,82 @@
+"""
+AsyncSession versions of the hot read endpoints, mounted ahead of the sync
+routers when DB_ASYNC is set. Paths and response shapes match the sync
+handlers in farming.py and ai.py, which build the same statements.
+
+These read the primary: replica routing (DATABASE_REPLICA_URLS) covers the
+sync stack only, so deployments with replicas should leave DB_ASYNC off.
+"""
+
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.ai import CropPlanRequest, _planner_input
+from app.api.deps import Principal, get_read_principal_async
+from app.api.farming import PRICE_COLUMNS, sample_market_prices, store_market_prices, unsaved_price_rows, with_price_trend
+from app.api.pagination import PageParams, keyset_statement, page_rows
+from app.database.async_database import get_async_db
+from app.database.models import FarmField, MarketPrice, WeatherAlert
+from app.services.ai_planner import recommend_crops
+from app.services.market_data import ANY_PRICE_STATEMENT, ROLLUP_TRENDS_STATEMENT, market_trends_statement, trends_from_rows
+
+router = APIRouter()
+
+
+async def _page(db: AsyncSession, model, page: PageParams, *filters, response: Response, **kwargs):
+    stmt = keyset_statement(model, page, *filters, **kwargs)
+    return page_rows((await db.execute(stmt)).all(), page, response)
+
+
+@router.get("/farming/fields", tags=["farming"])
+async def list_fields(response: Response, page: PageParams = Depends(), user: Principal = Depends(get_read_principal_async), db: AsyncSession = Depends(get_async_db)):
+    return await _page(db, FarmField, page, FarmField.user_id == user.id, response=response, descending=False)
+
+
+@router.get("/farming/market/prices", tags=["farming"])
+async def list_prices(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_async_db)):
+    prices = await _page(db, MarketPrice, page, response=response, columns=PRICE_COLUMNS)
+    if not prices and page.after_id is None:
+        sample_prices = sample_market_prices()
+        try:
+            await db.run_sync(store_market_prices, sample_prices)
+        except SQLAlchemyError:
+            await db.rollback()
+            return unsaved_price_rows(sample_prices, page)
+        return await _page(db, MarketPrice, page, response=response, columns=PRICE_COLUMNS)
+    return [with_price_trend(price) for price in prices]
+
+
+@router.get("/farming/market/trends", tags=["farming"])
+async def get_market_trends(db: AsyncSession = Depends(get_async_db)):
+    rows = (await db.execute(ROLLUP_TRENDS_STATEMENT)).all()
+    if not rows and (await db.execute(ANY_PRICE_STATEMENT)).first() is not None:
+        # Rollups not built yet: windowed scan, as rollup_trends does
+        rows = (await db.execute(market_trends_statement())).all()
+    return {"trends": trends_from_rows(rows), "last_updated": datetime.utcnow().isoformat()}
+
+
+@router.get("/farming/weather/alerts", tags=["farming"])
+async def list_weather_alerts(db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(WeatherAlert).order_by(WeatherAlert.id.desc()).limit(20))).all()
+
+
+@router.get("/farming/weather/alerts/my", tags=["farming"])
+async def list_my_weather_alerts(user: Principal = Depends(get_read_principal_async), db: AsyncSession = Depends(get_async_db)):
+    stmt = select(WeatherAlert).where(
+        (WeatherAlert.user_id == None) | (WeatherAlert.user_id == user.id)  # noqa: E711
+    ).order_by(WeatherAlert.id.desc()).limit(20)
+    return (await db.scalars(stmt)).all()
+
+
+@router.post("/ai/crop-planner/recommendations", tags=["ai"])
+async def crop_recommendations(payload: CropPlanRequest, db: AsyncSession = Depends(get_async_db)):
+    try:
+        # Plan-cache hits read only the price version; misses also read prices, over the async driver
+        recs = await db.run_sync(lambda session: recommend_crops(_planner_input(payload), session))
+        return {"count": len(recs), "recommendations": recs}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
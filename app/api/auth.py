@@ -1,14 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.database.database import get_db, Base, engine
+from app.database.database import get_db
 from app.database.models import User
-from app.services.auth_service import hash_password, verify_password, create_access_token, decode_token
+from app.services.auth_service import claims_cache_stats, create_access_token
+from app.services.password_pool import PasswordPoolBusy, ahash_password, averify_password, password_pool_stats
+from app.api.deps import Principal, get_principal, invalidate_principal, principal_cache_stats
 from app.services.otp_service import generate_otp, verify_otp
 from pydantic import BaseModel
 from typing import Optional
 
-Base.metadata.create_all(bind=engine)
-
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 class RegisterRequest(BaseModel):
@@ -32,53 +33,63 @@ class OTPVerifyRequest(BaseModel):
 class ProfileUpdate(BaseModel):
     name: Optional[str] = None
 
-@router.post("/register")
-def register(payload: RegisterRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email==payload.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    user = User(email=payload.email, hashed_password=hash_password(payload.password), name=payload.name)
+def _pool_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Authentication is busy, retry shortly", headers={"Retry-After": "1"})
+
+def _user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email==email).first()
+
+def _create_user(db: Session, user: User) -> User:
     db.add(user)
     db.commit()
     db.refresh(user)
+    return user
+
+@router.post("/register")
+async def register(payload: RegisterRequest, db: Session = Depends(get_db)):
+    if await run_in_threadpool(_user_by_email, db, payload.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        hashed = await ahash_password(payload.password)
+    except PasswordPoolBusy:
+        raise _pool_busy()
+    user = User(email=payload.email, hashed_password=hashed, name=payload.name)
+    user = await run_in_threadpool(_create_user, db, user)
     return {"id": user.id, "email": user.email}
 
 @router.post("/login")
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email==payload.email).first()
-    if not user or not user.hashed_password or not verify_password(payload.password, user.hashed_password):
+async def login(payload: LoginRequest, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_user_by_email, db, payload.email)
+    if not user or not user.hashed_password:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        ok = await averify_password(payload.password, user.hashed_password)
+    except PasswordPoolBusy:
+        raise _pool_busy()
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token(str(user.id))
+    token = create_access_token(str(user.id), {"email": user.email})
     return {"access_token": token, "token_type": "bearer"}
 
 @router.get("/profile")
-def profile(authorization: str = Header(None), db: Session = Depends(get_db)):
-    if not authorization or not authorization.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Missing token")
-    token = authorization.split()[1]
-    sub = decode_token(token)
-    if not sub:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).get(int(sub))
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def profile(user: Principal = Depends(get_principal)):
     return {"id": user.id, "email": user.email, "name": user.name}
 
 @router.patch("/profile")
-def update_profile(payload: ProfileUpdate, authorization: str = Header(None), db: Session = Depends(get_db)):
-    if not authorization or not authorization.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Missing token")
-    token = authorization.split()[1]
-    sub = decode_token(token)
-    if not sub:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).get(int(sub))
+def update_profile(payload: ProfileUpdate, principal: Principal = Depends(get_principal), db: Session = Depends(get_db)):
+    user = db.get(User, principal.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if payload.name:
         user.name = payload.name
         db.commit()
+        invalidate_principal(user.id)
     return {"id": user.id, "email": user.email, "name": user.name}
 
+@router.get("/cache/stats")
+def auth_cache_stats():
+    return {**principal_cache_stats(), "jwt_claims": claims_cache_stats(), "password_pool": password_pool_stats()}
+
 @router.post("/otp/request")
 def otp_request(payload: OTPRequest, db: Session = Depends(get_db)):
     code = generate_otp(payload.phone, payload.purpose, db)
@@ -0,0 +1,151 @@
+import math
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import Depends, Header, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database.async_database import get_async_db
+from app.database.database import get_db, read_session, read_sessionmaker, recently_wrote, track_writes
+from app.database.models import User
+from app.services.auth_service import decode_claims
+from app.services.ttl_cache import TTLCache
+from settings import get_settings
+
+settings = get_settings()
+
+# Epoch time of the client's last committed write, for read-your-writes routing
+WRITE_COOKIE = "db_wrote_at"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller. `from_claims` principals were built from the
+    signed token alone and carry only what the token asserts."""
+    id: int
+    email: Optional[str] = None
+    name: Optional[str] = None
+    from_claims: bool = False
+
+
+# (user id, token) -> (user version, Principal); a bumped version is a miss.
+# Invalidation is per process: other workers catch up within the TTL.
+_principal_cache = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl_s)
+_principal_versions: Dict[int, int] = {}
+_versions_lock = threading.Lock()
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop cached principals for `user_id`, e.g. after a profile update."""
+    with _versions_lock:
+        _principal_versions[user_id] = _principal_versions.get(user_id, 0) + 1
+
+
+def principal_cache_stats() -> Dict:
+    return {**_principal_cache.stats(), "trust_claims": settings.auth_trust_claims}
+
+
+def _bearer_claims(authorization: Optional[str]) -> Tuple[str, Dict]:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Missing token")
+    token = authorization.split()[1]
+    claims = decode_claims(token)
+    if not claims or not str(claims.get("sub", "")).isdigit():
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return token, claims
+
+
+def _ttl_for(claims: Dict) -> float:
+    # Never keep a principal past its token's expiry
+    exp = claims.get("exp")
+    if exp is None:
+        return settings.auth_cache_ttl_s
+    return max(0.0, min(settings.auth_cache_ttl_s, exp - datetime.now(timezone.utc).timestamp()))
+
+
+def _cached_principal(claims: Dict, token: str) -> Tuple[Tuple[int, str], int, Optional[Principal]]:
+    user_id = int(claims["sub"])
+    key = (user_id, token)
+    version = _principal_versions.get(user_id, 0)
+    cached = _principal_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return key, version, cached[1]
+    return key, version, None
+
+
+def _remember(key: Tuple[int, str], version: int, user: Optional[User], claims: Dict) -> Principal:
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    principal = Principal(id=user.id, email=user.email, name=user.name)
+    _principal_cache.set(key, (version, principal), ttl_s=_ttl_for(claims))
+    return principal
+
+
+def _trusted_principal(claims: Dict) -> Principal:
+    return Principal(id=int(claims["sub"]), email=claims.get("email"), from_claims=True)
+
+
+def _set_write_cookie(response: Response, wrote_at: float) -> None:
+    response.set_cookie(
+        WRITE_COOKIE, f"{wrote_at:.3f}", max_age=math.ceil(settings.db_read_your_writes_s), httponly=True, samesite="lax"
+    )
+
+
+def get_principal(authorization: str = Header(None), db: Session = Depends(get_db), response: Response = None) -> Principal:
+    """Authenticate the bearer token and load its user, through the principal cache.
+    `db` is the route's own get_db session: when it commits a write, the
+    response carries WRITE_COOKIE so the caller's next reads, on whichever
+    worker, follow it to the primary."""
+    token, claims = _bearer_claims(authorization)
+    key, version, principal = _cached_principal(claims, token)
+    if principal is None:
+        principal = _remember(key, version, db.get(User, key[0]), claims)
+    if response is not None:
+        track_writes(db, lambda wrote_at: _set_write_cookie(response, wrote_at))
+    return principal
+
+
+def get_read_principal(authorization: str = Header(None), db: Session = Depends(get_db), response: Response = None) -> Principal:
+    """For read-only endpoints: with AUTH_TRUST_CLAIMS set, the signed token is
+    trusted as-is and the user row is not read (a deleted user keeps access
+    until the token expires); otherwise same as get_principal."""
+    if settings.auth_trust_claims:
+        return _trusted_principal(_bearer_claims(authorization)[1])
+    return get_principal(authorization, db, response)
+
+
+def _last_write(request: Request) -> Optional[float]:
+    # Routing hint only, and a forged value can do no more than send reads to the primary
+    try:
+        return float(request.cookies[WRITE_COOKIE])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_read_db(request: Request) -> Iterator[Session]:
+    """Session for read-only routes: a replica, unless the caller's
+    WRITE_COOKIE shows a write within the last DB_READ_YOUR_WRITES_S seconds."""
+    yield from read_session(recently_wrote(_last_write(request)))
+
+
+def get_read_sessionmaker(request: Request) -> sessionmaker:
+    """get_read_db for routes that open their sessions later, e.g. streamed exports."""
+    return read_sessionmaker(recently_wrote(_last_write(request)))
+
+
+async def get_principal_async(authorization: str = Header(None), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    """get_principal for the DB_ASYNC routes; shares the same principal cache."""
+    token, claims = _bearer_claims(authorization)
+    key, version, principal = _cached_principal(claims, token)
+    if principal is not None:
+        return principal
+    return _remember(key, version, await db.get(User, key[0]), claims)
+
+
+async def get_read_principal_async(authorization: str = Header(None), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    if settings.auth_trust_claims:
+        return _trusted_principal(_bearer_claims(authorization)[1])
+    return await get_principal_async(authorization, db)
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.database.async_database import get_async_engine
+from app.database.database import get_db, pool_stats, replica_stats, settings
+
+router = APIRouter(prefix="/diagnostics", tags=["diagnostics"])
+
+
+def diagnostics_enabled() -> None:
+    # Off unless DB_DIAGNOSTICS is set: the stats name database hosts
+    if not settings.db_diagnostics:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@router.get("/db/pool", dependencies=[Depends(diagnostics_enabled)])
+def db_pool_stats(db: Session = Depends(get_db)):
+    """Connection pool occupancy and checkout wait times for the app engine
+    (and the AsyncEngine when DB_ASYNC is on, and any read replicas)."""
+    stats = pool_stats(db.get_bind())
+    stats.update(replica_stats())
+    if settings.db_async:
+        stats["async"] = pool_stats(get_async_engine().sync_engine)
+    return stats
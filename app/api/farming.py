@@ -1,27 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+import codecs
+import random
 from app.database.database import get_db
-from app.database.models import SoilTest, FarmField, CropPlan, WeatherAlert, InputSupplier, ExpertConsultation, InsurancePolicy, MarketPrice, Badge, UserBadge, User
+from app.database.models import SoilTest, FarmField, CropPlan, WeatherAlert, InputSupplier, ExpertConsultation, InsurancePolicy, MarketPrice, Badge, UserBadge
+from app.api.deps import Principal, get_principal, get_read_db, get_read_principal
+from app.api.pagination import PageParams, keyset_page
 from pydantic import BaseModel
 from typing import Optional, List
-from app.services.auth_service import decode_token
-from datetime import datetime
+from app.services.market_data import crop_key_matches, record_prices, rollup_trends
+from app.services.price_ingest import FEED_CHUNK_CHARS, PriceIngestor, format_for
+from settings import get_settings
+from datetime import datetime, timedelta
 
-router = APIRouter(prefix="/farming", tags=["farming"])
-
-# Utility auth dependency
+settings = get_settings()
 
-def current_user(authorization: str = Header(None), db: Session = Depends(get_db)) -> User:
-    if not authorization or not authorization.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Missing token")
-    token = authorization.split()[1]
-    sub = decode_token(token)
-    if not sub:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).get(int(sub))
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+router = APIRouter(prefix="/farming", tags=["farming"])
 
 # Soil Tests
 class SoilTestCreate(BaseModel):
@@ -32,7 +28,7 @@ class SoilTestCreate(BaseModel):
     notes: Optional[str] = None
 
 @router.post("/soil/tests")
-def create_soil_test(payload: SoilTestCreate, user: User = Depends(current_user), db: Session = Depends(get_db)):
+def create_soil_test(payload: SoilTestCreate, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     rec = SoilTest(user_id=user.id, ph=payload.ph, nitrogen=payload.nitrogen, phosphorus=payload.phosphorus, potassium=payload.potassium, recommendation=payload.notes or "Balanced fertilizer schedule suggested.")
     db.add(rec)
     db.commit()
@@ -40,8 +36,8 @@ def create_soil_test(payload: SoilTestCreate, user: User = Depends(current_user)
     return rec
 
 @router.get("/soil/tests")
-def list_soil_tests(user: User = Depends(current_user), db: Session = Depends(get_db)):
-    return db.query(SoilTest).filter(SoilTest.user_id==user.id).order_by(SoilTest.id.desc()).all()
+def list_soil_tests(response: Response, page: PageParams = Depends(), user: Principal = Depends(get_read_principal), db: Session = Depends(get_db)):
+    return keyset_page(db, SoilTest, page, SoilTest.user_id==user.id, response=response)
 
 # Farm Fields
 class FieldCreate(BaseModel):
@@ -52,7 +48,7 @@ class FieldCreate(BaseModel):
     notes: Optional[str] = None
 
 @router.post("/fields")
-def create_field(payload: FieldCreate, user: User = Depends(current_user), db: Session = Depends(get_db)):
+def create_field(payload: FieldCreate, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     field = FarmField(user_id=user.id, **payload.dict())
     db.add(field)
     db.commit()
@@ -60,8 +56,8 @@ def create_field(payload: FieldCreate, user: User = Depends(current_user), db: S
     return field
 
 @router.get("/fields")
-def list_fields(user: User = Depends(current_user), db: Session = Depends(get_db)):
-    return db.query(FarmField).filter(FarmField.user_id==user.id).all()
+def list_fields(response: Response, page: PageParams = Depends(), user: Principal = Depends(get_read_principal), db: Session = Depends(get_db)):
+    return keyset_page(db, FarmField, page, FarmField.user_id==user.id, response=response, descending=False)
 
 # Crop Plans
 class CropPlanCreate(BaseModel):
@@ -70,7 +66,7 @@ class CropPlanCreate(BaseModel):
     notes: Optional[str] = None
 
 @router.post("/crop-planner/plans")
-def create_crop_plan(payload: CropPlanCreate, user: User = Depends(current_user), db: Session = Depends(get_db)):
+def create_crop_plan(payload: CropPlanCreate, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     plan = CropPlan(user_id=user.id, crop=payload.crop, season=payload.season, notes=payload.notes)
     db.add(plan)
     db.commit()
@@ -78,8 +74,8 @@ def create_crop_plan(payload: CropPlanCreate, user: User = Depends(current_user)
     return plan
 
 @router.get("/crop-planner/plans")
-def list_crop_plans(user: User = Depends(current_user), db: Session = Depends(get_db)):
-    return db.query(CropPlan).filter(CropPlan.user_id==user.id).all()
+def list_crop_plans(response: Response, page: PageParams = Depends(), user: Principal = Depends(get_read_principal), db: Session = Depends(get_db)):
+    return keyset_page(db, CropPlan, page, CropPlan.user_id==user.id, response=response, descending=False)
 
 # Weather Alerts
 class WeatherAlertCreate(BaseModel):
@@ -89,18 +85,18 @@ class WeatherAlertCreate(BaseModel):
     scope: Optional[str] = None  # 'user' for user-specific, else global
 
 @router.get("/weather/alerts")
-def list_weather_alerts(db: Session = Depends(get_db)):
+def list_weather_alerts(db: Session = Depends(get_read_db)):
     return db.query(WeatherAlert).order_by(WeatherAlert.id.desc()).limit(20).all()
 
 @router.get("/weather/alerts/my")
-def list_my_weather_alerts(user: User = Depends(current_user), db: Session = Depends(get_db)):
+def list_my_weather_alerts(user: Principal = Depends(get_read_principal), db: Session = Depends(get_read_db)):
     # union of global (user_id is null) and user-specific
     return db.query(WeatherAlert).filter(
         (WeatherAlert.user_id == None) | (WeatherAlert.user_id == user.id)  # noqa: E711
     ).order_by(WeatherAlert.id.desc()).limit(20).all()
 
 @router.post("/weather/alerts")
-def create_weather_alert(payload: WeatherAlertCreate, user: User = Depends(current_user), db: Session = Depends(get_db)):
+def create_weather_alert(payload: WeatherAlertCreate, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     uid = user.id if (payload.scope or '').lower() == 'user' else None
     wa = WeatherAlert(user_id=uid, title=payload.title, severity=payload.severity, message=payload.message)
     db.add(wa)
@@ -358,7 +354,7 @@ class ExpertResponse(BaseModel):
     description: Optional[str] = None
 
 @router.post("/experts/consultations")
-def book_consult(payload: ExpertRequest, user: User = Depends(current_user), db: Session = Depends(get_db)):
+def book_consult(payload: ExpertRequest, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     c = ExpertConsultation(
         user_id=user.id, 
         expert_name=payload.expert_name, 
@@ -374,9 +370,8 @@ def book_consult(payload: ExpertRequest, user: User = Depends(current_user), db:
     return c
 
 @router.get("/experts/consultations")
-def list_consults(user: User = Depends(current_user), db: Session = Depends(get_db)):
-    consultations = db.query(ExpertConsultation).filter(ExpertConsultation.user_id==user.id).order_by(ExpertConsultation.id.desc()).all()
-    return consultations
+def list_consults(response: Response, page: PageParams = Depends(), user: Principal = Depends(get_read_principal), db: Session = Depends(get_db)):
+    return keyset_page(db, ExpertConsultation, page, ExpertConsultation.user_id==user.id, response=response)
 
 @router.get("/experts/available")
 def get_available_experts():
@@ -473,7 +468,7 @@ class PolicyCreate(BaseModel):
     premium: float
 
 @router.post("/insurance/policies")
-def create_policy(payload: PolicyCreate, user: User = Depends(current_user), db: Session = Depends(get_db)):
+def create_policy(payload: PolicyCreate, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     if db.query(InsurancePolicy).filter(InsurancePolicy.policy_number==payload.policy_number).first():
         raise HTTPException(status_code=400, detail="Policy exists")
     p = InsurancePolicy(user_id=user.id, **payload.dict())
@@ -483,8 +478,8 @@ def create_policy(payload: PolicyCreate, user: User = Depends(current_user), db:
     return p
 
 @router.get("/insurance/policies")
-def list_policies(user: User = Depends(current_user), db: Session = Depends(get_db)):
-    return db.query(InsurancePolicy).filter(InsurancePolicy.user_id==user.id).all()
+def list_policies(response: Response, page: PageParams = Depends(), user: Principal = Depends(get_read_principal), db: Session = Depends(get_db)):
+    return keyset_page(db, InsurancePolicy, page, InsurancePolicy.user_id==user.id, response=response, descending=False)
 
 # Market Prices
 class MarketPriceCreate(BaseModel):
@@ -507,65 +502,111 @@ class MarketPriceResponse(BaseModel):
 
 @router.post("/market/prices")
 def create_price(payload: MarketPriceCreate, db: Session = Depends(get_db)):
-    mp = MarketPrice(**payload.dict())
+    mp = MarketPrice(crop=payload.crop, mandi=payload.mandi, price_per_quintal=payload.price_per_quintal)
     db.add(mp)
+    db.flush()
+    record_prices(db, [mp])
     db.commit()
     db.refresh(mp)
     return mp
 
+@router.post("/market/prices/bulk")
+async def bulk_ingest_prices(
+    request: Request,
+    format: Optional[str] = None,
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db),
+):
+    """Stream a CSV (header row required) or NDJSON body of
+    {crop, mandi, price_per_quintal, date?} rows; returns per-batch throughput."""
+    try:
+        ingestor = PriceIngestor(db, format or format_for(request.headers.get("content-type")), settings.price_ingest_batch_size)
+    except ValueError as exc:
+        raise HTTPException(status_code=415, detail=str(exc))
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts, size = [], 0
+    async for chunk in request.stream():
+        # The ingestor finds record boundaries itself (CSV fields may hold newlines)
+        parts.append(decoder.decode(chunk))
+        size += len(parts[-1])
+        if size >= FEED_CHUNK_CHARS:
+            await run_in_threadpool(ingestor.feed, "".join(parts))
+            parts, size = [], 0
+    parts.append(decoder.decode(b"", final=True))
+    await run_in_threadpool(ingestor.feed, "".join(parts))
+    await run_in_threadpool(ingestor.finish)
+    return ingestor.report()
+
+PRICE_COLUMNS = (MarketPrice.id, MarketPrice.crop, MarketPrice.mandi, MarketPrice.price_per_quintal, MarketPrice.date)
+
+def sample_market_prices() -> List[MarketPrice]:
+    """A handful of demo prices used when the table is empty."""
+    crops = ['Wheat', 'Rice', 'Cotton', 'Sugarcane', 'Maize', 'Tomato', 'Onion', 'Potato']
+    mandis = ['Delhi', 'Mumbai', 'Kolkata', 'Chennai', 'Bangalore', 'Hyderabad', 'Pune', 'Ahmedabad']
+
+    sample_prices = []
+    for crop in crops[:4]:  # Limit to 4 crops to avoid too much data
+        for mandi in mandis[:3]:  # Limit to 3 mandis per crop
+            price = random.randint(1500, 4500)  # Random price between 1500-4500
+            sample_prices.append(MarketPrice(
+                crop=crop,
+                mandi=mandi,
+                price_per_quintal=price,
+                date=datetime.utcnow() - timedelta(hours=random.randint(0, 24))
+            ))
+    return sample_prices
+
+def store_market_prices(db: Session, prices: List[MarketPrice]) -> None:
+    db.add_all(prices)
+    db.flush()
+    record_prices(db, prices)
+    db.commit()
+
+def unsaved_price_rows(prices: List[MarketPrice], page: PageParams) -> List[dict]:
+    """`prices` as list_prices page rows, for when the seed could not be stored."""
+    rows = []
+    for price in prices[:page.limit]:
+        row = {column.key: getattr(price, column.key) for column in PRICE_COLUMNS}
+        row["id"] = None  # a rolled-back flush leaves ids that were never saved
+        rows.append(row)
+    return rows
+
+def with_price_trend(price: dict) -> dict:
+    # Add trend and change data to an existing price
+    change_percent = round(random.uniform(-10, 10), 1)
+    trend = "up" if change_percent > 2 else "down" if change_percent < -2 else "stable"
+    return {
+        **price,
+        "quality": "A",
+        "unit": "quintal",
+        "change_percent": change_percent,
+        "trend": trend
+    }
+
 @router.get("/market/prices")
-def list_prices(db: Session = Depends(get_db)):
-    prices = db.query(MarketPrice).order_by(MarketPrice.id.desc()).limit(50).all()
-    if not prices:
-        # Add some sample market prices if none exist
-        import random
-        from datetime import datetime, timedelta
-        
-        crops = ['Wheat', 'Rice', 'Cotton', 'Sugarcane', 'Maize', 'Tomato', 'Onion', 'Potato']
-        mandis = ['Delhi', 'Mumbai', 'Kolkata', 'Chennai', 'Bangalore', 'Hyderabad', 'Pune', 'Ahmedabad']
-        
-        sample_prices = []
-        for crop in crops[:4]:  # Limit to 4 crops to avoid too much data
-            for mandi in mandis[:3]:  # Limit to 3 mandis per crop
-                price = random.randint(1500, 4500)  # Random price between 1500-4500
-                sample_prices.append(MarketPrice(
-                    crop=crop,
-                    mandi=mandi,
-                    price_per_quintal=price,
-                    date=datetime.utcnow() - timedelta(hours=random.randint(0, 24))
-                ))
-        
-        for price in sample_prices:
-            db.add(price)
+def list_prices(
+    response: Response,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_db),
+):
+    prices = keyset_page(db, MarketPrice, page, response=response, columns=PRICE_COLUMNS)
+    if not prices and page.after_id is None:
+        # The demo seed is a write: it goes to the primary (`primary` only
+        # connects here), and is read back from there, not from a lagging replica
+        sample_prices = sample_market_prices()
         try:
-            db.commit()
-            return db.query(MarketPrice).order_by(MarketPrice.id.desc()).limit(50).all()
-        except:
-            db.rollback()
-            return sample_prices
-    
-    # Add trend and change data to existing prices
-    enhanced_prices = []
-    for price in prices:
-        change_percent = round(random.uniform(-10, 10), 1)
-        trend = "up" if change_percent > 2 else "down" if change_percent < -2 else "stable"
-        enhanced_prices.append({
-            "id": price.id,
-            "crop": price.crop,
-            "mandi": price.mandi,
-            "price_per_quintal": price.price_per_quintal,
-            "quality": "A",
-            "unit": "quintal",
-            "date": price.date,
-            "change_percent": change_percent,
-            "trend": trend
-        })
-    
-    return enhanced_prices
+            store_market_prices(primary, sample_prices)
+        except SQLAlchemyError:
+            primary.rollback()
+            return unsaved_price_rows(sample_prices, page)
+        return keyset_page(primary, MarketPrice, page, response=response, columns=PRICE_COLUMNS)
+
+    return [with_price_trend(price) for price in prices]
 
 @router.get("/market/prices/{crop}")
-def get_crop_prices(crop: str, db: Session = Depends(get_db)):
-    prices = db.query(MarketPrice).filter(MarketPrice.crop.ilike(f"%{crop}%")).order_by(MarketPrice.id.desc()).limit(20).all()
+def get_crop_prices(crop: str, db: Session = Depends(get_read_db)):
+    prices = db.query(MarketPrice).filter(crop_key_matches(crop)).order_by(MarketPrice.id.desc()).limit(20).all()
     if not prices:
         return {"message": f"No prices found for {crop}", "prices": []}
     
@@ -589,30 +630,9 @@ def get_crop_prices(crop: str, db: Session = Depends(get_db)):
     return {"crop": crop, "prices": enhanced_prices}
 
 @router.get("/market/trends")
-def get_market_trends(db: Session = Depends(get_db)):
-    # Get average prices by crop for trend analysis
-    crops = db.query(MarketPrice.crop).distinct().all()
-    trends = []
-    
-    for crop_tuple in crops:
-        crop = crop_tuple[0]
-        prices = db.query(MarketPrice).filter(MarketPrice.crop == crop).order_by(MarketPrice.id.desc()).limit(10).all()
-        if prices:
-            avg_price = sum(p.price_per_quintal for p in prices) / len(prices)
-            latest_price = prices[0].price_per_quintal
-            change_percent = round(((latest_price - avg_price) / avg_price) * 100, 1)
-            trend = "up" if change_percent > 2 else "down" if change_percent < -2 else "stable"
-            
-            trends.append({
-                "crop": crop,
-                "current_price": latest_price,
-                "average_price": round(avg_price, 2),
-                "change_percent": change_percent,
-                "trend": trend,
-                "data_points": len(prices)
-            })
-    
-    return {"trends": trends, "last_updated": datetime.utcnow().isoformat()}
+def get_market_trends(db: Session = Depends(get_read_db)):
+    # Latest vs. last-10 average per crop, read from the per-crop rollups
+    return {"trends": rollup_trends(db), "last_updated": datetime.utcnow().isoformat()}
 
 # Rewards / Badges
 class BadgeCreate(BaseModel):
@@ -631,7 +651,7 @@ def create_badge(payload: BadgeCreate, db: Session = Depends(get_db)):
     return b
 
 @router.post("/rewards/award/{badge_code}")
-def award_badge(badge_code: str, user: User = Depends(current_user), db: Session = Depends(get_db)):
+def award_badge(badge_code: str, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     badge = db.query(Badge).filter(Badge.code==badge_code).first()
     if not badge:
         raise HTTPException(status_code=404, detail="Badge not found")
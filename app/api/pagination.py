@@ -0,0 +1,73 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> int:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError(last_id)
+        return last_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class PageParams:
+    """`?limit=&cursor=` query parameters shared by the list endpoints."""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="Opaque token from the previous page's X-Next-Cursor header"),
+    ):
+        self.limit = limit
+        self.after_id = decode_cursor(cursor) if cursor else None
+
+
+def keyset_statement(model, page: PageParams, *filters, descending: bool = True, columns: Optional[Sequence] = None) -> Select:
+    """SELECT for one page of `model` rows ordered by id, seeking past the
+    cursor's id instead of OFFSET; fetches one extra row to detect a next page."""
+    id_col = model.id
+    stmt = select(*(columns or model.__table__.columns)).where(*filters)
+    if page.after_id is not None:
+        stmt = stmt.where(id_col < page.after_id if descending else id_col > page.after_id)
+    return stmt.order_by(id_col.desc() if descending else id_col.asc()).limit(page.limit + 1)
+
+
+def page_rows(rows: Sequence, page: PageParams, response: Optional[Response] = None) -> List[Dict[str, Any]]:
+    """Plain column dicts for a fetched page; sets X-Next-Cursor on `response`
+    when more rows follow."""
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        if response is not None:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return [dict(r._mapping) for r in rows]
+
+
+def keyset_page(
+    db: Session,
+    model,
+    page: PageParams,
+    *filters,
+    response: Optional[Response] = None,
+    descending: bool = True,
+    columns: Optional[Sequence] = None,
+) -> List[Dict[str, Any]]:
+    """One page of `model` rows as plain column dicts (no ORM objects)."""
+    stmt = keyset_statement(model, page, *filters, descending=descending, columns=columns)
+    return page_rows(db.execute(stmt).all(), page, response)
@@ -0,0 +1,78 @@
+from typing import Any, AsyncIterator, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+
+from app.database.database import DATABASE_URL, InstrumentedQueuePool, _sqlite_pragmas, settings
+from settings import Settings
+
+# Sync dialect -> asyncio driver used for the DB_ASYNC stack
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """InstrumentedQueuePool over the asyncio-safe queue, so pool_stats()
+    reports the async engine the same way as the sync one."""
+
+
+def async_url(url: str) -> str:
+    """`url` rewritten for its asyncio driver (sqlite -> aiosqlite,
+    postgresql -> asyncpg); URLs that already name a driver are kept."""
+    parsed = make_url(url)
+    if "+" in parsed.drivername:
+        return url
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        raise ValueError(f"No asyncio driver configured for {parsed.drivername!r}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def make_async_engine(url: str, cfg: Settings = settings) -> AsyncEngine:
+    """AsyncEngine with the same pool sizing and SQLite pragmas as make_engine."""
+    parsed = make_url(async_url(url))
+    kwargs: Dict[str, Any] = {"echo": cfg.db_echo}
+    pool_kwargs = dict(
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=cfg.db_pool_size,
+        max_overflow=cfg.db_max_overflow,
+        pool_timeout=cfg.db_pool_timeout_s,
+    )
+    if parsed.get_backend_name() == "sqlite":
+        in_memory = parsed.database in (None, "", ":memory:")
+        kwargs.update({"poolclass": StaticPool} if in_memory else pool_kwargs)
+        engine = create_async_engine(parsed, **kwargs)
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas(cfg, in_memory))
+        return engine
+    kwargs.update(pool_kwargs, pool_recycle=cfg.db_pool_recycle_s, pool_pre_ping=cfg.db_pool_pre_ping)
+    return create_async_engine(parsed, **kwargs)
+
+
+# Created on first use so the asyncio drivers are only needed with DB_ASYNC on
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        _async_engine = make_async_engine(DATABASE_URL)
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+async def close_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _async_sessionmaker = None
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    get_async_engine()
+    async with _async_sessionmaker() as db:
+        yield db
@@ -1,20 +1,219 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
-import os
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./farmverse.db")
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import QueuePool, StaticPool
+from settings import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+DATABASE_URL = settings.database_url
+REPLICA_URLS = [u.strip() for u in settings.database_replica_urls.split(',') if u.strip()]
 
 class Base(DeclarativeBase):
     pass
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
-    future=True,
-    echo=False,
-)
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that also records checkout counts, the time spent waiting
+    for a connection (including opening one), timeouts and peak overflow."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.peak_overflow = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total_s += waited
+            self.wait_max_s = max(self.wait_max_s, waited)
+            self.peak_overflow = max(self.peak_overflow, self.overflow())
+        return conn
+
+
+def _sqlite_pragmas(cfg: Settings, in_memory: bool):
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(cfg.sqlite_busy_timeout_ms)}",
+        f"PRAGMA synchronous = {cfg.sqlite_synchronous}",
+        f"PRAGMA cache_size = {int(cfg.sqlite_cache_size)}",
+    ]
+    if not in_memory:
+        # WAL and mmap only mean something for a file on disk
+        pragmas.insert(0, f"PRAGMA journal_mode = {cfg.sqlite_journal_mode}")
+        pragmas.append(f"PRAGMA mmap_size = {int(cfg.sqlite_mmap_size)}")
+
+    def apply(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return apply
+
+
+def make_engine(url: str, cfg: Settings = settings) -> Engine:
+    """Engine tuned for the backend: a sized, pre-pinged, recycled pool for
+    server databases; per-connection pragmas (WAL etc.) for SQLite."""
+    parsed = make_url(url)
+    kwargs: Dict[str, Any] = {"future": True, "echo": cfg.db_echo}
+    if parsed.get_backend_name() == "sqlite":
+        in_memory = parsed.database in (None, "", ":memory:")
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if in_memory:
+            kwargs["poolclass"] = StaticPool
+        else:
+            kwargs.update(poolclass=InstrumentedQueuePool, pool_size=cfg.db_pool_size, max_overflow=cfg.db_max_overflow, pool_timeout=cfg.db_pool_timeout_s)
+        engine = create_engine(url, **kwargs)
+        event.listen(engine, "connect", _sqlite_pragmas(cfg, in_memory))
+        return engine
+    kwargs.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=cfg.db_pool_size,
+        max_overflow=cfg.db_max_overflow,
+        pool_timeout=cfg.db_pool_timeout_s,
+        pool_recycle=cfg.db_pool_recycle_s,
+        pool_pre_ping=cfg.db_pool_pre_ping,
+    )
+    return create_engine(url, **kwargs)
+
+
+def pool_stats(bind: Engine) -> Dict[str, Any]:
+    pool = bind.pool
+    stats: Dict[str, Any] = {"backend": bind.dialect.name, "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+            timeout_s=pool.timeout(),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool._stats_lock:
+            stats.update(
+                checkouts=pool.checkouts,
+                timeouts=pool.timeouts,
+                peak_overflow=pool.peak_overflow,
+                wait_avg_ms=round(pool.wait_total_s / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+                wait_max_ms=round(pool.wait_max_s * 1000, 3),
+            )
+    return stats
+
+
+class ReplicaSet:
+    """Read replicas handed out round-robin. A replica that cannot produce a
+    connection is benched for `retry_s` and the next one is tried; with every
+    replica down, callers fall back to the primary."""
+
+    def __init__(self, engines: Sequence[Engine], retry_s: float):
+        self.engines: List[Engine] = list(engines)
+        self.retry_s = retry_s
+        self._rr = itertools.count()
+        self._lock = threading.Lock()
+        self._down_until = [0.0] * len(self.engines)
+        self.reads = [0] * len(self.engines)
+        self.failures = [0] * len(self.engines)
+        self.fallbacks = 0
+
+    def connect(self) -> Optional[Connection]:
+        """A connection to the next healthy replica, or None."""
+        n = len(self.engines)
+        if not n:
+            return None
+        start = next(self._rr)
+        for i in ((start + k) % n for k in range(n)):
+            if self._down_until[i] > time.monotonic():
+                continue
+            try:
+                conn = self.engines[i].connect()
+            except (DBAPIError, PoolTimeoutError) as exc:
+                with self._lock:
+                    self._down_until[i] = time.monotonic() + self.retry_s
+                    self.failures[i] += 1
+                logger.warning("read replica %s unavailable for %.0fs: %s", self.engines[i].url.render_as_string(hide_password=True), self.retry_s, exc)
+                continue
+            with self._lock:
+                self.reads[i] += 1
+            return conn
+        with self._lock:
+            self.fallbacks += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            replicas = [
+                {
+                    "url": e.url.render_as_string(hide_password=True),
+                    "healthy": self._down_until[i] <= now,
+                    "reads": self.reads[i],
+                    "failures": self.failures[i],
+                    "pool": pool_stats(e),
+                }
+                for i, e in enumerate(self.engines)
+            ]
+            return {"replicas": replicas, "primary_fallbacks": self.fallbacks}
+
+
+def replica_stats() -> Dict[str, Any]:
+    return replicas.stats() if replicas.engines else {}
+
+
+# Read-your-writes: no server-side state. A committed write hands its wall-clock
+# time to the session's `on_write` callback (deps.py puts it in a cookie), and
+# the client presents it on later reads, so every worker routes them alike.
+def recently_wrote(wrote_at: Optional[float]) -> bool:
+    """Whether a write at `wrote_at` (epoch seconds) is still inside the
+    DB_READ_YOUR_WRITES_S window. Both directions count, for clock skew
+    between the hosts that stamp and check it."""
+    return wrote_at is not None and abs(time.time() - wrote_at) < settings.db_read_your_writes_s
+
+
+@event.listens_for(Session, "after_flush")
+def _track_writes(session, flush_context):
+    if "on_write" in session.info:
+        session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _report_write(session):
+    if session.info.pop("wrote", False):
+        session.info["on_write"](time.time())
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session):
+    session.info.pop("wrote", None)
+
+
+engine = make_engine(DATABASE_URL)
+replicas = ReplicaSet([make_engine(url) for url in REPLICA_URLS], settings.db_replica_retry_s)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+ReadSessionLocal = sessionmaker(autoflush=False, autocommit=False, future=True)
 
 def get_db():
     db = SessionLocal()
@@ -22,3 +221,35 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def track_writes(db: Session, on_write: Callable[[float], None]) -> None:
+    """Call `on_write(epoch seconds)` whenever `db` commits a write, so the
+    caller can keep its next reads on the primary (see recently_wrote)."""
+    if replicas.engines:
+        db.info["on_write"] = on_write
+
+def read_sessionmaker(pinned: bool = False) -> sessionmaker:
+    """Session factory for reads that start after the request's own session
+    is gone, e.g. a streamed response: bound to the replica read_session would
+    pick now (checked healthy), or to the primary under the same rules."""
+    if replicas.engines and not pinned:
+        conn = replicas.connect()
+        if conn is not None:
+            conn.close()
+            return sessionmaker(bind=conn.engine, autoflush=False, autocommit=False, future=True)
+    return SessionLocal
+
+def read_session(pinned: bool = False) -> Iterator[Session]:
+    """Session for read-only work: a replica round-robin, or the primary when
+    no replica is configured or healthy, or when `pinned` (the caller wrote
+    within the last DB_READ_YOUR_WRITES_S seconds)."""
+    conn = None
+    if replicas.engines and not pinned:
+        conn = replicas.connect()
+    db = ReadSessionLocal(bind=conn) if conn is not None else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        if conn is not None:
+            conn.close()
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, UniqueConstraint, Index
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 from .database import Base
 
@@ -88,14 +88,45 @@ class InsurancePolicy(Base):
     premium = Column(Float)
     status = Column(String, default='active')
 
+def crop_key_for(crop):
+    return crop.strip().lower() if crop else crop
+
 class MarketPrice(Base):
     __tablename__ = 'market_prices'
+    __table_args__ = (
+        Index('ix_market_prices_crop_mandi_id', 'crop', 'mandi', 'id'),
+        Index('ix_market_prices_crop_mandi_date', 'crop', 'mandi', 'date'),
+        Index('ix_market_prices_mandi_id', 'mandi', 'id'),
+        Index('ix_market_prices_crop_key_id', 'crop_key', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     crop = Column(String, index=True)
+    crop_key = Column(String)  # lower(trim(crop)), for case-insensitive exact/prefix lookups
     mandi = Column(String)
     price_per_quintal = Column(Float)
     date = Column(DateTime, default=datetime.utcnow)
 
+    @validates('crop')
+    def _set_crop_key(self, key, crop):
+        self.crop_key = crop_key_for(crop)
+        return crop
+
+class MarketPriceRollup(Base):
+    """Per-crop price summary kept in step with market_prices (mandi is always
+    "", the all-mandis row); `window` holds the newest prices as JSON [[id, price], ...]."""
+    __tablename__ = 'market_price_rollups'
+    __table_args__ = (UniqueConstraint('crop', 'mandi', name='uq_market_price_rollups_crop_mandi'),)
+    id = Column(Integer, primary_key=True)
+    crop = Column(String, nullable=False, index=True)
+    mandi = Column(String, nullable=False, default="")
+    latest_id = Column(Integer, nullable=False)
+    latest_price = Column(Float, nullable=False)
+    avg_price = Column(Float, nullable=False)
+    points = Column(Integer, nullable=False)
+    total_count = Column(Integer, nullable=False, default=0)
+    window = Column(Text, nullable=False, default="[]")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Badge(Base):
     __tablename__ = 'badges'
     id = Column(Integer, primary_key=True)
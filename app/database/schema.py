@@ -0,0 +1,76 @@
+import ast
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+ROOT = Path(__file__).resolve().parents[2]
+VERSIONS_DIR = ROOT / "alembic" / "versions"
+
+_REVISION_LINE = re.compile(r"^(revision|down_revision)\b[^=\n]*=\s*(.+)$", re.M)
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def alembic_config():
+    from alembic.config import Config
+
+    cfg = Config(str(ROOT / "alembic.ini"))
+    cfg.set_main_option("script_location", str(ROOT / "alembic"))
+    return cfg
+
+
+@lru_cache
+def head_revision() -> str:
+    """The single head of alembic/versions, read from the scripts' identifiers.
+    Importing Alembic costs more than the rest of the startup check, so the
+    worker boot path avoids it."""
+    revisions, parents = set(), set()
+    for path in VERSIONS_DIR.glob("*.py"):
+        ids = dict(_REVISION_LINE.findall(path.read_text(encoding="utf-8")))
+        revisions.add(ast.literal_eval(ids["revision"]))
+        down = ast.literal_eval(ids.get("down_revision", "None"))
+        parents.update(down if isinstance(down, (tuple, list)) else [down])
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise SchemaOutOfDate(f"expected one head revision in {VERSIONS_DIR}, found {sorted(heads)}")
+    return heads.pop()
+
+
+def current_revision(conn: Connection) -> Optional[str]:
+    if not inspect(conn).has_table("alembic_version"):
+        return None
+    versions = conn.execute(text("SELECT version_num FROM alembic_version")).scalars().all()
+    return ",".join(sorted(versions)) or None
+
+
+def upgrade_schema(engine: Engine, revision: str = "head") -> Optional[str]:
+    """Run Alembic migrations up to `revision` on `engine` (the deploy/bootstrap
+    step; `alembic upgrade head` does the same). Returns the new revision."""
+    from alembic import command
+
+    cfg = alembic_config()
+    cfg.attributes["configure_logger"] = False
+    with engine.begin() as conn:
+        cfg.attributes["connection"] = conn
+        command.upgrade(cfg, revision)
+        return current_revision(conn)
+
+
+def verify_schema(engine: Engine) -> str:
+    """Startup check: reads alembic_version, no DDL and no model reflection.
+    Raises SchemaOutOfDate unless the database is at the code's head revision."""
+    with engine.connect() as conn:
+        current = current_revision(conn)
+    head = head_revision()
+    if current != head:
+        raise SchemaOutOfDate(
+            f"database schema is at {current or 'no revision'} but this build expects {head}; "
+            "run `alembic upgrade head` (or `python market_cli.py migrate`) first"
+        )
+    return current
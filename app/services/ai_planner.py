@@ -1,7 +1,12 @@
-from dataclasses import dataclass
-from typing import List, Dict, Optional, Tuple
+from dataclasses import dataclass, replace
+import numpy as np
+from typing import Hashable, Iterable, List, Dict, NamedTuple, Optional, Tuple, Union
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.database.models import MarketPrice
+from app.services.market_data import record_prices
+from app.services.ttl_cache import TTLCache
+from settings import get_settings
 
 
 @dataclass
@@ -123,14 +128,42 @@ FALLBACK_MSP_PRICE: Dict[str, int] = {
 }
 
 
-def latest_market_price(db: Session, crop: str, mandi: Optional[str] = None) -> Optional[float]:
-    q = db.query(MarketPrice).filter(MarketPrice.crop == crop)
+def latest_market_prices(
+    db: Session,
+    crops: Optional[Iterable[str]] = None,
+    mandi: Optional[str] = None,
+    per_mandi: bool = False,
+) -> Dict[Union[str, Tuple[str, str]], float]:
+    """Latest price (highest id) per crop, or per (crop, mandi) when
+    `per_mandi` is set, fetched in a single statement."""
+    keys = [MarketPrice.crop, MarketPrice.mandi] if per_mandi else [MarketPrice.crop]
+    latest = db.query(func.max(MarketPrice.id).label("id"))
+    if crops is not None:
+        latest = latest.filter(MarketPrice.crop.in_(list(crops)))
     if mandi:
-        q = q.filter(MarketPrice.mandi == mandi)
-    q = q.order_by(MarketPrice.id.desc()).first()
-    if q:
-        return float(q.price_per_quintal)
-    return None
+        latest = latest.filter(MarketPrice.mandi == mandi)
+    latest = latest.group_by(*keys).subquery()
+    rows = (
+        db.query(MarketPrice.crop, MarketPrice.mandi, MarketPrice.price_per_quintal)
+        .join(latest, MarketPrice.id == latest.c.id)
+        .all()
+    )
+    if per_mandi:
+        return {(c, m): float(p) for c, m, p in rows}
+    return {c: float(p) for c, _, p in rows}
+
+
+def latest_market_price(db: Session, crop: str, mandi: Optional[str] = None) -> Optional[float]:
+    return latest_market_prices(db, [crop], mandi=mandi).get(crop)
+
+
+# Light regional preference: (state substrings, favoured crops), +0.5 each.
+REGION_BIAS: List[Tuple[Tuple[str, ...], Tuple[str, ...]]] = [
+    (("punjab", "haryana"), ("wheat", "rice")),
+    (("mp", "madhya"), ("soybean", "chickpea")),
+    (("rajasthan",), ("mustard", "bajra")),
+    (("maharashtra",), ("cotton", "soybean")),
+]
 
 
 def score_crop(item: Dict, data: PlannerInput) -> float:
@@ -156,63 +189,235 @@ def score_crop(item: Dict, data: PlannerInput) -> float:
     # region bias (very light heuristic)
     if data.state:
         st = data.state.lower()
-        if ("punjab" in st or "haryana" in st) and item["crop"] in ("wheat", "rice"):
-            score += 0.5
-        if ("mp" in st or "madhya" in st) and item["crop"] in ("soybean", "chickpea"):
-            score += 0.5
-        if ("rajasthan" in st) and item["crop"] in ("mustard", "bajra"):
-            score += 0.5
-        if ("maharashtra" in st) and item["crop"] in ("cotton", "soybean"):
-            score += 0.5
+        for states, crops in REGION_BIAS:
+            if any(k in st for k in states) and item["crop"] in crops:
+                score += 0.5
     return score
 
 
-def recommend_crops(data: PlannerInput, db: Session) -> List[Dict]:
-    recs: List[Tuple[float, Dict]] = []
-    for item in REFERENCE_CROPS:
-        s = score_crop(item, data)
-        if s <= 0:
-            continue
-        # estimate price
-        price = latest_market_price(db, item["crop"]) or FALLBACK_MSP_PRICE.get(item["crop"], 2000)
-        est_yield = item["yield_quintal_per_acre"]
-        revenue_per_acre = est_yield * price
-        profit_per_acre = revenue_per_acre - item["base_cost_per_acre"]
-        duration = item["duration_days"]
-        details = {
-            "crop": item["crop"],
-            "score": round(s, 2),
-            "season": data.season,
-            "ph_fit": item["ph_range"],
-            "water_need": item["water"],
-            "duration_days": duration,
-            "estimated_yield_quintal_per_acre": est_yield,
-            "assumed_price_per_quintal": price,
-            "estimated_profit_per_acre": round(profit_per_acre, 2),
-            "estimated_profit_total": round(profit_per_acre * data.area_acres, 2),
-            "seed_rate_kg_per_acre": item["seed_rate_kg_per_acre"],
-            "base_cost_per_acre": item["base_cost_per_acre"],
-            "reason": _reason(item, data),
-        }
-        recs.append((s, details))
-    recs.sort(key=lambda x: x[0], reverse=True)
-    return [d for _, d in recs[:8]]
+class PlanEntry(NamedTuple):
+    details: Dict
+    profit_per_acre: float
+    integral: bool
+
+
+class CropMatrix:
+    """Columnar view of REFERENCE_CROPS for array-based scoring.
+
+    Each column holds one attribute for every crop; seasons are a bitmask
+    and water needs an integer class. Scores follow score_crop term by term
+    (same order of float additions), so results match the per-crop path.
+    """
+
+    def __init__(self, crops: List[Dict]):
+        self.items = crops
+        self.names = [c["crop"] for c in crops]
+        seasons = sorted({s for c in crops for s in c["seasons"]})
+        self.season_bits = {s: 1 << i for i, s in enumerate(seasons)}
+        waters = sorted({c["water"] for c in crops})
+        self.water_codes = {w: i for i, w in enumerate(waters)}
+
+        self.season_mask = np.array([sum(self.season_bits[s] for s in set(c["seasons"])) for c in crops], dtype=np.int64)
+        self.ph_lo = np.array([c["ph_range"][0] for c in crops], dtype=np.float64)
+        self.ph_hi = np.array([c["ph_range"][1] for c in crops], dtype=np.float64)
+        self.water = np.array([self.water_codes[c["water"]] for c in crops], dtype=np.int64)
+        self.cost = np.array([c["base_cost_per_acre"] for c in crops], dtype=np.float64)
+        self.yield_q = np.array([c["yield_quintal_per_acre"] for c in crops], dtype=np.float64)
+        self.duration = np.array([c["duration_days"] for c in crops], dtype=np.int64)
+        # Integer inputs keep integer outputs, as in the scalar arithmetic.
+        self.int_econ = np.array(
+            [isinstance(c["yield_quintal_per_acre"], int) and isinstance(c["base_cost_per_acre"], int) for c in crops]
+        )
+        self.region_masks = np.array([[c["crop"] in favoured for c in crops] for _, favoured in REGION_BIAS])
+
+    def price_vector(self, prices: Dict[str, float]) -> List:
+        return [prices.get(name) or FALLBACK_MSP_PRICE.get(name, 2000) for name in self.names]
+
+    def score(self, inputs: List[PlannerInput]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Score every input against every crop.
+
+        Returns (scores, season_match, ph_ok, water_match), each shaped
+        (len(inputs), n_crops).
+        """
+        n, k = len(inputs), len(self.names)
+        season_bit = np.array([self.season_bits.get(d.season.lower(), 0) for d in inputs], dtype=np.int64)
+        has_ph = np.array([d.ph is not None for d in inputs])
+        ph = np.array([d.ph if d.ph is not None else np.nan for d in inputs], dtype=np.float64)
+        has_water = np.array([bool(d.water_availability) for d in inputs])
+        water = np.array(
+            [self.water_codes.get(d.water_availability.lower(), -1) if d.water_availability else -1 for d in inputs],
+            dtype=np.int64,
+        )
+        states = [d.state.lower() if d.state else None for d in inputs]
+
+        scores = np.zeros((n, k), dtype=np.float64)
+        season_match = (self.season_mask[None, :] & season_bit[:, None]) != 0
+        scores += np.where(season_match, 2.0, 0.0)
+
+        ph_col = ph[:, None]
+        with np.errstate(invalid="ignore"):
+            ph_ok = (self.ph_lo <= ph_col) & (ph_col <= self.ph_hi)
+            d = np.minimum(np.abs(ph_col - self.ph_lo), np.abs(ph_col - self.ph_hi))
+            ph_term = np.where(ph_ok, 2.0, np.maximum(0.0, 1.5 - d))
+        scores += np.where(has_ph[:, None], ph_term, 0.0)
+        ph_ok &= has_ph[:, None]
+
+        water_match = has_water[:, None] & (water[:, None] == self.water[None, :])
+        scores += np.where(has_water[:, None], np.where(water_match, 1.5, 0.5), 0.0)
+
+        for r, (keys, _) in enumerate(REGION_BIAS):
+            hit = np.array([st is not None and any(key in st for key in keys) for st in states])
+            scores += np.where(hit[:, None] & self.region_masks[r][None, :], 0.5, 0.0)
+        return scores, season_match, ph_ok, water_match
+
+    def plan(self, inputs: List[PlannerInput], prices: Dict[str, float], top_n: int = 8) -> List[List[PlanEntry]]:
+        """Ranked, area-independent recommendations for each input; see
+        scale_plan for turning them into per-farm results."""
+        scores, season_match, ph_ok, water_match = self.score(inputs)
+        price = self.price_vector(prices)
+        profit_per_acre = self.yield_q * np.array(price, dtype=np.float64) - self.cost
+        int_profit = self.int_econ & np.array([isinstance(p, int) for p in price])
+
+        plans: List[List[PlanEntry]] = []
+        for row, data in enumerate(inputs):
+            row_scores = scores[row]
+            eligible = np.flatnonzero(row_scores > 0)
+            ranked = eligible[np.argsort(-row_scores[eligible], kind="stable")][:top_n]
+            entries = []
+            for j in ranked:
+                item = self.items[j]
+                details = {
+                    "crop": item["crop"],
+                    "score": round(float(row_scores[j]), 2),
+                    "season": data.season,
+                    "ph_fit": item["ph_range"],
+                    "water_need": item["water"],
+                    "duration_days": item["duration_days"],
+                    "estimated_yield_quintal_per_acre": item["yield_quintal_per_acre"],
+                    "assumed_price_per_quintal": price[j],
+                    "estimated_profit_per_acre": round(_as_number(profit_per_acre[j], int_profit[j]), 2),
+                    "estimated_profit_total": None,
+                    "seed_rate_kg_per_acre": item["seed_rate_kg_per_acre"],
+                    "base_cost_per_acre": item["base_cost_per_acre"],
+                    "reason": _reason(season_match[row, j], ph_ok[row, j], water_match[row, j], data.state),
+                }
+                entries.append(PlanEntry(details, float(profit_per_acre[j]), bool(int_profit[j])))
+            plans.append(entries)
+        return plans
+
+    def recommend(self, inputs: List[PlannerInput], prices: Dict[str, float], top_n: int = 8) -> List[List[Dict]]:
+        plans = self.plan(inputs, prices, top_n)
+        return [scale_plan(plan, data.area_acres) for plan, data in zip(plans, inputs)]
+
+
+def scale_plan(plan: List[PlanEntry], area_acres: float) -> List[Dict]:
+    int_area = isinstance(area_acres, int)
+    recs = []
+    for entry in plan:
+        rec = dict(entry.details)
+        total = entry.profit_per_acre * float(area_acres)
+        rec["estimated_profit_total"] = round(int(total) if entry.integral and int_area else total, 2)
+        recs.append(rec)
+    return recs
 
 
-def _reason(item: Dict, data: PlannerInput) -> str:
+def _as_number(value: np.floating, integral: bool):
+    return int(value) if integral else float(value)
+
+
+def _reason(season_ok: bool, ph_ok: bool, water_ok: bool, state: Optional[str]) -> str:
     bits = []
-    if data.season.lower() in item["seasons"]:
+    if season_ok:
         bits.append("season match")
-    lo, hi = item["ph_range"]
-    if data.ph is not None and lo <= data.ph <= hi:
+    if ph_ok:
         bits.append("pH suitable")
-    if data.water_availability and data.water_availability.lower() == item["water"]:
+    if water_ok:
         bits.append("water availability match")
-    if data.state:
-        bits.append(f"region: {data.state}")
+    if state:
+        bits.append(f"region: {state}")
     return ", ".join(bits) or "balanced choice"
 
 
+CROP_MATRIX = CropMatrix(REFERENCE_CROPS)
+
+
+# Memoized area-independent plans, keyed by the quantized planner input and
+# the price version they were computed at (see price_version).
+_plan_cache = TTLCache(get_settings().planner_cache_size, get_settings().planner_cache_ttl_s)
+
+
+def invalidate_plan_cache() -> None:
+    """Drop this process's memoized plans, e.g. for a cold-cache benchmark.
+    Price writes need no call: they change price_version."""
+    _plan_cache.clear()
+
+
+def plan_cache_stats() -> Dict:
+    return _plan_cache.stats()
+
+
+def price_version(db: Session) -> int:
+    """Newest market_prices id. Prices are only ever inserted (seeds and the
+    bulk ingest), so this moves with every price write, from any worker or
+    connection, and one indexed read per request keeps every cache current."""
+    return db.query(func.max(MarketPrice.id)).scalar() or 0
+
+
+def quantize_input(data: PlannerInput) -> PlannerInput:
+    """pH to 0.1 and lower-cased water level; area is applied after lookup."""
+    return replace(
+        data,
+        ph=round(data.ph, 1) if data.ph is not None else None,
+        water_availability=(data.water_availability or "").lower() or None,
+    )
+
+
+def _plan_key(data: PlannerInput, version: int) -> Hashable:
+    q = quantize_input(data)
+    return (version, q.season, q.ph, q.water_availability, q.state)
+
+
+def recommend_crops(data: PlannerInput, db: Session) -> List[Dict]:
+    return recommend_crops_batch([data], db)[0]
+
+
+def recommend_crops_batch(
+    inputs: List[PlannerInput],
+    db: Session,
+    prices: Optional[Dict[str, float]] = None,
+) -> List[List[Dict]]:
+    """Recommendations for many farmers at once.
+
+    Inputs are quantized (see quantize_input) and served from the plan cache
+    at the current price_version where possible; the rest share one price
+    lookup and one array pass.
+    Passing explicit `prices` bypasses the cache.
+    """
+    if not inputs:
+        return []
+    if prices is not None:
+        return CROP_MATRIX.recommend([quantize_input(d) for d in inputs], prices)
+
+    version = price_version(db)
+    keys = [_plan_key(d, version) for d in inputs]
+    plans: Dict[Hashable, List[PlanEntry]] = {}
+    missing: Dict[Hashable, PlannerInput] = {}
+    for key, data in zip(keys, inputs):
+        if key in plans or key in missing:
+            continue
+        cached = _plan_cache.get(key)
+        if cached is None:
+            missing[key] = quantize_input(data)
+        else:
+            plans[key] = cached
+    if missing:
+        prices = latest_market_prices(db, CROP_MATRIX.names)
+        for key, plan in zip(missing, CROP_MATRIX.plan(list(missing.values()), prices)):
+            plans[key] = plan
+            _plan_cache.set(key, plan)
+    return [scale_plan(plans[key], data.area_acres) for key, data in zip(keys, inputs)]
+
+
 def mandi_rates(db: Session, crop: Optional[str] = None, mandi: Optional[str] = None, limit: int = 50) -> List[Dict]:
     q = db.query(MarketPrice)
     if crop:
@@ -246,11 +451,13 @@ def demo_seed_prices(db: Session) -> int:
         ("bajra", "Jaipur", 2520.0),
     ]
     from app.database.models import MarketPrice as MP
-    cnt = 0
+    added = []
     for c, m, p in samples:
         exists = db.query(MP).filter(MP.crop==c, MP.mandi==m, MP.price_per_quintal==p).first()
         if not exists:
-            db.add(MP(crop=c, mandi=m, price_per_quintal=p))
-            cnt += 1
+            added.append(MP(crop=c, mandi=m, price_per_quintal=p))
+            db.add(added[-1])
+    db.flush()
+    record_prices(db, added)
     db.commit()
-    return cnt
+    return len(added)
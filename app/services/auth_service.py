@@ -1,13 +1,24 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from passlib.context import CryptContext
 from jose import jwt, JWTError
+from app.services.ttl_cache import TTLCache
+import json
 import os
+import threading
+import time
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 JWT_SECRET = os.getenv("JWT_SECRET", "devsecret")
 JWT_ALG = "HS256"
 JWT_EXP_MIN = int(os.getenv("JWT_EXP_MIN", "60"))
+# Optional rotating keyring: {"active": "<kid>", "keys": {"<kid>": "<secret>", ...}}.
+# Re-read when its mtime changes. Without a keyring, tokens without a kid verify
+# against JWT_SECRET; with one, only while it names a key for them under "legacy".
+JWT_KEYS_FILE = os.getenv("JWT_KEYS_FILE")
+JWT_KEYS_CHECK_S = 1.0
+# Verified token -> claims, each entry expiring with its token
+_claims_cache = TTLCache(int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "10000")), JWT_EXP_MIN * 60)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -15,14 +26,89 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
-def create_access_token(sub: str) -> str:
+class _Keyring:
+    """Signing keys by kid, reloaded from JWT_KEYS_FILE when it changes."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.active: Optional[str] = None
+        self.legacy: Optional[str] = None
+        self.keys: Dict[str, str] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not self.path or (not force and now - self._checked_at < JWT_KEYS_CHECK_S):
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                return  # keep the last good keyring
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path) as fh:
+                    data = json.load(fh)
+                keys = {str(k): str(v) for k, v in data["keys"].items()}
+                active, legacy = data.get("active"), data.get("legacy")
+                if active not in keys:
+                    raise ValueError(f"active kid {active!r} not in keys")
+                if legacy is not None and legacy not in keys:
+                    raise ValueError(f"legacy kid {legacy!r} not in keys")
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                return
+            self.keys, self.active, self.legacy, self._mtime = keys, active, legacy, mtime
+            # Retired kids must stop verifying straight away
+            _claims_cache.clear()
+
+    def signing_key(self) -> Tuple[Optional[str], str]:
+        self.refresh()
+        if self.active:
+            return self.active, self.keys[self.active]
+        return None, JWT_SECRET
+
+    def verify_key(self, kid: Optional[str]) -> Optional[str]:
+        self.refresh()
+        if kid is None:
+            # Pre-keyring tokens: accepted only until the keyring stops listing their key
+            if not self.keys:
+                return JWT_SECRET
+            return self.keys.get(self.legacy) if self.legacy else None
+        return self.keys.get(kid)
+
+_keyring = _Keyring(JWT_KEYS_FILE)
+
+def create_access_token(sub: str, claims: Optional[Dict[str, Any]] = None) -> str:
     exp = datetime.utcnow() + timedelta(minutes=JWT_EXP_MIN)
-    payload = {"sub": sub, "exp": exp}
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
+    payload = {**(claims or {}), "sub": sub, "exp": exp}
+    kid, secret = _keyring.signing_key()
+    return jwt.encode(payload, secret, algorithm=JWT_ALG, headers={"kid": kid} if kid else None)
 
-def decode_token(token: str) -> Optional[str]:
+def decode_claims(token: str) -> Optional[Dict[str, Any]]:
+    _keyring.refresh()
+    cached = _claims_cache.get(token)
+    if cached is not None:
+        if cached.get("exp") is None or cached["exp"] > time.time():
+            return dict(cached)
+        _claims_cache.pop(token)
     try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        return data.get("sub")
+        secret = _keyring.verify_key(jwt.get_unverified_header(token).get("kid"))
+        if secret is None:
+            return None
+        claims = jwt.decode(token, secret, algorithms=[JWT_ALG])
     except JWTError:
         return None
+    exp = claims.get("exp")
+    _claims_cache.set(token, claims, ttl_s=None if exp is None else max(0.0, exp - time.time()))
+    return dict(claims)
+
+def claims_cache_stats() -> Dict[str, Any]:
+    return {**_claims_cache.stats(), "active_kid": _keyring.active, "legacy_kid": _keyring.legacy, "kids": sorted(_keyring.keys)}
+
+def decode_token(token: str) -> Optional[str]:
+    data = decode_claims(token)
+    return data.get("sub") if data else None
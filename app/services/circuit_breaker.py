@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for an upstream dependency.
+
+    The last `window` calls are tracked; calls slower than `slow_call_s` count
+    as failures. Once at least `min_calls` are recorded and the failure ratio
+    reaches `failure_ratio`, the breaker opens and `allow()` returns False for
+    `reset_timeout_s`. It then lets a single probe through (half-open): success
+    closes the breaker, failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        min_calls: int = 5,
+        window: int = 20,
+        slow_call_s: float = 8.0,
+        reset_timeout_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.slow_call_s = slow_call_s
+        self.reset_timeout_s = reset_timeout_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls: Deque[Tuple[bool, Optional[float]]] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.trips = 0
+        self.successes = 0
+        self.failures = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout_s:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self, latency_s: float) -> None:
+        if latency_s >= self.slow_call_s:
+            self.record_failure(latency_s)
+            return
+        with self._lock:
+            self.successes += 1
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._calls.clear()
+            self._calls.append((True, latency_s))
+
+    def record_failure(self, latency_s: Optional[float] = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self._calls.append((False, latency_s))
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                failed = sum(1 for ok, _ in self._calls if not ok)
+                if failed / len(self._calls) >= self.failure_ratio:
+                    self._trip()
+
+    def release(self) -> None:
+        """Give back a half-open probe slot when a call ended without an outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._probe_in_flight = False
+        self.trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            latencies = sorted(lat for _, lat in self._calls if lat is not None)
+            failed = sum(1 for ok, _ in self._calls if not ok)
+            return {
+                "state": state,
+                "trips": self.trips,
+                "successes": self.successes,
+                "failures": self.failures,
+                "short_circuited": self.short_circuited,
+                "window_calls": len(self._calls),
+                "window_failure_ratio": round(failed / len(self._calls), 4) if self._calls else 0.0,
+                "window_p50_latency_s": round(latencies[len(latencies) // 2], 4) if latencies else None,
+                "window_max_latency_s": round(latencies[-1], 4) if latencies else None,
+            }
@@ -0,0 +1,208 @@
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+def normalize_text(txt: str) -> str:
+    # Unicode normalize then keep basic latin letters, digits, whitespace, Devanagari.
+    txt = unicodedata.normalize('NFC', txt)
+    return re.sub(r"[^a-z0-9\s\u0900-\u097F]", " ", txt.lower())
+
+
+def is_hindi(txt: str) -> bool:
+    return any('\u0900' <= ch <= '\u097F' for ch in txt)
+
+
+@dataclass(frozen=True, slots=True)
+class KBPattern:
+    text: str
+    norm: str
+    tokens: FrozenSet[str]
+    size: int
+
+
+@dataclass(frozen=True, slots=True)
+class KBEntry:
+    patterns: Tuple[KBPattern, ...]
+    answer_en: str
+    answer_hi: str
+
+
+def compile_pattern(pat: str) -> KBPattern:
+    norm = normalize_text(pat)
+    tokens = frozenset(norm.split())
+    return KBPattern(text=pat, norm=norm, tokens=tokens, size=len(tokens))
+
+
+def compile_entry(entry: Dict[str, Any]) -> KBEntry:
+    return KBEntry(
+        patterns=tuple(compile_pattern(p) for p in entry["patterns"]),
+        answer_en=entry["answer_en"],
+        answer_hi=entry["answer_hi"],
+    )
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: reports every pattern contained in a
+    text in a single left-to-right pass, independent of the pattern count.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+        for pat in set(patterns):
+            self._insert(pat)
+        self._link()
+
+    def _insert(self, pat: str) -> None:
+        state = 0
+        for ch in pat:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (pat,)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                # Inherit matches ending at the longest proper suffix.
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> Set[str]:
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: Set[str] = set(out[0])
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                hits.update(out[state])
+        return hits
+
+    def find_each(self, texts: Sequence[str], sep: str = "\0") -> List[Set[str]]:
+        """find_all for every text in one pass over their `sep`-joined
+        concatenation. `sep` must not occur in any pattern, so no match can
+        span two texts and the automaton restarts at each boundary."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: List[Set[str]] = [set(out[0]) for _ in texts]
+        if not texts:
+            return found
+        i = state = 0
+        for ch in sep.join(texts):
+            if ch == sep:
+                i += 1
+                state = 0
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found[i].update(out[state])
+        return found
+
+
+class KBIndex:
+    """Compiled KB, built once when the KB is loaded.
+
+    A pattern can only score when all of its tokens appear in the message
+    (token postings) or when its normalized text is a substring of the
+    message (Aho-Corasick hits). Every other entry scores 0, so lookups
+    only need to visit entries reached through either of those.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = [compile_entry(e) for e in entries]
+        self._token_postings: Dict[str, List[int]] = {}
+        self._norm_postings: Dict[str, List[int]] = {}
+        for idx, entry in enumerate(self.entries):
+            for pat in entry.patterns:
+                for tok in pat.tokens:
+                    self._add(self._token_postings, tok, idx)
+                self._add(self._norm_postings, pat.norm, idx)
+        self._matcher = AhoCorasick(self._norm_postings)
+
+    @staticmethod
+    def _add(postings: Dict[str, List[int]], key: str, idx: int) -> None:
+        bucket = postings.setdefault(key, [])
+        if not bucket or bucket[-1] != idx:
+            bucket.append(idx)
+
+    def candidates(self, words: Iterable[str], hits: Iterable[str]) -> List[int]:
+        found: Set[int] = set()
+        for tok in words:
+            found.update(self._token_postings.get(tok, ()))
+        for pat_norm in hits:
+            found.update(self._norm_postings[pat_norm])
+        return sorted(found)
+
+    @staticmethod
+    def _score(entry: KBEntry, words: Set[str], hits: Set[str]) -> int:
+        score = 0
+        for pat in entry.patterns:
+            # Check if all pattern words are in the message
+            if pat.tokens.issubset(words):
+                score = pat.size
+            # Also check substring matching for partial matches
+            elif pat.norm in hits:
+                score = max(score, 1)
+        return score
+
+    def _best_entries(self, norms: List[str]) -> List[Optional[KBEntry]]:
+        """Best entry per normalized message: one automaton pass over all of
+        them, then one walk over the entries any of them reached, each entry
+        scored against just the messages that reached it."""
+        words = [set(norm.split()) for norm in norms]
+        hits = self._matcher.find_each(norms)  # normalize_text never leaves a NUL
+        reached: Dict[int, List[int]] = {}
+        for m, (msg_words, msg_hits) in enumerate(zip(words, hits)):
+            for idx in self.candidates(msg_words, msg_hits):
+                reached.setdefault(idx, []).append(m)
+
+        best: List[Optional[KBEntry]] = [None] * len(norms)
+        best_score = [0] * len(norms)
+        # Ascending entry order, strict improvement: ties go to the earliest entry
+        for idx in sorted(reached):
+            entry = self.entries[idx]
+            for m in reached[idx]:
+                score = self._score(entry, words[m], hits[m])
+                if score > best_score[m]:
+                    best_score[m] = score
+                    best[m] = entry
+        return best
+
+    def find_answer(self, message: str) -> Optional[str]:
+        best = self._best_entries([normalize_text(message)])[0]
+        if best is None:
+            return None
+        return best.answer_hi if is_hindi(message) else best.answer_en
+
+    def find_answers(self, messages: List[str]) -> List[Optional[str]]:
+        """Batch lookup: the distinct normalized messages share one automaton
+        pass and one scoring walk (see _best_entries)."""
+        norms = [normalize_text(m) for m in messages]
+        distinct = list(dict.fromkeys(norms))
+        best = dict(zip(distinct, self._best_entries(distinct)))
+        answers: List[Optional[str]] = []
+        for message, norm in zip(messages, norms):
+            entry = best[norm]
+            if entry is None:
+                answers.append(None)
+            else:
+                answers.append(entry.answer_hi if is_hindi(message) else entry.answer_en)
+        return answers
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from app.services.circuit_breaker import CircuitBreaker
+from settings import Settings, get_settings
+
+logger = logging.getLogger("khetguru")
+
+
+class LLMError(Exception):
+    """Raised when the upstream completion could not be obtained in time."""
+
+
+class CircuitOpenError(LLMError):
+    """Raised without contacting the upstream while the breaker is open."""
+
+
+class LLMClient:
+    """Shared, connection-pooled client for the OpenAI chat completions API.
+
+    One instance lives for the lifetime of the app so TCP/TLS connections are
+    reused across chats. `max_concurrency` caps in-flight completions and every
+    call is bounded by a deadline that includes time spent queueing for a slot.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model: str,
+        base_url: str = "https://api.openai.com/v1",
+        timeout_s: float = 20.0,
+        max_connections: int = 20,
+        max_concurrency: int = 10,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.timeout_s = timeout_s
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "LLMClient":
+        return cls(
+            api_key=settings.openai_api_key or os.getenv("OPENAI_API_KEY"),
+            model=settings.model_name or "gpt-3.5-turbo",
+            base_url=settings.openai_base_url,
+            timeout_s=settings.llm_timeout_s,
+            max_connections=settings.llm_max_connections,
+            max_concurrency=settings.llm_max_concurrency,
+            breaker=CircuitBreaker(
+                failure_ratio=settings.llm_breaker_failure_ratio,
+                min_calls=settings.llm_breaker_min_calls,
+                window=settings.llm_breaker_window,
+                slow_call_s=settings.llm_breaker_slow_call_s,
+                reset_timeout_s=settings.llm_breaker_reset_s,
+            ),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(self.timeout_s, connect=min(self.timeout_s, 5.0)),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def build_payload(self, messages: List[Dict[str, str]], stream: bool = False) -> Dict:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 300,
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def chat(self, messages: List[Dict[str, str]], deadline_s: Optional[float] = None) -> str:
+        if not self.enabled:
+            raise LLMError("no API key configured")
+        if not self.breaker.allow():
+            raise CircuitOpenError("circuit open")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            reply = await asyncio.wait_for(self._chat(messages), deadline_s or self.timeout_s)
+        except asyncio.TimeoutError as exc:
+            self.breaker.record_failure(loop.time() - started)
+            raise LLMError("deadline exceeded") from exc
+        except httpx.HTTPError as exc:
+            self.breaker.record_failure(loop.time() - started)
+            raise LLMError(f"transport error: {exc!r}") from exc
+        except LLMError:
+            self.breaker.record_failure(loop.time() - started)
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success(loop.time() - started)
+        return reply
+
+    async def _chat(self, messages: List[Dict[str, str]]) -> str:
+        async with self._slots:
+            r = await self.http.post("/chat/completions", json=self.build_payload(messages))
+        if r.status_code != 200:
+            raise LLMError(f"non-200 status {r.status_code}")
+        try:
+            return r.json()["choices"][0]["message"]["content"].strip()
+        except (ValueError, KeyError, IndexError, TypeError) as exc:
+            raise LLMError("malformed completion payload") from exc
+
+    async def stream_chat(self, messages: List[Dict[str, str]], deadline_s: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield content deltas as the upstream produces them.
+
+        `deadline_s` bounds the wait for the first token (including queueing
+        for a slot and for the response headers); later chunks are bounded by
+        the client read timeout.
+        """
+        if not self.enabled:
+            raise LLMError("no API key configured")
+        if not self.breaker.allow():
+            raise CircuitOpenError("circuit open")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + (deadline_s or self.timeout_s)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), deadline_s or self.timeout_s)
+        except asyncio.TimeoutError as exc:
+            self.breaker.record_failure(loop.time() - started)
+            raise LLMError("deadline exceeded") from exc
+        first_token_s: Optional[float] = None
+        outcome_recorded = False
+        try:
+            request = self.http.build_request("POST", "/chat/completions", json=self.build_payload(messages, stream=True))
+            async with asyncio.timeout_at(deadline):
+                r = await self.http.send(request, stream=True)
+            try:
+                if r.status_code != 200:
+                    raise LLMError(f"non-200 status {r.status_code}")
+                lines = r.aiter_lines()
+                first = True
+                while True:
+                    try:
+                        if first:
+                            async with asyncio.timeout_at(deadline):
+                                line = await lines.__anext__()
+                        else:
+                            line = await lines.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        return
+                    try:
+                        delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    except (ValueError, KeyError, IndexError, TypeError, AttributeError) as exc:
+                        raise LLMError("malformed stream chunk") from exc
+                    if delta:
+                        if first:
+                            first = False
+                            first_token_s = loop.time() - started
+                        yield delta
+            finally:
+                await r.aclose()
+        except asyncio.TimeoutError as exc:
+            outcome_recorded = True
+            self.breaker.record_failure(loop.time() - started)
+            raise LLMError("deadline exceeded") from exc
+        except httpx.HTTPError as exc:
+            outcome_recorded = True
+            self.breaker.record_failure(loop.time() - started)
+            raise LLMError(f"transport error: {exc!r}") from exc
+        except LLMError:
+            outcome_recorded = True
+            self.breaker.record_failure(loop.time() - started)
+            raise
+        finally:
+            self._slots.release()
+            if not outcome_recorded:
+                if first_token_s is not None:
+                    # Streams are judged on time to first token.
+                    self.breaker.record_success(first_token_s)
+                else:
+                    self.breaker.release()
+
+
+_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        _client = LLMClient.from_settings(get_settings())
+    return _client
+
+
+def set_llm_client(client: Optional[LLMClient]) -> None:
+    global _client
+    _client = client
+
+
+async def close_llm_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
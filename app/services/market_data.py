@@ -0,0 +1,297 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Select, and_, case, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.orm import Session
+from sqlalchemy.engine import Row
+
+from app.database.models import MarketPrice, MarketPriceRollup, crop_key_for
+
+TREND_WINDOW = 10
+ALL_MANDIS = ""
+
+
+def crop_key_matches(crop: str) -> ColumnElement:
+    """Case-insensitive prefix match on the indexed crop_key, written as a
+    half-open range (`key <= crop_key < next`) so every backend can seek it."""
+    key = crop_key_for(crop) or ""
+    if not key:
+        return MarketPrice.crop_key.isnot(None)
+    upper = key[:-1] + chr(ord(key[-1]) + 1)
+    return and_(MarketPrice.crop_key >= key, MarketPrice.crop_key < upper)
+
+
+def _trend(crop: str, latest: float, avg: float, points: int) -> Dict:
+    change_percent = round(((latest - avg) / avg) * 100, 1)
+    trend = "up" if change_percent > 2 else "down" if change_percent < -2 else "stable"
+    return {
+        "crop": crop,
+        "current_price": latest,
+        "average_price": round(avg, 2),
+        "change_percent": change_percent,
+        "trend": trend,
+        "data_points": points,
+    }
+
+
+def market_trends_statement(window: int = TREND_WINDOW) -> Select:
+    """Latest price vs. the average of the last `window` prices, per crop,
+    as a single statement (ROW_NUMBER window; SQLite 3.25+ and Postgres)."""
+    ranked = select(
+        MarketPrice.crop.label("crop"),
+        MarketPrice.price_per_quintal.label("price"),
+        func.row_number().over(partition_by=MarketPrice.crop, order_by=MarketPrice.id.desc()).label("rn"),
+    ).subquery()
+    return (
+        select(
+            ranked.c.crop,
+            func.max(case((ranked.c.rn == 1, ranked.c.price))).label("latest"),
+            func.avg(ranked.c.price).label("avg"),
+            func.count().label("points"),
+        )
+        .where(ranked.c.rn <= window)
+        .group_by(ranked.c.crop)
+        .order_by(ranked.c.crop)
+    )
+
+
+def trends_from_rows(rows: Iterable[Row]) -> List[Dict]:
+    return [_trend(crop, latest, float(avg), points) for crop, latest, avg, points in rows]
+
+
+def market_trends(db: Session, window: int = TREND_WINDOW) -> List[Dict]:
+    return trends_from_rows(db.execute(market_trends_statement(window)))
+
+
+# --- Rollups: per-crop summaries maintained on insert ---
+
+def _push(window: List[List], row_id: int, price: float, size: int) -> List[List]:
+    """Insert (row_id, price) into an id-descending window, keeping `size` newest."""
+    if any(i == row_id for i, _ in window):
+        return window
+    pos = 0
+    while pos < len(window) and window[pos][0] > row_id:
+        pos += 1
+    return (window[:pos] + [[row_id, price]] + window[pos:])[:size]
+
+
+def _rollup_values(crop: str, mandi: str, window: List[List], total: int) -> Dict:
+    return {
+        "crop": crop,
+        "mandi": mandi,
+        "window": json.dumps(window),
+        "latest_id": window[0][0],
+        "latest_price": window[0][1],
+        "avg_price": sum(p for _, p in window) / len(window),
+        "points": len(window),
+        "total_count": total,
+        "updated_at": datetime.utcnow(),
+    }
+
+
+_ROLLUPS = MarketPriceRollup.__table__
+_ROLLUP_KEY = [_ROLLUPS.c.crop, _ROLLUPS.c.mandi]
+_DIALECT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+
+def _rollup_insert(db: Session):
+    """INSERT for market_price_rollups that supports ON CONFLICT (crop, mandi),
+    or None on dialects without it (rollups are then not maintained)."""
+    dialect = _DIALECT_INSERTS.get(db.get_bind().dialect.name)
+    return dialect(_ROLLUPS) if dialect is not None else None
+
+
+def _history_windows(
+    db: Session, window: int, crops: Optional[Iterable[str]] = None
+) -> Dict[Tuple[str, str], Tuple[List[List], int]]:
+    """(crop, ALL_MANDIS) -> (newest `window` [id, price] pairs, row count),
+    computed from market_prices."""
+    ranked = select(
+        MarketPrice.crop.label("crop"),
+        MarketPrice.id.label("id"),
+        MarketPrice.price_per_quintal.label("price"),
+        func.row_number().over(partition_by=MarketPrice.crop, order_by=MarketPrice.id.desc()).label("rn"),
+        func.count().over(partition_by=MarketPrice.crop).label("total"),
+    ).where(MarketPrice.crop.isnot(None), MarketPrice.price_per_quintal.isnot(None))
+    if crops is not None:
+        ranked = ranked.where(MarketPrice.crop.in_(list(crops)))
+    ranked = ranked.subquery()
+    groups: Dict[Tuple[str, str], Tuple[List[List], int]] = {}
+    for crop, row_id, price, _, total in db.execute(
+        select(ranked).where(ranked.c.rn <= window).order_by(ranked.c.crop, ranked.c.rn)
+    ):
+        groups.setdefault((crop, ALL_MANDIS), ([], total))[0].append([row_id, float(price)])
+    return groups
+
+
+def _locked_rollups(db: Session, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[List[List], int]]:
+    stmt = select(_ROLLUPS.c.crop, _ROLLUPS.c.mandi, _ROLLUPS.c.window, _ROLLUPS.c.total_count).where(
+        tuple_(*_ROLLUP_KEY).in_(list(keys))
+    )
+    return {(c, m): (json.loads(w), t or 0) for c, m, w, t in db.execute(stmt.with_for_update())}
+
+
+def record_prices(db: Session, rows: Iterable[MarketPrice], window: int = TREND_WINDOW) -> int:
+    """Fold flushed MarketPrice rows into their per-crop rollups inside the
+    caller's transaction; the caller commits. Returns the number of rows
+    applied (0 on dialects without INSERT ... ON CONFLICT, where
+    rollup_trends reads market_prices instead).
+
+    A rollup that does not exist yet is seeded from market_prices history
+    (which already holds the flushed rows), and the first write to an empty
+    rollup table seeds every crop, so pre-existing prices are never dropped.
+    Seeds are inserted ON CONFLICT DO NOTHING: when a concurrent writer
+    seeded the same key first, this batch is folded into its row instead."""
+    insert = _rollup_insert(db)
+    rows = sorted(
+        (r for r in rows if r.id is not None and r.crop and r.price_per_quintal is not None),
+        key=lambda r: r.id,
+    )
+    if insert is None or not rows:
+        return 0
+    keys = {(r.crop, ALL_MANDIS) for r in rows}
+    current = _locked_rollups(db, keys)
+
+    if not current and db.execute(select(_ROLLUPS.c.id).limit(1)).first() is None:
+        seeds = _history_windows(db, window)
+    else:
+        missing = keys - current.keys()
+        seeds = _history_windows(db, window, {crop for crop, _ in missing}) if missing else {}
+    for key, (win, total) in seeds.items():
+        seeded = db.execute(
+            insert.values(**_rollup_values(*key, win, total)).on_conflict_do_nothing(index_elements=_ROLLUP_KEY).returning(_ROLLUPS.c.id)
+        ).first()
+        if seeded is None and key in keys:
+            current.update(_locked_rollups(db, [key]))
+
+    for r in rows:
+        key = (r.crop, ALL_MANDIS)
+        if key in current:
+            win, total = current[key]
+            current[key] = (_push(win, r.id, float(r.price_per_quintal), window), total + 1)
+    if current:
+        upsert = insert.on_conflict_do_update(
+            index_elements=_ROLLUP_KEY,
+            set_={c: insert.excluded[c] for c in ("window", "latest_id", "latest_price", "avg_price", "points", "total_count", "updated_at")},
+        )
+        db.execute(upsert, [_rollup_values(crop, mandi, win, total) for (crop, mandi), (win, total) in current.items()])
+    return len(rows)
+
+
+def rebuild_rollups(db: Session, window: int = TREND_WINDOW) -> int:
+    """Recompute every rollup from market_prices history and commit.
+    Returns the number of rollup rows written."""
+    db.execute(_ROLLUPS.delete())
+    groups = _history_windows(db, window)
+    if groups:
+        db.execute(_ROLLUPS.insert(), [_rollup_values(crop, mandi, win, total) for (crop, mandi), (win, total) in groups.items()])
+    db.commit()
+    return len(groups)
+
+
+ROLLUP_TRENDS_STATEMENT = (
+    select(MarketPriceRollup.crop, MarketPriceRollup.latest_price, MarketPriceRollup.avg_price, MarketPriceRollup.points)
+    .where(MarketPriceRollup.mandi == ALL_MANDIS)
+    .order_by(MarketPriceRollup.crop)
+)
+ANY_PRICE_STATEMENT = select(MarketPrice.id).limit(1)
+
+
+def rollup_trends(db: Session) -> List[Dict]:
+    """Trends from the per-crop rollups: one indexed read of O(crops) rows.
+    Falls back to the windowed scan while rollups have not been built yet,
+    and on dialects where record_prices does not maintain them."""
+    if _rollup_insert(db) is None:
+        return market_trends(db)
+    rows = db.execute(ROLLUP_TRENDS_STATEMENT).all()
+    if not rows:
+        if db.execute(ANY_PRICE_STATEMENT).first() is not None:
+            return market_trends(db)
+        return []
+    return trends_from_rows(rows)
+
+
+# --- Streaming export of price history ---
+
+EXPORT_COLUMNS = ("id", "crop", "mandi", "price_per_quintal", "date")
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def price_history_rows(
+    db: Session,
+    crop: Optional[str] = None,
+    mandi: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    yield_per: int = 1000,
+) -> Iterator[Row]:
+    """Price history in id order, fetched `yield_per` rows at a time through a
+    server-side cursor. `crop` matches case-insensitively; `date_to` is inclusive."""
+    stmt = select(
+        MarketPrice.id, MarketPrice.crop, MarketPrice.mandi, MarketPrice.price_per_quintal, MarketPrice.date
+    )
+    if crop:
+        stmt = stmt.where(MarketPrice.crop_key == crop_key_for(crop))
+    if mandi:
+        stmt = stmt.where(MarketPrice.mandi == mandi)
+    if date_from:
+        stmt = stmt.where(MarketPrice.date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        stmt = stmt.where(MarketPrice.date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    stmt = stmt.order_by(MarketPrice.id).execution_options(yield_per=yield_per)
+    for partition in db.execute(stmt).partitions():
+        yield from partition
+
+
+def _ndjson(rows: Iterable[Row]) -> Iterator[str]:
+    for r in rows:
+        yield json.dumps({
+            "id": r.id,
+            "crop": r.crop,
+            "mandi": r.mandi,
+            "price_per_quintal": float(r.price_per_quintal) if r.price_per_quintal is not None else None,
+            "date": r.date.isoformat() if r.date else None,
+        }) + "\n"
+
+
+def _csv(rows: Iterable[Row]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+    for r in rows:
+        writer.writerow((r.id, r.crop, r.mandi, r.price_per_quintal, r.date.isoformat() if r.date else ""))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+
+def export_price_history(
+    session_factory: Callable[[], Session],
+    fmt: str = "ndjson",
+    chunk_rows: int = 500,
+    **filters,
+) -> Iterator[bytes]:
+    """Encode price history as NDJSON or CSV, yielding ~`chunk_rows` rows per
+    chunk. Opens (and closes) its own session so it can outlive the request's."""
+    encode = _csv if fmt == "csv" else _ndjson
+    db = session_factory()
+    try:
+        pending: List[str] = []
+        for piece in encode(price_history_rows(db, yield_per=max(chunk_rows, 100), **filters)):
+            pending.append(piece)
+            if len(pending) >= chunk_rows:
+                yield "".join(pending).encode("utf-8")
+                pending = []
+        if pending:
+            yield "".join(pending).encode("utf-8")
+    finally:
+        db.close()
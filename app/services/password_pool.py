@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.auth_service import hash_password, verify_password
+from settings import get_settings
+
+settings = get_settings()
+
+
+class PasswordPoolBusy(Exception):
+    """More password operations are in flight than the admission limit allows."""
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_in_flight = 0
+_stats = {"finished": 0, "rejected": 0, "pool_restarts": 0}
+
+
+def get_password_pool() -> Optional[ProcessPoolExecutor]:
+    """The shared bcrypt process pool, or None when PASSWORD_POOL_WORKERS=0
+    (hashing then runs on the threadpool)."""
+    global _pool
+    if _pool is None and settings.password_pool_workers > 0:
+        # spawn: workers never inherit the server's threads, locks or sockets
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.password_pool_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def close_password_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def password_pool_stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "in_flight": _in_flight,
+        "max_in_flight": settings.password_max_in_flight,
+        "workers": settings.password_pool_workers,
+    }
+
+
+async def _run(fn: Callable, *args) -> Any:
+    # Check-and-increment happens without an await in between, so the
+    # counter is exact on the event loop without a lock.
+    global _in_flight, _pool
+    if _in_flight >= settings.password_max_in_flight:
+        _stats["rejected"] += 1
+        raise PasswordPoolBusy(f"{_in_flight} password operations in flight")
+    _in_flight += 1
+    try:
+        pool = get_password_pool()
+        if pool is None:
+            return await run_in_threadpool(fn, *args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (OOM kill etc.): replace the pool and retry once
+            _stats["pool_restarts"] += 1
+            if _pool is pool:
+                _pool = None
+            return await asyncio.get_running_loop().run_in_executor(get_password_pool(), fn, *args)
+    finally:
+        _in_flight -= 1
+        _stats["finished"] += 1
+
+
+async def ahash_password(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def averify_password(password: str, hashed: str) -> bool:
+    return await _run(verify_password, password, hashed)
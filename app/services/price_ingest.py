@@ -0,0 +1,273 @@
+import csv
+import io
+import json
+import time
+from datetime import date as date_type, datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Session
+
+from app.database.models import MarketPrice, crop_key_for
+from app.services.market_data import record_prices
+
+FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 100
+# Decoded characters handed to PriceIngestor.feed at a time by streaming callers
+FEED_CHUNK_CHARS = 1 << 16
+
+PriceKey = Tuple[str, str, datetime]
+
+
+class PriceRow(BaseModel):
+    crop: str = Field(min_length=1)
+    mandi: str = Field(min_length=1)
+    price_per_quintal: float = Field(gt=0)
+    date: Optional[datetime] = None
+
+    @field_validator("crop", "mandi", mode="before")
+    @classmethod
+    def _strip(cls, v):
+        return v.strip() if isinstance(v, str) else v
+
+    @field_validator("date", mode="before")
+    @classmethod
+    def _plain_date(cls, v):
+        # Feeds usually carry a bare trading day ("2024-05-01")
+        if v in ("", None):
+            return None
+        if isinstance(v, str) and len(v) == 10:
+            return datetime.combine(date_type.fromisoformat(v), datetime.min.time())
+        return v
+
+    @field_validator("date")
+    @classmethod
+    def _naive_utc(cls, v):
+        if v is not None and v.tzinfo is not None:
+            return v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+
+def format_for(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """Pick csv/ndjson from a Content-Type header or file extension."""
+    hint = f"{content_type or ''} {filename or ''}".lower()
+    if "csv" in hint:
+        return "csv"
+    if "ndjson" in hint or "jsonl" in hint or "json" in hint:
+        return "ndjson"
+    raise ValueError("Unsupported format; send text/csv or application/x-ndjson")
+
+
+class PriceIngestor:
+    """Validates a CSV/NDJSON body in chunks of `batch_size` rows and inserts
+    each chunk in its own transaction, skipping rows whose (crop, mandi, date)
+    already exists. Rows without a date are stamped with the ingest start time.
+
+    Feed the decoded body with `feed()` in pieces of any size (a piece may end
+    mid-record) and call `finish()` once the stream ends; both return the
+    per-batch reports produced so far.
+    """
+
+    def __init__(self, db: Session, fmt: str, batch_size: int = 1000):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format {fmt!r}")
+        self.db = db
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.started_at = datetime.utcnow().replace(microsecond=0)
+        self.header: Optional[List[str]] = None
+        self.line_no = 0
+        self.tail = ""
+        self.pending: List[Tuple[int, Dict[str, Any]]] = []
+        self.batches: List[Dict[str, Any]] = []
+        self.errors: List[Dict[str, Any]] = []
+        self.totals = {"received": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+        self._clock = time.perf_counter
+        self._start = self._clock()
+
+    def _record_error(self, line: int, message: str) -> None:
+        self.totals["invalid"] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def _complete(self, text: str) -> int:
+        """Length of the longest prefix of `text` made of whole records: up to
+        the last newline, for CSV the last one outside a quoted field (quotes
+        inside a field are doubled, so an odd count toggles)."""
+        if self.fmt == "ndjson":
+            return text.rfind("\n") + 1
+        end = pos = 0
+        quoted = False
+        for segment in text.split("\n")[:-1]:
+            pos += len(segment) + 1
+            if segment.count('"') % 2:
+                quoted = not quoted
+            if not quoted:
+                end = pos
+        return end
+
+    def _records(self, text: str) -> Iterator[Tuple[int, Union[Dict[str, Any], Exception]]]:
+        """(first line, row dict or parse error) for each non-blank record of
+        `text`, which holds whole records only. The CSV header is consumed."""
+        base = self.line_no
+        if self.fmt == "ndjson":
+            lines = text.split("\n")[:-1]
+            self.line_no += len(lines)
+            for offset, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                    if not isinstance(data, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as exc:
+                    data = exc
+                yield base + offset, data
+            return
+        # One reader over the whole text, so quoted fields may span lines
+        reader = csv.reader(io.StringIO(text, newline=""))
+        while True:
+            line = base + reader.line_num + 1
+            try:
+                values = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as exc:
+                yield line, exc
+                continue
+            if not values or (len(values) == 1 and not values[0].strip()):
+                continue
+            if self.header is None:
+                self.header = [h.strip() for h in values]
+                continue
+            if len(values) != len(self.header):
+                yield line, ValueError(f"expected {len(self.header)} columns, got {len(values)}")
+                continue
+            yield line, dict(zip(self.header, values))
+        self.line_no = base + reader.line_num
+
+    def _consume(self, text: str) -> None:
+        for line, data in self._records(text):
+            self.totals["received"] += 1
+            if isinstance(data, Exception):
+                self._record_error(line, str(data))
+                continue
+            self.pending.append((line, data))
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        produced = len(self.batches)
+        text = self.tail + text
+        end = self._complete(text)
+        self.tail = text[end:]
+        self._consume(text[:end])
+        return self.batches[produced:]
+
+    def finish(self) -> List[Dict[str, Any]]:
+        produced = len(self.batches)
+        if self.tail:
+            # A last record without a trailing newline (or with an unclosed quote)
+            tail, self.tail = self.tail, ""
+            self._consume(tail + "\n")
+        if self.pending:
+            self._flush()
+        return self.batches[produced:]
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = self._clock() - self._start
+        return {
+            **self.totals,
+            "batches": self.batches,
+            "errors": self.errors,
+            "seconds": round(elapsed, 4),
+            "rows_per_s": round(self.totals["inserted"] / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def _flush(self) -> None:
+        chunk, self.pending = self.pending, []
+        start = self._clock()
+        rows: Dict[PriceKey, Dict[str, Any]] = {}
+        invalid = duplicates = 0
+        for line, data in chunk:
+            try:
+                row = PriceRow.model_validate(data)
+            except ValidationError as exc:
+                invalid += 1
+                err = exc.errors()[0]
+                self._record_error(line, f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}")
+                continue
+            key = (row.crop, row.mandi, row.date or self.started_at)
+            if key in rows:
+                duplicates += 1
+                continue
+            rows[key] = {
+                "crop": row.crop,
+                "crop_key": crop_key_for(row.crop),
+                "mandi": row.mandi,
+                "price_per_quintal": row.price_per_quintal,
+                "date": key[2],
+            }
+        existing = self._existing(set(rows))
+        for key in existing:
+            del rows[key]
+        duplicates += len(existing)
+        inserted = self._insert(list(rows.values())) if rows else 0
+        self.db.commit()
+        elapsed = self._clock() - start
+        self.totals["inserted"] += inserted
+        self.totals["duplicates"] += duplicates
+        self.batches.append({
+            "batch": len(self.batches) + 1,
+            "received": len(chunk),
+            "inserted": inserted,
+            "duplicates": duplicates,
+            "invalid": invalid,
+            "seconds": round(elapsed, 4),
+            "rows_per_s": round(len(chunk) / elapsed, 1) if elapsed > 0 else None,
+        })
+
+    def _existing(self, keys: Set[PriceKey]) -> Set[PriceKey]:
+        if not keys:
+            return set()
+        cols = tuple_(MarketPrice.crop, MarketPrice.mandi, MarketPrice.date)
+        found = self.db.query(MarketPrice.crop, MarketPrice.mandi, MarketPrice.date).filter(cols.in_(list(keys)))
+        return {tuple(r) for r in found} & keys
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        if self._copy(rows):
+            keys = [(r["crop"], r["mandi"], r["date"]) for r in rows]
+            cols = tuple_(MarketPrice.crop, MarketPrice.mandi, MarketPrice.date)
+            inserted = self.db.query(MarketPrice).filter(cols.in_(keys)).all()
+        else:
+            # executemany (insertmanyvalues) with RETURNING for the rollups
+            inserted = list(self.db.scalars(insert(MarketPrice).returning(MarketPrice), rows))
+        record_prices(self.db, inserted)
+        return len(rows)
+
+    def _copy(self, rows: List[Dict[str, Any]]) -> bool:
+        """COPY FROM STDIN on Postgres (psycopg2); False when unavailable."""
+        conn = self.db.connection()
+        if conn.dialect.name != "postgresql":
+            return False
+        cursor = conn.connection.cursor()
+        if not hasattr(cursor, "copy_expert"):
+            return False
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for r in rows:
+            writer.writerow((r["crop"], r["crop_key"], r["mandi"], r["price_per_quintal"], r["date"].isoformat(sep=" ")))
+        buf.seek(0)
+        cursor.copy_expert(
+            f"COPY {MarketPrice.__tablename__} (crop, crop_key, mandi, price_per_quintal, date) FROM STDIN WITH (FORMAT csv)",
+            buf,
+        )
+        return True
+
+
+def ingest_text(db: Session, text: str, fmt: str, batch_size: int = 1000) -> Dict[str, Any]:
+    ingestor = PriceIngestor(db, fmt, batch_size)
+    ingestor.feed(text)
+    ingestor.finish()
+    return ingestor.report()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Per-request authentication overhead benchmark.
+
+Simulates mobile clients that reuse one token for many requests and compares
+plain python-jose verification with the cached decode_claims path, both for
+the bare decode and for the full get_principal dependency.
+
+    python bench_auth.py [--tokens 200] [--requests 20000]
+"""
+
+import argparse
+import random
+import time
+
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.api.deps as deps
+from app.database.database import Base
+from app.database.models import User
+from app.services.auth_service import JWT_ALG, JWT_SECRET, claims_cache_stats, create_access_token, decode_claims
+
+
+def per_call(n, seconds):
+    return f"{seconds / n * 1e6:8.2f} us/request ({n / seconds:10.0f} req/s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    db = Session()
+    users = [User(email=f"farmer{i}@example.com", name=f"Farmer {i}") for i in range(args.tokens)]
+    db.add_all(users)
+    db.commit()
+    tokens = [create_access_token(str(u.id), {"email": u.email}) for u in users]
+    stream = [rng.choice(tokens) for _ in range(args.requests)]
+    print(f"{args.requests} requests over {args.tokens} tokens")
+
+    start = time.perf_counter()
+    for token in stream:
+        jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    t_jose = time.perf_counter() - start
+    start = time.perf_counter()
+    for token in stream:
+        decode_claims(token)
+    t_cached = time.perf_counter() - start
+    print(f"decode   jose:        {per_call(args.requests, t_jose)}")
+    print(f"decode   cached:      {per_call(args.requests, t_cached)}")
+
+    def uncached_principal(token):
+        sub = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])["sub"]
+        user = Session().get(User, int(sub))
+        return deps.Principal(id=user.id, email=user.email, name=user.name)
+
+    start = time.perf_counter()
+    for token in stream:
+        uncached_principal(token)
+    t_plain = time.perf_counter() - start
+    start = time.perf_counter()
+    for token in stream:
+        deps.get_principal(f"Bearer {token}", Session())
+    t_dep = time.perf_counter() - start
+    print(f"principal jose + db:  {per_call(args.requests, t_plain)}")
+    print(f"principal cached:     {per_call(args.requests, t_dep)}")
+    print(f"claims cache: {claims_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
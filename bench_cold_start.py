@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Worker cold-start benchmark.
+
+Boots fresh interpreters the way a uvicorn worker does: import the API
+routers, then run the lifespan schema check (verify_schema). Reports the
+median time per phase over sequential boots, then the wall time for N
+workers booting together against the same database.
+
+    python bench_cold_start.py [--runs 15] [--workers 8] [--url sqlite:///...]
+
+The database is migrated once up front (`alembic upgrade head`), as the
+deploy step would; use --url to point at Postgres.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = """
+import time
+t0 = time.perf_counter()
+import app.api.auth
+t1 = time.perf_counter()
+import app.api.farming, app.api.ai, app.api.diagnostics, api.features_routes
+from app.database.database import engine
+from app.database.schema import verify_schema
+t2 = time.perf_counter()
+verify_schema(engine)
+t3 = time.perf_counter()
+print(t1 - t0, t3 - t0, t3 - t2)
+"""
+PHASES = ("import app.api.auth", "routers + schema check", "schema check")
+
+
+def boot(env, wait=True):
+    cmd = [sys.executable, "-c", CHILD]
+    here = os.path.dirname(os.path.abspath(__file__))
+    if wait:
+        return subprocess.run(cmd, cwd=here, env=env, capture_output=True, text=True, check=True).stdout
+    return subprocess.Popen(cmd, cwd=here, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    url = args.url or f"sqlite:///{os.path.join(tmp.name, 'cold.db')}"
+    env = {**os.environ, "DATABASE_URL": url, "PASSWORD_POOL_WORKERS": "0"}
+    os.environ["DATABASE_URL"] = url
+    from app.database.database import engine
+    from app.database.schema import upgrade_schema
+
+    print(f"{url}: schema at {upgrade_schema(engine)}")
+    engine.dispose()
+
+    boot(env)  # warm the OS file cache and __pycache__
+    results = [list(map(float, boot(env).split())) for _ in range(args.runs)]
+    for i, name in enumerate(PHASES):
+        print(f"{name:26s} median {statistics.median(r[i] for r in results) * 1000:8.1f} ms")
+
+    start = time.perf_counter()
+    procs = [boot(env, wait=False) for _ in range(args.workers)]
+    failed = sum(p.wait() != 0 for p in procs)
+    for p in procs:
+        p.stdout.close()
+        p.stderr.close()
+    print(f"{args.workers} workers booting together: {(time.perf_counter() - start) * 1000:.0f} ms wall, {failed} failed")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
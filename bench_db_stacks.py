@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Load test: sync Session routers vs. the DB_ASYNC AsyncSession routers.
+
+Seeds a temporary SQLite file (WAL), then drives the hot read endpoints
+(fields, prices, trends, alerts, recommendations) in-process through
+httpx's ASGI transport with N concurrent clients, once per stack. Sync
+handlers run in the anyio threadpool, async ones on the event loop.
+
+    python bench_db_stacks.py [--requests 2000] [--concurrency 64] [--url sqlite:///...]
+
+Point --url at a Postgres database (and install asyncpg) to compare
+psycopg2 with asyncpg; the seed data is added to whatever is there.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.orm import sessionmaker
+
+from app.api.ai import router as ai_router
+from app.api.async_reads import router as async_reads_router
+from app.api.farming import router as farming_router
+from app.database.async_database import get_async_db, make_async_engine
+from app.database.database import Base, get_db, make_engine
+from app.database.models import FarmField, MarketPrice, User, WeatherAlert
+from app.services.ai_planner import invalidate_plan_cache
+from app.services.auth_service import create_access_token
+from app.services.market_data import rebuild_rollups
+
+CROPS = ["Wheat", "Rice", "Cotton", "Sugarcane", "Maize", "Tomato", "Onion", "Potato", "Soybean", "Mustard"]
+MANDIS = ["Delhi", "Mumbai", "Kolkata", "Chennai", "Pune", "Indore"]
+
+
+def seed(url: str, prices: int) -> dict:
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        user = User(email=f"bench{time.time_ns()}@example.com", name="Bench")
+        db.add(user)
+        db.flush()
+        db.add_all(FarmField(user_id=user.id, name=f"Plot {i}", area_acres=1 + i % 7, latitude=28.6, longitude=77.2) for i in range(40))
+        db.add_all(WeatherAlert(user_id=None, title=f"Alert {i}", severity="medium", message="Heavy rain expected") for i in range(30))
+        db.add_all(
+            MarketPrice(crop=CROPS[i % len(CROPS)], mandi=MANDIS[i % len(MANDIS)], price_per_quintal=1500 + (i * 37) % 3000)
+            for i in range(prices)
+        )
+        db.commit()
+        rebuild_rollups(db)
+        token = create_access_token(str(user.id))
+    engine.dispose()
+    return {"Authorization": f"Bearer {token}"}
+
+
+def sync_app(url: str):
+    engine = make_engine(url)
+    factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+    def db():
+        with factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(farming_router, prefix="/api/v1")
+    app.include_router(ai_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = db
+    return app, engine.dispose
+
+
+def async_app(url: str):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    engine = make_async_engine(url)
+    factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def db():
+        async with factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(async_reads_router, prefix="/api/v1")
+    app.dependency_overrides[get_async_db] = db
+    return app, engine.dispose
+
+
+def requests_for(i: int):
+    season = ("kharif", "rabi", "zaid")[i % 3]
+    return [
+        ("GET", "/api/v1/farming/fields?limit=20", None),
+        ("GET", "/api/v1/farming/market/prices?limit=50", None),
+        ("GET", "/api/v1/farming/market/trends", None),
+        ("GET", "/api/v1/farming/weather/alerts", None),
+        ("POST", "/api/v1/ai/crop-planner/recommendations", {"season": season, "area_acres": 1 + i % 9, "ph": 5.5 + (i % 5) * 0.4}),
+    ][i % 5]
+
+
+async def drive(app, headers: dict, total: int, concurrency: int):
+    latencies = {}
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            method, path, body = requests_for(i)
+            start = time.perf_counter()
+            r = await client.request(method, path, json=body, headers=headers)
+            latencies.setdefault(path.split("?")[0], []).append(time.perf_counter() - start)
+            r.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def report(name: str, total: int, elapsed: float, latencies: dict):
+    print(f"\n{name}: {total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    for path, values in sorted(latencies.items()):
+        values.sort()
+        p95 = values[int(len(values) * 0.95) - 1]
+        print(f"  {path:45s} p50 {statistics.median(values) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--prices", type=int, default=20000)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    tmp = None
+    url = args.url
+    if url is None:
+        tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    headers = seed(url, args.prices)
+    print(f"{url}: concurrency {args.concurrency}, {args.prices} market prices")
+
+    for name, build in (("sync  (Session + threadpool)", sync_app), ("async (AsyncSession)", async_app)):
+        app, dispose = build(url)
+        invalidate_plan_cache()
+        await drive(app, headers, min(200, args.requests), args.concurrency)  # warm pools and caches
+        elapsed, latencies = await drive(app, headers, args.requests, args.concurrency)
+        report(name, args.requests, elapsed, latencies)
+        result = dispose()
+        if asyncio.iscoroutine(result):
+            await result
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the KhetGuru knowledge-base matcher.
+
+Compares the original per-request scan (normalizes every pattern on every
+query) with the compiled KB index used by kb_find_answer.
+
+    python bench_kb.py [--rounds 5]
+"""
+
+import argparse
+import time
+
+from api.features_routes import KB_ENTRIES, kb_find_answer
+from app.services.kb_engine import normalize_text, is_hindi
+
+QUERIES = [
+    "Which crops are suitable for sandy soil?",
+    "wheat sowing time",
+    "neem spray for aphids on mustard",
+    "गेहूं बोवाई समय क्या है",
+    "What is integrated pest management (IPM)?",
+    "my tomato leaves have blight, what should I do",
+    "kisan credit card interest rate",
+    "hello",
+    "drip irrigation subsidy for banana farm in maharashtra",
+    "zzz unknown question",
+]
+
+
+def legacy_kb_find_answer(message):
+    norm = normalize_text(message)
+    hindi = is_hindi(message)
+    best = None
+    best_score = 0
+    words = set(norm.split())
+    for entry in KB_ENTRIES:
+        score = 0
+        for pat in entry["patterns"]:
+            pat_norm = normalize_text(pat)
+            pat_words = set(pat_norm.split())
+            if pat_words.issubset(words):
+                score = len(pat_words)
+            elif pat_norm in norm:
+                score = max(score, 1)
+        if score > best_score:
+            best_score = score
+            best = entry
+    if best and best_score > 0:
+        return best["answer_hi" if hindi else "answer_en"]
+    return None
+
+
+def per_query_us(fn, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for q in QUERIES:
+            fn(q)
+        best = min(best, time.perf_counter() - start)
+    return best / len(QUERIES) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    for q in QUERIES:
+        assert kb_find_answer(q) == legacy_kb_find_answer(q), q
+
+    patterns = sum(len(e["patterns"]) for e in KB_ENTRIES)
+    print(f"KB: {len(KB_ENTRIES)} entries, {patterns} patterns, {len(QUERIES)} queries")
+    before = per_query_us(legacy_kb_find_answer, args.rounds)
+    after = per_query_us(kb_find_answer, args.rounds)
+    print(f"legacy scan:    {before:9.1f} us/query")
+    print(f"compiled index: {after:9.1f} us/query")
+    print(f"speedup:        {before / after:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the AI crop planner.
+
+Seeds an in-memory database with mandi price history, then compares
+per-member calls with the batch API, both at the service layer and over
+HTTP through /api/v1/ai/crop-planner/recommendations[/batch].
+
+    python bench_planner.py [--members 500] [--price-rows 20000]
+"""
+
+import argparse
+import random
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.ai import router as ai_router
+from app.database.database import Base, get_db
+from app.database.models import MarketPrice
+from app.services.ai_planner import (
+    REFERENCE_CROPS,
+    PlannerInput,
+    invalidate_plan_cache,
+    recommend_crops,
+    recommend_crops_batch,
+)
+
+STATES = ["Punjab", "Haryana", "MP", "Rajasthan", "Maharashtra", "Bihar", None]
+
+
+def make_members(n, rng):
+    return [
+        {
+            "member_id": f"M{i:05d}",
+            "season": rng.choice(["kharif", "rabi", "zaid"]),
+            "area_acres": round(rng.uniform(0.5, 12), 2),
+            "ph": round(rng.uniform(5.0, 8.5), 1),
+            "water_availability": rng.choice(["low", "medium", "high"]),
+            "state": rng.choice(STATES),
+        }
+        for i in range(n)
+    ]
+
+
+def rate(n, seconds):
+    return f"{n / seconds:10.1f} members/s ({seconds * 1000:8.1f} ms)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--price-rows", type=int, default=20000)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    db = Session()
+    crops = [c["crop"] for c in REFERENCE_CROPS]
+    db.bulk_save_objects([
+        MarketPrice(crop=rng.choice(crops), mandi=f"Mandi{rng.randint(1, 40)}", price_per_quintal=rng.randint(1800, 7500))
+        for _ in range(args.price_rows)
+    ])
+    db.commit()
+
+    members = make_members(args.members, rng)
+    inputs = [PlannerInput(**{k: v for k, v in m.items() if k != "member_id"}) for m in members]
+
+    print(f"{args.members} members, {args.price_rows} price rows, {len(crops)} reference crops")
+    # Each cold phase starts with an empty plan cache.
+    invalidate_plan_cache()
+    start = time.perf_counter()
+    singles = [recommend_crops(p, db) for p in inputs]
+    t_single = time.perf_counter() - start
+    invalidate_plan_cache()
+    start = time.perf_counter()
+    batch = recommend_crops_batch(inputs, db)
+    t_batch = time.perf_counter() - start
+    start = time.perf_counter()
+    warm = [recommend_crops(p, db) for p in inputs]
+    t_warm = time.perf_counter() - start
+    assert batch == singles == warm
+    print(f"service  per-member: {rate(args.members, t_single)}")
+    print(f"service  batch:      {rate(args.members, t_batch)}")
+    print(f"service  memoized:   {rate(args.members, t_warm)}")
+
+    app = FastAPI()
+    app.include_router(ai_router, prefix="/api/v1")
+
+    def override_db():
+        s = Session()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    app.dependency_overrides[get_db] = override_db
+    with TestClient(app) as client:
+        invalidate_plan_cache()
+        start = time.perf_counter()
+        for m in members:
+            r = client.post("/api/v1/ai/crop-planner/recommendations", json=m)
+            assert r.status_code == 200
+        t_http_single = time.perf_counter() - start
+        invalidate_plan_cache()
+        start = time.perf_counter()
+        r = client.post("/api/v1/ai/crop-planner/recommendations/batch", json={"members": members})
+        assert r.status_code == 200 and r.json()["count"] == args.members
+        t_http_batch = time.perf_counter() - start
+    print(f"http     per-member: {rate(args.members, t_http_single)}")
+    print(f"http     batch:      {rate(args.members, t_http_batch)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 import logging
 from typing import Optional, Dict, Any, List
 
@@ -32,6 +33,13 @@ from api.features_routes import router as features_router
 from app.api.auth import router as auth_router
 from app.api.farming import router as farming_router
 from app.api.ai import router as ai_router
+from app.api.diagnostics import router as diagnostics_router
+from app.api.async_reads import router as async_reads_router
+from app.services.llm_client import get_llm_client, close_llm_client
+from app.services.password_pool import get_password_pool, close_password_pool
+from app.database.database import engine
+from app.database.async_database import close_async_engine
+from app.database.schema import verify_schema
 from settings import get_settings
 
 # Load environment variables
@@ -47,12 +55,29 @@ logger = logging.getLogger(__name__)
 # Initialize FastAPI app
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema changes run ahead of deploy (`alembic upgrade head`); workers only
+    # check the revision, so concurrent boots never race on DDL
+    logger.info("database schema at revision %s", verify_schema(engine))
+    # Shared pooled HTTP client for KhetGuru LLM calls
+    get_llm_client()
+    # bcrypt workers for register/login
+    get_password_pool()
+    yield
+    await close_llm_client()
+    close_password_pool()
+    await close_async_engine()
+
+
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="FarmVerse Agriculture + KhetGuru Chatbot",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -63,15 +88,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 ## Service initializations removed for minimal backend
 
 # Include additional routes
+if settings.db_async:
+    # Registered first so these paths shadow their sync twins
+    app.include_router(async_reads_router, prefix="/api/v1")
 app.include_router(features_router, prefix="/api/v1/features", tags=["features"])
 app.include_router(auth_router, prefix="/api/v1", tags=["auth"])
 app.include_router(farming_router, prefix="/api/v1", tags=["farming"])
 app.include_router(ai_router, prefix="/api/v1", tags=["ai"])
+app.include_router(diagnostics_router, prefix="/api/v1", tags=["diagnostics"])
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
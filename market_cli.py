@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+FarmVerse market data maintenance
+
+    python market_cli.py migrate                 # alembic upgrade head
+    python market_cli.py rebuild-rollups [--window 10]
+    python market_cli.py ingest prices.csv|prices.ndjson|- [--format csv|ndjson] [--batch-size 1000]
+"""
+
+import argparse
+import sys
+import time
+
+from app.database.database import SessionLocal, engine
+from app.database.schema import SchemaOutOfDate, upgrade_schema, verify_schema
+from app.services.market_data import TREND_WINDOW, rebuild_rollups
+from app.services.price_ingest import FEED_CHUNK_CHARS, FORMATS, PriceIngestor, format_for
+from settings import get_settings
+
+
+def _require_schema():
+    try:
+        verify_schema(engine)
+    except SchemaOutOfDate as exc:
+        sys.exit(str(exc))
+
+
+def cmd_migrate(args):
+    print(f"database schema at revision {upgrade_schema(engine)}")
+
+
+def cmd_rebuild_rollups(args):
+    _require_schema()
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        written = rebuild_rollups(db, window=args.window)
+        print(f"Rebuilt {written} market price rollups in {time.perf_counter() - start:.2f}s")
+    finally:
+        db.close()
+
+
+def _print_batches(batches):
+    for batch in batches:
+        print(
+            f"batch {batch['batch']:>4}: {batch['inserted']:>6} inserted, {batch['duplicates']:>6} duplicates, "
+            f"{batch['invalid']:>5} invalid  {batch['rows_per_s'] or 0:>10.1f} rows/s"
+        )
+
+
+def cmd_ingest(args):
+    try:
+        fmt = args.format or format_for(None, args.file)
+    except ValueError as exc:
+        sys.exit(f"{exc} (pass --format)")
+    _require_schema()
+    db = SessionLocal()
+    stream = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8", newline="")
+    try:
+        ingestor = PriceIngestor(db, fmt, args.batch_size)
+        while True:
+            text = stream.read(FEED_CHUNK_CHARS)
+            if not text:
+                break
+            _print_batches(ingestor.feed(text))
+        _print_batches(ingestor.finish())
+        report = ingestor.report()
+        for err in report["errors"]:
+            print(f"  line {err['line']}: {err['error']}", file=sys.stderr)
+        print(
+            f"{report['inserted']} of {report['received']} rows inserted "
+            f"({report['duplicates']} duplicates, {report['invalid']} invalid) in {report['seconds']:.2f}s"
+        )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FarmVerse market data maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Create or upgrade the database schema (alembic upgrade head)")
+    migrate.set_defaults(func=cmd_migrate)
+    rebuild = sub.add_parser("rebuild-rollups", help="Backfill market_price_rollups from market_prices history")
+    rebuild.add_argument("--window", type=int, default=TREND_WINDOW, help="Prices kept per rollup for the rolling average")
+    rebuild.set_defaults(func=cmd_rebuild_rollups)
+    ingest = sub.add_parser("ingest", help="Bulk load mandi prices from a CSV/NDJSON file ('-' for stdin)")
+    ingest.add_argument("file")
+    ingest.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    ingest.add_argument("--batch-size", type=int, default=get_settings().price_ingest_batch_size)
+    ingest.set_defaults(func=cmd_ingest)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
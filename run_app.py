@@ -13,12 +13,12 @@ def setup_database():
     """Initialize the database with tables"""
     print("🗄️  Setting up database...")
     try:
-        from app.database.database import engine, Base
+        from app.database.database import engine
         from app.database.models import User, SoilTest, FarmField, CropPlan, WeatherAlert, InputSupplier, ExpertConsultation, InsurancePolicy, MarketPrice, Badge, UserBadge
+        from app.database.schema import upgrade_schema
         
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        print("✅ Database tables created successfully!")
+        # Create or upgrade all tables (alembic upgrade head)
+        print(f"✅ Database schema at revision {upgrade_schema(engine)}")
         
         # Add some sample data
         from sqlalchemy.orm import sessionmaker
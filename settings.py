@@ -15,6 +15,46 @@ class Settings:
     smtp_pass: str | None
     smtp_port: int
     contact_to_email: str | None
+    openai_base_url: str
+    llm_timeout_s: float
+    llm_max_connections: int
+    llm_max_concurrency: int
+    chat_cache_size: int
+    chat_cache_ttl_s: float
+    chat_cache_llm: bool
+    llm_hedge_ms: int
+    chat_batch_max: int
+    chat_batch_concurrency: int
+    planner_cache_size: int
+    planner_cache_ttl_s: float
+    llm_breaker_failure_ratio: float
+    llm_breaker_min_calls: int
+    llm_breaker_window: int
+    llm_breaker_slow_call_s: float
+    llm_breaker_reset_s: float
+    price_ingest_batch_size: int
+    auth_cache_size: int
+    auth_cache_ttl_s: float
+    auth_trust_claims: bool
+    password_pool_workers: int
+    password_max_in_flight: int
+    database_url: str
+    database_replica_urls: str
+    db_replica_retry_s: float
+    db_read_your_writes_s: float
+    db_echo: bool
+    db_async: bool
+    db_diagnostics: bool
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout_s: float
+    db_pool_recycle_s: int
+    db_pool_pre_ping: bool
+    sqlite_journal_mode: str
+    sqlite_synchronous: str
+    sqlite_busy_timeout_ms: int
+    sqlite_cache_size: int
+    sqlite_mmap_size: int
 
 
 @lru_cache
@@ -30,4 +70,44 @@ def get_settings() -> Settings:
     smtp_pass=os.getenv("SMTP_PASS"),
     smtp_port=int(os.getenv("SMTP_PORT", "587")),
     contact_to_email=os.getenv("CONTACT_TO_EMAIL"),
+        openai_base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+        llm_timeout_s=float(os.getenv("LLM_TIMEOUT_S", "20")),
+        llm_max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+        llm_max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "10")),
+        chat_cache_size=int(os.getenv("CHAT_CACHE_SIZE", "2048")),
+        chat_cache_ttl_s=float(os.getenv("CHAT_CACHE_TTL_S", "3600")),
+        chat_cache_llm=os.getenv("CHAT_CACHE_LLM", "false").lower() in ("1", "true", "yes"),
+        llm_hedge_ms=int(os.getenv("LLM_HEDGE_MS", "0")),
+        chat_batch_max=int(os.getenv("CHAT_BATCH_MAX", "100")),
+        chat_batch_concurrency=int(os.getenv("CHAT_BATCH_CONCURRENCY", "4")),
+        planner_cache_size=int(os.getenv("PLANNER_CACHE_SIZE", "4096")),
+        planner_cache_ttl_s=float(os.getenv("PLANNER_CACHE_TTL_S", "900")),
+        llm_breaker_failure_ratio=float(os.getenv("LLM_BREAKER_FAILURE_RATIO", "0.5")),
+        llm_breaker_min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "5")),
+        llm_breaker_window=int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+        llm_breaker_slow_call_s=float(os.getenv("LLM_BREAKER_SLOW_CALL_S", "8")),
+        llm_breaker_reset_s=float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+        price_ingest_batch_size=int(os.getenv("PRICE_INGEST_BATCH_SIZE", "1000")),
+        auth_cache_size=int(os.getenv("AUTH_CACHE_SIZE", "4096")),
+        auth_cache_ttl_s=float(os.getenv("AUTH_CACHE_TTL_S", "60")),
+        auth_trust_claims=os.getenv("AUTH_TRUST_CLAIMS", "false").lower() in ("1", "true", "yes"),
+        password_pool_workers=int(os.getenv("PASSWORD_POOL_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2))))),
+        password_max_in_flight=int(os.getenv("PASSWORD_MAX_IN_FLIGHT", "32")),
+        database_url=os.getenv("DATABASE_URL", "sqlite:///./farmverse.db"),
+        database_replica_urls=os.getenv("DATABASE_REPLICA_URLS", ""),
+        db_replica_retry_s=float(os.getenv("DB_REPLICA_RETRY_S", "30")),
+        db_read_your_writes_s=float(os.getenv("DB_READ_YOUR_WRITES_S", "5")),
+        db_echo=os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes"),
+        db_async=os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes"),
+        db_diagnostics=os.getenv("DB_DIAGNOSTICS", "false").lower() in ("1", "true", "yes"),
+        db_pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        db_pool_timeout_s=float(os.getenv("DB_POOL_TIMEOUT_S", "10")),
+        db_pool_recycle_s=int(os.getenv("DB_POOL_RECYCLE_S", "1800")),
+        db_pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+        sqlite_journal_mode=os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        sqlite_synchronous=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        sqlite_busy_timeout_ms=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        sqlite_cache_size=int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+        sqlite_mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", "268435456")),
     )
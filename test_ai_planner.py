@@ -0,0 +1,263 @@
+"""
+Tests for the AI crop planner against an in-memory database
+"""
+
+import itertools
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.ai import router as ai_router
+from app.api.deps import get_read_db
+from app.database.database import Base, get_db
+from app.database.models import MarketPrice
+from app.services.ai_planner import (
+    FALLBACK_MSP_PRICE,
+    REFERENCE_CROPS,
+    PlannerInput,
+    CROP_MATRIX,
+    invalidate_plan_cache,
+    latest_market_prices,
+    plan_cache_stats,
+    quantize_input,
+    recommend_crops,
+    recommend_crops_batch,
+    score_crop,
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    for crop, mandi, price in [
+        ("wheat", "Delhi", 2100.0),
+        ("wheat", "Karnal", 2150.0),
+        ("wheat", "Delhi", 2250.0),
+        ("rice", "Kolkata", 2300.0),
+        ("mustard", "Jaipur", 5600.0),
+        ("mustard", "Alwar", 5500.0),
+    ]:
+        session.add(MarketPrice(crop=crop, mandi=mandi, price_per_quintal=price))
+    session.commit()
+    invalidate_plan_cache()  # every test's database has the same price version
+    yield session
+    session.close()
+
+
+def count_selects(engine):
+    statements = []
+
+    def before(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before)
+    return statements
+
+
+def test_latest_market_prices_per_crop_and_mandi(db):
+    assert latest_market_prices(db) == {"wheat": 2250.0, "rice": 2300.0, "mustard": 5500.0}
+    assert latest_market_prices(db, ["wheat"], mandi="Karnal") == {"wheat": 2150.0}
+    assert latest_market_prices(db, ["wheat", "mustard"], per_mandi=True) == {
+        ("wheat", "Delhi"): 2250.0,
+        ("wheat", "Karnal"): 2150.0,
+        ("mustard", "Jaipur"): 5600.0,
+        ("mustard", "Alwar"): 5500.0,
+    }
+
+
+def test_recommend_crops_uses_one_price_query(engine, db):
+    statements = count_selects(engine)
+    recs = recommend_crops(PlannerInput(season="rabi", area_acres=2.5, ph=6.8, water_availability="low", state="Rajasthan"), db)
+    assert len(statements) == 2  # price version, then the prices
+    by_crop = {r["crop"]: r for r in recs}
+    assert by_crop["wheat"]["assumed_price_per_quintal"] == 2250.0
+    assert by_crop["mustard"]["assumed_price_per_quintal"] == 5500.0
+    assert by_crop["chickpea"]["assumed_price_per_quintal"] == FALLBACK_MSP_PRICE["chickpea"]
+    assert recs[0]["crop"] == "mustard"
+    assert len(recs) == min(8, len(REFERENCE_CROPS))
+
+
+def _inputs():
+    return [
+        PlannerInput(season=season, area_acres=area, ph=ph, water_availability=water, state=state)
+        for season, area, ph, water, state in [
+            ("kharif", 1.0, None, None, None),
+            ("Rabi", 2.5, 6.8, "low", "Rajasthan"),
+            ("rabi", 4, 5.2, "medium", "Punjab"),
+            ("kharif", 0.5, 8.4, "high", "Madhya Pradesh"),
+            ("zaid", 10.0, 6.0, "very high", "Maharashtra"),
+        ]
+    ]
+
+
+def test_matrix_scores_match_scalar_scoring():
+    inputs = _inputs()
+    scores = CROP_MATRIX.score(inputs)[0]
+    for row, data in enumerate(inputs):
+        assert scores[row].tolist() == [score_crop(item, data) for item in REFERENCE_CROPS]
+
+
+def _baseline_recommend_crops(data, db):
+    """The scalar planner as it was before the columnar engine, kept verbatim
+    (one price query per crop) as the reference for parity checks."""
+    def latest_market_price(crop):
+        q = db.query(MarketPrice).filter(MarketPrice.crop == crop).order_by(MarketPrice.id.desc()).first()
+        return float(q.price_per_quintal) if q else None
+
+    def reason(item):
+        bits = []
+        if data.season.lower() in item["seasons"]:
+            bits.append("season match")
+        lo, hi = item["ph_range"]
+        if data.ph is not None and lo <= data.ph <= hi:
+            bits.append("pH suitable")
+        if data.water_availability and data.water_availability.lower() == item["water"]:
+            bits.append("water availability match")
+        if data.state:
+            bits.append(f"region: {data.state}")
+        return ", ".join(bits) or "balanced choice"
+
+    def score(item):
+        score = 0.0
+        if data.season.lower() in item["seasons"]:
+            score += 2.0
+        if data.ph is not None:
+            lo, hi = item["ph_range"]
+            if lo <= data.ph <= hi:
+                score += 2.0
+            else:
+                d = min(abs(data.ph - lo), abs(data.ph - hi))
+                score += max(0.0, 1.5 - d)
+        if data.water_availability:
+            if data.water_availability.lower() == item["water"]:
+                score += 1.5
+            else:
+                score += 0.5
+        if data.state:
+            st = data.state.lower()
+            if ("punjab" in st or "haryana" in st) and item["crop"] in ("wheat", "rice"):
+                score += 0.5
+            if ("mp" in st or "madhya" in st) and item["crop"] in ("soybean", "chickpea"):
+                score += 0.5
+            if ("rajasthan" in st) and item["crop"] in ("mustard", "bajra"):
+                score += 0.5
+            if ("maharashtra" in st) and item["crop"] in ("cotton", "soybean"):
+                score += 0.5
+        return score
+
+    recs = []
+    for item in REFERENCE_CROPS:
+        s = score(item)
+        if s <= 0:
+            continue
+        price = latest_market_price(item["crop"]) or FALLBACK_MSP_PRICE.get(item["crop"], 2000)
+        profit_per_acre = item["yield_quintal_per_acre"] * price - item["base_cost_per_acre"]
+        recs.append((s, {
+            "crop": item["crop"],
+            "score": round(s, 2),
+            "season": data.season,
+            "ph_fit": item["ph_range"],
+            "water_need": item["water"],
+            "duration_days": item["duration_days"],
+            "estimated_yield_quintal_per_acre": item["yield_quintal_per_acre"],
+            "assumed_price_per_quintal": price,
+            "estimated_profit_per_acre": round(profit_per_acre, 2),
+            "estimated_profit_total": round(profit_per_acre * data.area_acres, 2),
+            "seed_rate_kg_per_acre": item["seed_rate_kg_per_acre"],
+            "base_cost_per_acre": item["base_cost_per_acre"],
+            "reason": reason(item),
+        }))
+    recs.sort(key=lambda x: x[0], reverse=True)
+    return [d for _, d in recs[:8]]
+
+
+def test_recommendations_match_the_baseline_scalar_planner(db):
+    grid = itertools.product(
+        ["kharif", "Rabi", "zaid"],
+        [None, 4.2, 5.5, 5.95, 6.84, 7.5, 8.4],
+        [None, "low", "Medium", "high", "very high"],
+        [None, "Punjab", "Madhya Pradesh", "Rajasthan", "maharashtra", "Kerala"],
+        [1.0, 2.75],
+    )
+    inputs = [
+        PlannerInput(season=season, area_acres=area, ph=ph, water_availability=water, state=state)
+        for season, ph, water, state, area in grid
+    ]
+    # Plans are computed for the quantized input (pH to 0.1), which is the
+    # identity for every grid pH but 5.95; repeated inputs exercise cache hits
+    expected = [_baseline_recommend_crops(quantize_input(data), db) for data in inputs]
+    assert [recommend_crops(data, db) for data in inputs] == expected
+    assert recommend_crops_batch(inputs, db) == expected
+    assert recommend_crops_batch(inputs, db, prices=latest_market_prices(db)) == expected
+
+
+def test_batch_recommendations_match_single_calls(engine, db):
+    inputs = _inputs()
+    statements = count_selects(engine)
+    batch = recommend_crops_batch(inputs, db)
+    assert len(statements) == 2
+    assert batch == [recommend_crops(data, db) for data in inputs]
+
+
+def test_batch_endpoint_returns_per_member_lists(db):
+    app = FastAPI()
+    app.include_router(ai_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    members = [
+        {"member_id": "A1", "season": "rabi", "area_acres": 2, "ph": 6.8, "water_availability": "LOW", "state": "Rajasthan"},
+        {"member_id": "B2", "season": "kharif", "area_acres": 1.5},
+    ]
+    with TestClient(app) as client:
+        r = client.post("/api/v1/ai/crop-planner/recommendations/batch", json={"members": members})
+        single = client.post("/api/v1/ai/crop-planner/recommendations", json=members[0]).json()
+    assert r.status_code == 200
+    body = r.json()
+    assert [x["member_id"] for x in body["results"]] == ["A1", "B2"]
+    assert body["results"][0]["recommendations"] == single["recommendations"]
+
+
+def test_plans_are_memoized_across_areas_and_invalidated_on_price_writes(engine, db):
+    statements = count_selects(engine)
+    base = dict(season="rabi", ph=6.84, water_availability="Low", state="Rajasthan")
+    first = recommend_crops(PlannerInput(area_acres=1.0, **base), db)
+    scaled = recommend_crops(PlannerInput(area_acres=3.0, **{**base, "ph": 6.8, "water_availability": "low"}), db)
+    assert len(statements) == 3  # the hit reads only the price version
+    assert plan_cache_stats()["hits"] >= 1
+    for a, b in zip(first, scaled):
+        assert b["estimated_profit_total"] == round(a["estimated_profit_per_acre"] * 3.0, 2)
+
+    db.add(MarketPrice(crop="mustard", mandi="Jaipur", price_per_quintal=9000.0))
+    db.rollback()
+    recommend_crops(PlannerInput(area_acres=1.0, **base), db)
+    assert len(statements) == 4
+
+    db.add(MarketPrice(crop="mustard", mandi="Jaipur", price_per_quintal=9000.0))
+    db.commit()
+    statements.clear()
+    fresh = recommend_crops(PlannerInput(area_acres=1.0, **base), db)
+    assert len(statements) == 2
+    assert {r["crop"]: r for r in fresh}["mustard"]["assumed_price_per_quintal"] == 9000.0
+
+
+def test_price_writes_from_other_workers_invalidate_plans(engine, db):
+    base = PlannerInput(season="rabi", area_acres=1.0, ph=6.8, water_availability="low", state="Rajasthan")
+    recommend_crops(base, db)
+    # Another worker's insert: no ORM session here, so no in-process hook sees it
+    with engine.begin() as conn:
+        conn.execute(MarketPrice.__table__.insert().values(crop="mustard", mandi="Jaipur", price_per_quintal=9100.0))
+    fresh = {r["crop"]: r for r in recommend_crops(base, db)}
+    assert fresh["mustard"]["assumed_price_per_quintal"] == 9100.0
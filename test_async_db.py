@@ -0,0 +1,188 @@
+"""
+Tests for the AsyncSession read path (DB_ASYNC) against the sync handlers
+"""
+
+import asyncio
+import dataclasses
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+pytest.importorskip("aiosqlite")
+
+from app.api.ai import router as ai_router
+from app.api.async_reads import router as async_reads_router
+from app.api.deps import get_read_db
+from app.api.farming import router as farming_router
+from app.database.async_database import InstrumentedAsyncQueuePool, async_url, get_async_db, make_async_engine
+from app.database.database import Base, get_db, make_engine, pool_stats, settings
+from app.database.models import FarmField, MarketPrice, User, WeatherAlert
+from app.services.ai_planner import invalidate_plan_cache
+from app.services.auth_service import create_access_token
+from app.services.market_data import rebuild_rollups
+
+
+def test_async_url_picks_the_asyncio_driver():
+    assert async_url("sqlite:///./farmverse.db") == "sqlite+aiosqlite:///./farmverse.db"
+    assert async_url("postgresql://farm:pw@db/farmverse") == "postgresql+asyncpg://farm:pw@db/farmverse"
+    assert async_url("postgresql+asyncpg://db/farmverse") == "postgresql+asyncpg://db/farmverse"
+    with pytest.raises(ValueError):
+        async_url("mysql://db/farmverse")
+
+
+def test_async_engine_gets_pool_and_pragmas(tmp_path):
+    cfg = dataclasses.replace(settings, db_pool_size=2, sqlite_busy_timeout_ms=4321)
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{tmp_path / 'farm.db'}", cfg)
+        try:
+            async with engine.connect() as conn:
+                mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+                busy = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+            return mode, busy, pool_stats(engine.sync_engine)
+        finally:
+            await engine.dispose()
+
+    mode, busy, stats = asyncio.run(run())
+    assert (mode, busy) == ("wal", 4321)
+    assert stats["pool"] == InstrumentedAsyncQueuePool.__name__ and stats["size"] == 2 and stats["checkouts"] == 1
+
+
+@pytest.fixture
+def stacks(tmp_path):
+    """(sync client, async client, auth header) over one seeded SQLite file."""
+    url = f"sqlite:///{tmp_path / 'farm.db'}"
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    with factory() as db:
+        user = User(email="a@example.com", name="A")
+        db.add(user)
+        db.flush()
+        db.add_all(FarmField(user_id=user.id, name=f"f{i}", area_acres=i + 1, latitude=0, longitude=0) for i in range(5))
+        db.add_all(WeatherAlert(user_id=user.id if i % 2 else None, title=f"t{i}", severity="low", message="m") for i in range(6))
+        db.add_all(MarketPrice(crop=c, mandi=m, price_per_quintal=1000 + i) for i, (c, m) in enumerate(
+            [("Wheat", "Delhi"), ("Rice", "Pune"), ("Wheat", "Pune"), ("Cotton", "Delhi")] * 3))
+        db.commit()
+        header = {"Authorization": f"Bearer {create_access_token(str(user.id))}"}
+
+    def sync_db():
+        with factory() as db:
+            yield db
+
+    sync_app = FastAPI()
+    sync_app.include_router(farming_router, prefix="/api/v1")
+    sync_app.include_router(ai_router, prefix="/api/v1")
+    sync_app.dependency_overrides[get_db] = sync_db
+    sync_app.dependency_overrides[get_read_db] = sync_db
+
+    # Built lazily inside the client's event loop; aiosqlite connections are loop-bound
+    holder = {}
+
+    async def async_db():
+        if "engine" not in holder:
+            holder["engine"] = make_async_engine(url)
+            holder["factory"] = async_sessionmaker(holder["engine"], autoflush=False, expire_on_commit=False)
+        async with holder["factory"]() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.include_router(async_reads_router, prefix="/api/v1")
+    async_app.include_router(farming_router, prefix="/api/v1")
+    async_app.dependency_overrides[get_async_db] = async_db
+    async_app.dependency_overrides[get_db] = sync_db
+    async_app.dependency_overrides[get_read_db] = sync_db
+
+    with TestClient(sync_app) as sync_client, TestClient(async_app) as async_client:
+        yield sync_client, async_client, header, factory
+        if "engine" in holder:
+            async_client.portal.call(holder["engine"].dispose)
+    engine.dispose()
+
+
+def _async_route(client, path):
+    return next(r for r in client.app.routes if getattr(r, "path", None) == path).endpoint.__module__
+
+
+def test_async_routes_shadow_sync_ones(stacks):
+    _, async_client, _, _ = stacks
+    assert _async_route(async_client, "/api/v1/farming/market/trends") == "app.api.async_reads"
+    assert _async_route(async_client, "/api/v1/farming/soil/tests") == "app.api.farming"
+
+
+def test_async_reads_match_sync(stacks):
+    sync_client, async_client, header, factory = stacks
+
+    for path in ("/api/v1/farming/fields?limit=2", "/api/v1/farming/weather/alerts", "/api/v1/farming/weather/alerts/my"):
+        expected, got = sync_client.get(path, headers=header), async_client.get(path, headers=header)
+        assert got.status_code == 200 and got.json() == expected.json(), path
+        assert got.headers.get("x-next-cursor") == expected.headers.get("x-next-cursor")
+
+    cursor = async_client.get("/api/v1/farming/fields?limit=2", headers=header).headers["x-next-cursor"]
+    rest = async_client.get(f"/api/v1/farming/fields?limit=10&cursor={cursor}", headers=header).json()
+    assert [f["name"] for f in rest] == ["f2", "f3", "f4"]
+
+    def strip(prices):
+        return [{k: v for k, v in p.items() if k not in ("change_percent", "trend")} for p in prices]
+
+    expected = sync_client.get("/api/v1/farming/market/prices?limit=5").json()
+    assert strip(async_client.get("/api/v1/farming/market/prices?limit=5").json()) == strip(expected)
+
+    def trends(client):
+        return client.get("/api/v1/farming/market/trends").json()["trends"]
+
+    assert trends(async_client) == trends(sync_client)  # fallback scan, no rollups yet
+    with factory() as db:
+        rebuild_rollups(db)
+    assert trends(async_client) == trends(sync_client)
+
+    body = {"season": "kharif", "area_acres": 3, "ph": 6.5, "water_availability": "high"}
+    invalidate_plan_cache()
+    fresh = async_client.post("/api/v1/ai/crop-planner/recommendations", json=body).json()
+    assert fresh == sync_client.post("/api/v1/ai/crop-planner/recommendations", json=body).json()
+    assert fresh["count"] > 0
+
+    assert async_client.get("/api/v1/farming/fields").status_code == 401
+
+
+def test_async_prices_seed_an_empty_table(stacks):
+    _, async_client, _, factory = stacks
+    with factory() as db:
+        db.query(MarketPrice).delete()
+        db.commit()
+    seeded = async_client.get("/api/v1/farming/market/prices").json()
+    assert len(seeded) == 12
+    with factory() as db:
+        assert db.query(MarketPrice).count() == 12
+
+
+def test_async_prices_fall_back_like_the_sync_route(stacks, monkeypatch):
+    sync_client, async_client, _, factory = stacks
+    with factory() as db:
+        db.query(MarketPrice).delete()
+        db.commit()
+
+    def locked(session, prices):
+        session.add_all(prices)
+        session.flush()
+        raise OperationalError("INSERT INTO market_price_rollups", {}, Exception("database is locked"))
+
+    monkeypatch.setattr("app.api.farming.store_market_prices", locked)
+    monkeypatch.setattr("app.api.async_reads.store_market_prices", locked)
+    def samples():
+        return [MarketPrice(crop="Wheat", mandi="Delhi", price_per_quintal=2000, date=datetime(2024, 6, 1))]
+
+    monkeypatch.setattr("app.api.farming.sample_market_prices", samples)
+    monkeypatch.setattr("app.api.async_reads.sample_market_prices", samples)
+    fallback = async_client.get("/api/v1/farming/market/prices")
+    assert fallback.status_code == 200
+    assert fallback.json() == sync_client.get("/api/v1/farming/market/prices").json()
+    assert fallback.json()[0]["id"] is None
+    with factory() as db:
+        assert db.query(MarketPrice).count() == 0
@@ -0,0 +1,168 @@
+"""
+Tests for the shared auth dependency and its principal cache
+"""
+
+import json
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.api.deps as deps
+import app.services.auth_service as auth_service
+from app.api.auth import router as auth_router
+from app.api.farming import router as farming_router
+from app.database.database import Base, get_db
+from app.database.models import User
+from app.services.auth_service import create_access_token
+from app.services.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    session.add(User(email="kisan@example.com", name="Ramesh"))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(engine, db, monkeypatch):
+    monkeypatch.setattr(deps, "_principal_cache", TTLCache(64, 60))
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/api/v1")
+    app.include_router(farming_router, prefix="/api/v1")
+    factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+    def override_db():
+        session = factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_db
+    user = db.query(User).one()
+    headers = {"Authorization": f"Bearer {create_access_token(str(user.id), {'email': user.email})}"}
+    with TestClient(app, headers=headers) as c:
+        yield c
+
+
+def user_selects(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *a: "FROM users" in statement and statements.append(statement),
+    )
+    return statements
+
+
+def test_principal_is_loaded_once_per_token(engine, db, client):
+    selects = user_selects(engine)
+    for _ in range(5):
+        assert client.get("/api/v1/farming/soil/tests").status_code == 200
+    assert client.get("/api/v1/auth/profile").json()["name"] == "Ramesh"
+    assert len(selects) == 1
+    assert client.get("/api/v1/auth/cache/stats").json()["hits"] == 5
+
+
+def test_profile_update_invalidates_cached_principal(client):
+    assert client.get("/api/v1/auth/profile").json()["name"] == "Ramesh"
+    assert client.patch("/api/v1/auth/profile", json={"name": "Ramesh Kumar"}).status_code == 200
+    assert client.get("/api/v1/auth/profile").json()["name"] == "Ramesh Kumar"
+
+
+def test_bad_tokens_are_rejected(client):
+    assert client.get("/api/v1/auth/profile", headers={"Authorization": ""}).status_code == 401
+    assert client.get("/api/v1/auth/profile", headers={"Authorization": "Bearer nope"}).status_code == 401
+    missing = create_access_token("999")
+    assert client.get("/api/v1/auth/profile", headers={"Authorization": f"Bearer {missing}"}).status_code == 404
+
+
+def test_trusted_claims_skip_the_user_row(engine, db, client, monkeypatch):
+    monkeypatch.setattr(deps.settings, "auth_trust_claims", True)
+    selects = user_selects(engine)
+    assert client.get("/api/v1/farming/fields").status_code == 200
+    assert selects == []
+    # writes still resolve the user from the database
+    r = client.post("/api/v1/farming/fields", json={"name": "north", "area_acres": 2, "latitude": 1, "longitude": 2})
+    assert r.status_code == 200 and len(selects) == 1
+
+
+def test_cache_entries_do_not_outlive_the_token():
+    assert deps._ttl_for({"exp": time.time() + 5}) <= 5
+    assert deps._ttl_for({"exp": time.time() - 5}) == 0
+    assert deps._ttl_for({}) == deps.settings.auth_cache_ttl_s
+
+
+@pytest.fixture
+def claims_cache(monkeypatch):
+    monkeypatch.setattr(auth_service, "_claims_cache", TTLCache(64, 3600))
+    return auth_service._claims_cache
+
+
+def test_verified_claims_are_cached_until_expiry(claims_cache, monkeypatch):
+    calls = []
+    real_decode = auth_service.jwt.decode
+    monkeypatch.setattr(auth_service.jwt, "decode", lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+    token = create_access_token("7", {"email": "x@example.com"})
+    first = auth_service.decode_claims(token)
+    first["sub"] = "tampered"
+    assert auth_service.decode_claims(token)["sub"] == "7"
+    assert auth_service.decode_token(token) == "7"
+    assert len(calls) == 1 and claims_cache.hits == 2
+
+    assert auth_service.decode_claims(token + "x") is None
+
+    exp = int(time.time()) + 1
+    short = auth_service.jwt.encode({"sub": "8", "exp": exp}, auth_service.JWT_SECRET, algorithm="HS256")
+    assert auth_service.decode_token(short) == "8"
+    time.sleep(max(0.0, exp + 1 - time.time()) + 0.05)  # jose compares whole seconds
+    assert auth_service.decode_claims(short) is None
+
+
+def _write_keys(path, active, keys, mtime, legacy=None):
+    path.write_text(json.dumps({"active": active, "keys": keys, **({"legacy": legacy} if legacy else {})}))
+    os.utime(path, (mtime, mtime))
+
+
+def test_rotating_keys_by_kid(tmp_path, claims_cache, monkeypatch):
+    keys_file = tmp_path / "jwt_keys.json"
+    _write_keys(keys_file, "k1", {"k1": "first-secret"}, 1000)
+    monkeypatch.setattr(auth_service, "JWT_KEYS_CHECK_S", 0)
+    monkeypatch.setattr(auth_service, "_keyring", auth_service._Keyring(str(keys_file)))
+    legacy = auth_service.jwt.encode({"sub": "1", "exp": time.time() + 60}, auth_service.JWT_SECRET, algorithm="HS256")
+    old = create_access_token("1")
+    assert auth_service.jwt.get_unverified_header(old)["kid"] == "k1"
+
+    assert auth_service.decode_token(legacy) is None  # kid-less tokens need a listed legacy key
+
+    _write_keys(keys_file, "k2", {"k0": auth_service.JWT_SECRET, "k1": "first-secret", "k2": "second-secret"}, 2000, legacy="k0")
+    new = create_access_token("2")
+    assert auth_service.jwt.get_unverified_header(new)["kid"] == "k2"
+    assert auth_service.decode_token(old) == "1" and auth_service.decode_token(new) == "2"
+    assert auth_service.decode_token(legacy) == "1"
+
+    _write_keys(keys_file, "k2", {"k2": "second-secret"}, 3000)
+    assert auth_service.decode_token(old) is None
+    assert auth_service.decode_token(legacy) is None  # retired along with its key, despite the cache
+    assert auth_service.decode_token(new) == "2"
+    keys_file.write_text("not json")
+    os.utime(keys_file, (4000, 4000))
+    assert auth_service.decode_token(new) == "2"
+    assert auth_service.claims_cache_stats()["kids"] == ["k2"]
@@ -0,0 +1,97 @@
+"""
+Tests for the KhetGuru batch chat endpoint
+"""
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.features_routes as features
+from app.services.llm_client import LLMClient, set_llm_client
+from app.services.ttl_cache import TTLCache
+
+
+class SlowLLM(LLMClient):
+    def __init__(self):
+        super().__init__(api_key="test-key", model="fake")
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _chat(self, messages):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.02)
+        self.in_flight -= 1
+        return "llm: " + messages[-1]["content"]
+
+
+def _post_batch(messages):
+    app = FastAPI()
+    app.include_router(features.router, prefix="/api/v1/features")
+    with TestClient(app) as client:
+        return client.post("/api/v1/features/chat/batch", json={"items": [{"message": m} for m in messages]})
+
+
+def test_batch_without_llm_keeps_order_and_reports_errors(monkeypatch):
+    monkeypatch.setattr(features, "_reply_cache", TTLCache(64, 60))
+    set_llm_client(LLMClient(api_key=None, model="none"))
+    messages = ["wheat sowing time", "   ", "hello", "गेहूं बोवाई समय"]
+    try:
+        r = _post_batch(messages)
+    finally:
+        set_llm_client(None)
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["index"] for x in results] == [0, 1, 2, 3]
+    assert results[1]["status"] == "error"
+    for i in (0, 2, 3):
+        assert results[i]["status"] == "ok"
+        assert results[i]["reply"] == features.generate_rule_based_reply(messages[i])
+
+
+def test_batch_sends_only_kb_misses_to_llm_with_bounded_concurrency(monkeypatch):
+    monkeypatch.setattr(features, "_reply_cache", TTLCache(64, 60))
+    monkeypatch.setattr(features.settings, "chat_batch_concurrency", 2)
+    llm = SlowLLM()
+    set_llm_client(llm)
+    messages = ["wheat sowing time"] + [f"zzqq question {i}" for i in range(6)]
+    try:
+        results = _post_batch(messages).json()["results"]
+    finally:
+        set_llm_client(None)
+    assert results[0]["source"] == "kb"
+    assert results[0]["reply"] == features.kb_find_answer("wheat sowing time")
+    assert [x["reply"] for x in results[1:]] == [f"llm: zzqq question {i}" for i in range(6)]
+    assert llm.max_in_flight == 2
+
+
+def test_batch_rejects_oversized_requests(monkeypatch):
+    monkeypatch.setattr(features.settings, "chat_batch_max", 2)
+    assert _post_batch(["a", "b", "c"]).status_code == 400
+
+
+class FlakyLLM(LLMClient):
+    def __init__(self):
+        super().__init__(api_key="test-key", model="fake")
+
+    async def _chat(self, messages):
+        if "boom" in messages[-1]["content"]:
+            raise RuntimeError("unexpected upstream bug")
+        return "llm: " + messages[-1]["content"]
+
+
+def test_batch_reports_a_failing_item_and_answers_the_rest(monkeypatch):
+    monkeypatch.setattr(features, "_reply_cache", TTLCache(64, 60))
+    set_llm_client(FlakyLLM())
+    messages = ["zzqq first", "zzqq boom", "zzqq last"]
+    try:
+        r = _post_batch(messages)
+    finally:
+        set_llm_client(None)
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["status"] for x in results] == ["ok", "error", "ok"]
+    assert results[1]["detail"] and results[1]["reply"] is None
+    assert [results[0]["reply"], results[2]["reply"]] == ["llm: zzqq first", "llm: zzqq last"]
+    assert features._reply_cache.get(features.reply_cache_key("zzqq boom")) is None
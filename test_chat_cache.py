@@ -0,0 +1,98 @@
+"""
+Tests for the KhetGuru answer cache
+"""
+
+import asyncio
+
+import api.features_routes as features
+from api.features_routes import ChatMessage, reply_cache_key
+from app.services.llm_client import LLMClient, set_llm_client
+from app.services.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingLLM(LLMClient):
+    def __init__(self):
+        super().__init__(api_key="test-key", model="fake")
+        self.calls = 0
+
+    async def chat(self, messages, deadline_s=None):
+        self.calls += 1
+        return f"llm answer {self.calls}"
+
+
+def test_ttl_cache_lru_eviction_and_expiry():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl_s=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    clock.now = 11
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 2
+
+
+def test_cache_key_normalizes_message_and_fingerprints_history():
+    assert reply_cache_key("Wheat  sowing time?") == reply_cache_key("wheat sowing time")
+    assert reply_cache_key("गेहूं बोवाई समय")[1] == "hi"
+    hist = [ChatMessage(role="user", content="hi")]
+    assert reply_cache_key("neem spray", hist) != reply_cache_key("neem spray")
+
+
+def test_cache_key_keeps_every_script(monkeypatch):
+    tamil, bengali = "நெல் விதைப்பு எப்போது?", "ধান কখন বুনব?"
+    assert len({reply_cache_key(tamil), reply_cache_key(bengali), reply_cache_key("?!")}) == 3
+    assert reply_cache_key("  நெல்   விதைப்பு எப்போது ") == reply_cache_key(tamil)
+    assert reply_cache_key("STRASSE") == reply_cache_key("straße")
+
+    monkeypatch.setattr(features, "_reply_cache", TTLCache(16, 60))
+    set_llm_client(LLMClient(api_key=None, model="none"))
+    try:
+        asyncio.run(features.agenerate_reply(tamil))
+        asyncio.run(features.agenerate_reply("?!"))
+    finally:
+        set_llm_client(None)
+    assert features._reply_cache.get(reply_cache_key(tamil)) is not None
+    assert features._reply_cache.get(reply_cache_key(bengali)) is None
+    assert features._reply_cache.get(reply_cache_key("?!")) is None
+
+
+def test_rule_based_answers_are_cached_without_llm(monkeypatch):
+    monkeypatch.setattr(features, "_reply_cache", TTLCache(16, 60))
+    set_llm_client(LLMClient(api_key=None, model="none"))
+    try:
+        first = asyncio.run(features.agenerate_reply("Wheat sowing time"))
+        second = asyncio.run(features.agenerate_reply("wheat sowing time?"))
+    finally:
+        set_llm_client(None)
+    assert first == second
+    assert features._reply_cache.stats()["hits"] == 1
+
+
+def test_llm_answers_cached_only_when_enabled(monkeypatch):
+    monkeypatch.setattr(features, "_reply_cache", TTLCache(16, 60))
+    llm = CountingLLM()
+    set_llm_client(llm)
+    try:
+        monkeypatch.setattr(features.settings, "chat_cache_llm", False)
+        asyncio.run(features.agenerate_reply("neem spray"))
+        asyncio.run(features.agenerate_reply("neem spray"))
+        assert llm.calls == 2
+        monkeypatch.setattr(features.settings, "chat_cache_llm", True)
+        asyncio.run(features.agenerate_reply("neem spray"))
+        assert asyncio.run(features.agenerate_reply("neem spray")) == "llm answer 3"
+        assert llm.calls == 3
+    finally:
+        set_llm_client(None)
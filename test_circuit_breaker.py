@@ -0,0 +1,111 @@
+"""
+Tests for the LLM circuit breaker and hedged KB fallback
+"""
+
+import asyncio
+
+import pytest
+
+import api.features_routes as features
+from app.services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from app.services.llm_client import CircuitOpenError, LLMClient, LLMError, set_llm_client
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ScriptedLLM(LLMClient):
+    """LLMClient whose upstream call sleeps `delay_s` then fails or answers."""
+
+    def __init__(self, delay_s=0.0, fail=False, breaker=None):
+        super().__init__(api_key="test-key", model="fake", breaker=breaker)
+        self.delay_s = delay_s
+        self.fail = fail
+        self.upstream_calls = 0
+
+    async def _chat(self, messages):
+        self.upstream_calls += 1
+        await asyncio.sleep(self.delay_s)
+        if self.fail:
+            raise LLMError("non-200 status 503")
+        return "llm answer"
+
+
+def test_breaker_trips_and_recovers_through_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_ratio=0.5, min_calls=4, window=10, slow_call_s=2, reset_timeout_s=30, clock=clock)
+    breaker.record_success(0.1)
+    breaker.record_success(5.0)  # slow call counts as a failure
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now = 31
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.trips == 2
+
+    clock.now = 62
+    assert breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    stats = breaker.stats()
+    assert stats["short_circuited"] == 2 and stats["window_calls"] == 1
+
+
+def test_open_breaker_skips_upstream():
+    llm = ScriptedLLM(fail=True, breaker=CircuitBreaker(min_calls=2, failure_ratio=0.5))
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(LLMError):
+                await llm.chat([{"role": "user", "content": "hi"}])
+        with pytest.raises(CircuitOpenError):
+            await llm.chat([{"role": "user", "content": "hi"}])
+
+    asyncio.run(run())
+    assert llm.upstream_calls == 2
+    assert llm.breaker.stats()["trips"] == 1
+
+
+def test_hedged_reply_returns_kb_answer_within_budget(monkeypatch):
+    monkeypatch.setattr(features.settings, "llm_hedge_ms", 50)
+    monkeypatch.setattr(features, "_reply_cache", features.TTLCache(16, 60))
+    llm = ScriptedLLM(delay_s=0.5)
+    set_llm_client(llm)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        reply = await features.agenerate_reply("wheat sowing time")
+        elapsed = loop.time() - start
+        await asyncio.gather(*features._hedge_tasks)
+        return reply, elapsed
+
+    try:
+        reply, elapsed = asyncio.run(run())
+    finally:
+        set_llm_client(None)
+    assert reply == features.kb_find_answer("wheat sowing time")
+    assert elapsed < 0.4
+    assert llm.breaker.stats()["successes"] == 1  # late answer still recorded
+    assert len(features._reply_cache) == 0
+
+
+def test_hedging_waits_for_llm_without_kb_hit(monkeypatch):
+    monkeypatch.setattr(features.settings, "llm_hedge_ms", 10)
+    set_llm_client(ScriptedLLM(delay_s=0.05))
+    try:
+        reply = asyncio.run(features.agenerate_reply("zzzz qqqq"))
+    finally:
+        set_llm_client(None)
+    assert reply == "llm answer"
@@ -0,0 +1,83 @@
+"""
+Equivalence tests for the compiled KhetGuru knowledge-base matcher
+"""
+
+import random
+
+from api.features_routes import KB_ENTRIES, kb_find_answer
+from app.services.kb_engine import AhoCorasick, normalize_text, is_hindi
+
+
+def legacy_kb_find_answer(message):
+    """Original full-scan scoring, kept as the reference implementation"""
+    norm = normalize_text(message)
+    hindi = is_hindi(message)
+    best = None
+    best_score = 0
+    words = set(norm.split())
+    for entry in KB_ENTRIES:
+        score = 0
+        for pat in entry["patterns"]:
+            pat_norm = normalize_text(pat)
+            pat_words = set(pat_norm.split())
+            if pat_words.issubset(words):
+                score = len(pat_words)
+            elif pat_norm in norm:
+                score = max(score, 1)
+        if score > best_score:
+            best_score = score
+            best = entry
+    if best and best_score > 0:
+        return best["answer_hi" if hindi else "answer_en"]
+    return None
+
+
+def _sample_messages():
+    patterns = [p for e in KB_ENTRIES for p in e["patterns"]]
+    vocab = sorted({w for p in patterns for w in normalize_text(p).split()})
+    rng = random.Random(1234)
+    messages = list(patterns)
+    messages += [p.upper() + "?" for p in patterns[::7]]
+    messages += [f"please tell me {p} for my farm" for p in patterns[::5]]
+    messages += [" ".join(rng.sample(vocab, rng.randint(1, 6))) for _ in range(400)]
+    # Substring-only hits: fragments glued to neighbouring text
+    messages += ["x" + p.replace(" ", "") + "y" for p in patterns[::11]]
+    messages += [
+        "phosphorus deficiency in wheat",
+        "गेहूं की किस्म कौन सी अच्छी है?",
+        "hello",
+        "",
+        "!!!",
+        "what is the weather like",
+    ]
+    return messages
+
+
+def test_kb_index_matches_legacy_scoring():
+    for message in _sample_messages():
+        assert kb_find_answer(message) == legacy_kb_find_answer(message), message
+
+
+def test_kb_index_known_answers():
+    assert "groundnut" in kb_find_answer("Which crops are suitable for sandy soil?")
+    assert kb_find_answer("zzzz qqqq") is None
+
+
+def test_aho_corasick_reports_every_substring_hit():
+    rng = random.Random(7)
+    patterns = ["he", "she", "his", "hers", "s", "ushe", "है", "गेहूं", "a b", " a"]
+    patterns += ["".join(rng.choice("abc ") for _ in range(rng.randint(1, 5))) for _ in range(60)]
+    matcher = AhoCorasick(patterns)
+    texts = ["ushers", "गेहूं है", "this is his"]
+    texts += ["".join(rng.choice("abc ") for _ in range(rng.randint(0, 30))) for _ in range(200)]
+    for text in texts:
+        assert matcher.find_all(text) == {p for p in patterns if p in text}, text
+    assert matcher.find_each(texts) == [matcher.find_all(text) for text in texts]
+    assert AhoCorasick(["ab"]).find_each(["xa", "by"]) == [set(), set()]  # no match across texts
+
+
+def test_kb_index_batch_lookup_matches_single_lookup():
+    from api.features_routes import _KB_INDEX
+    messages = _sample_messages()[:300]
+    messages += messages[:20]  # duplicates share one scoring pass
+    assert _KB_INDEX.find_answers(messages) == [legacy_kb_find_answer(m) for m in messages]
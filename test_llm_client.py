@@ -0,0 +1,196 @@
+"""
+Tests for the pooled async KhetGuru LLM client against a local stand-in
+for the OpenAI chat completions endpoint
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.features_routes import agenerate_reply, generate_rule_based_reply, router
+from app.services.llm_client import LLMClient, LLMError, set_llm_client
+
+
+class StandInOpenAI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay_s = 0.0
+    peers = set()
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length))
+        cls = type(self)
+        with cls.lock:
+            cls.peers.add(self.client_address)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(cls.delay_s)
+            text = f"echo: {body['messages'][-1]['content']}"
+            if body.get("stream"):
+                words = text.split(" ")
+                deltas = [words[0]] + [" " + w for w in words[1:]]
+                chunks = [{"choices": [{"delta": {"role": "assistant"}}]}]
+                chunks += [{"choices": [{"delta": {"content": d}}]} for d in deltas]
+                data = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+                data = data.encode()
+                content_type = "text/event-stream"
+            else:
+                data = json.dumps({"choices": [{"message": {"content": f" {text} "}}]}).encode()
+                content_type = "application/json"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in():
+    StandInOpenAI.delay_s = 0.0
+    StandInOpenAI.peers = set()
+    StandInOpenAI.in_flight = 0
+    StandInOpenAI.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInOpenAI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def _client(base_url, **kw):
+    return LLMClient(api_key="test-key", model="stand-in", base_url=base_url, **kw)
+
+
+def test_chat_reuses_pooled_connection(stand_in):
+    async def run():
+        client = _client(stand_in)
+        try:
+            replies = [await client.chat([{"role": "user", "content": f"q{i}"}]) for i in range(5)]
+        finally:
+            await client.aclose()
+        return replies
+
+    assert asyncio.run(run()) == [f"echo: q{i}" for i in range(5)]
+    assert len(StandInOpenAI.peers) == 1
+
+
+def test_concurrency_limit_is_enforced(stand_in):
+    StandInOpenAI.delay_s = 0.1
+
+    async def run():
+        client = _client(stand_in, max_concurrency=2)
+        try:
+            await asyncio.gather(*[client.chat([{"role": "user", "content": "hi"}]) for _ in range(6)])
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert StandInOpenAI.max_in_flight <= 2
+
+
+def test_deadline_raises_and_reply_falls_back(stand_in):
+    StandInOpenAI.delay_s = 1.0
+
+    async def run():
+        client = _client(stand_in, timeout_s=0.2)
+        with pytest.raises(LLMError):
+            await client.chat([{"role": "user", "content": "slow"}])
+        set_llm_client(client)
+        try:
+            return await agenerate_reply("wheat sowing time")
+        finally:
+            set_llm_client(None)
+            await client.aclose()
+
+    assert asyncio.run(run()) == generate_rule_based_reply("wheat sowing time")
+
+
+def test_reply_uses_llm_when_available(stand_in):
+    async def run():
+        client = _client(stand_in)
+        set_llm_client(client)
+        try:
+            return await agenerate_reply("neem spray")
+        finally:
+            set_llm_client(None)
+            await client.aclose()
+
+    assert asyncio.run(run()) == "echo: neem spray"
+
+
+def _sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _stream(message):
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/features")
+    with TestClient(app) as client:
+        r = client.post("/api/v1/features/chat/stream", json={"message": message})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    return _sse_events(r.text)
+
+
+def test_stream_relays_llm_tokens(stand_in):
+    set_llm_client(_client(stand_in))
+    try:
+        events = _stream("neem spray")
+    finally:
+        set_llm_client(None)
+    tokens = [data["delta"] for event, data in events if event == "token"]
+    assert tokens == ["echo:", " neem", " spray"]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["reply"] == "echo: neem spray"
+    assert events[-1][1]["source"] == "llm"
+
+
+def test_stream_without_key_sends_rule_based_answer():
+    set_llm_client(LLMClient(api_key=None, model="none"))
+    try:
+        events = _stream("गेहूं बोवाई समय")
+    finally:
+        set_llm_client(None)
+    expected = generate_rule_based_reply("गेहूं बोवाई समय")
+    assert events[0] == ("token", {"delta": expected})
+    assert events[-1][1]["reply"] == expected
+
+
+def test_stream_deadline_covers_waiting_for_headers(stand_in):
+    StandInOpenAI.delay_s = 1.0  # the stand-in stalls before sending headers
+
+    async def run():
+        client = _client(stand_in, timeout_s=5.0)
+        started = time.monotonic()
+        try:
+            with pytest.raises(LLMError, match="deadline"):
+                async for _ in client.stream_chat([{"role": "user", "content": "slow"}], deadline_s=0.2):
+                    pass
+        finally:
+            await client.aclose()
+        return time.monotonic() - started, client._slots._value
+
+    elapsed, free_slots = asyncio.run(run())
+    assert elapsed < 0.8
+    assert free_slots == 10
@@ -0,0 +1,424 @@
+"""
+Tests for market price aggregation against an in-memory database
+"""
+
+import json
+import random
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.ai import router as ai_router
+from app.api.deps import get_read_db, get_read_sessionmaker
+from app.api.farming import router as farming_router, settings as farming_settings
+from app.database.database import Base, get_db
+from app.database.models import MarketPrice, MarketPriceRollup, User, crop_key_for
+from app.database.schema import head_revision, upgrade_schema
+from app.services import price_ingest
+from app.services.ai_planner import demo_seed_prices, latest_market_prices, mandi_rates, price_version
+from app.services.auth_service import create_access_token
+from app.services.market_data import (
+    ALL_MANDIS,
+    crop_key_matches,
+    export_price_history,
+    market_trends,
+    rebuild_rollups,
+    record_prices,
+    rollup_trends,
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    rng = random.Random(7)
+    crops = ["wheat", "rice", "mustard", "cotton", "maize", "onion"]
+    for _ in range(300):
+        session.add(MarketPrice(
+            crop=rng.choice(crops),
+            mandi=f"Mandi{rng.randint(1, 5)}",
+            price_per_quintal=rng.choice([rng.randint(1500, 7000), round(rng.uniform(1500, 7000), 2)]),
+        ))
+    session.add(MarketPrice(crop="garlic", mandi="Indore", price_per_quintal=8000.0))
+    session.commit()
+    yield session
+    session.close()
+
+
+def count_selects(engine):
+    statements = []
+
+    def before(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before)
+    return statements
+
+
+def legacy_trends(db):
+    trends = []
+    for (crop,) in db.query(MarketPrice.crop).distinct().order_by(MarketPrice.crop).all():
+        prices = db.query(MarketPrice).filter(MarketPrice.crop == crop).order_by(MarketPrice.id.desc()).limit(10).all()
+        avg_price = sum(p.price_per_quintal for p in prices) / len(prices)
+        latest_price = prices[0].price_per_quintal
+        change_percent = round(((latest_price - avg_price) / avg_price) * 100, 1)
+        trend = "up" if change_percent > 2 else "down" if change_percent < -2 else "stable"
+        trends.append({
+            "crop": crop,
+            "current_price": latest_price,
+            "average_price": round(avg_price, 2),
+            "change_percent": change_percent,
+            "trend": trend,
+            "data_points": len(prices),
+        })
+    return trends
+
+
+def test_market_trends_match_per_crop_queries_in_one_statement(engine, db):
+    expected = legacy_trends(db)
+    statements = count_selects(engine)
+    assert market_trends(db) == expected
+    assert len(statements) == 1
+    assert {t["crop"]: t["data_points"] for t in expected}["garlic"] == 1
+
+
+def test_market_trends_endpoint(db):
+    app = FastAPI()
+    app.include_router(farming_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    rebuild_rollups(db)
+    with TestClient(app) as client:
+        r = client.get("/api/v1/farming/market/trends")
+    assert r.status_code == 200
+    assert r.json()["trends"] == legacy_trends(db)
+    assert "last_updated" in r.json()
+
+
+def _rollups(db):
+    return {
+        (r.crop, r.mandi): (r.latest_id, r.latest_price, r.avg_price, r.points, r.total_count, r.window)
+        for r in db.query(MarketPriceRollup)
+    }
+
+
+def test_incremental_rollups_match_rebuild(engine, db):
+    rebuild_rollups(db)
+    rng = random.Random(11)
+    for _ in range(40):
+        rows = [
+            MarketPrice(crop=rng.choice(["wheat", "garlic", "jowar"]), mandi=rng.choice(["Mandi1", "Indore", None]), price_per_quintal=rng.randint(1500, 9000))
+            for _ in range(rng.randint(1, 3))
+        ]
+        db.add_all(rows)
+        db.flush()
+        record_prices(db, rows)
+        db.commit()
+    incremental = _rollups(db)
+    assert rebuild_rollups(db) == len(incremental)
+    assert _rollups(db) == incremental
+    assert incremental[("wheat", ALL_MANDIS)][4] == db.query(MarketPrice).filter(MarketPrice.crop == "wheat").count()
+
+    expected = legacy_trends(db)
+    statements = count_selects(engine)
+    assert rollup_trends(db) == expected
+    assert len(statements) == 1 and "market_prices " not in statements[0]
+
+
+def test_rollups_follow_price_writes(db):
+    app = FastAPI()
+    app.include_router(farming_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    rebuild_rollups(db)
+    with TestClient(app) as client:
+        r = client.post("/api/v1/farming/market/prices", json={"crop": "garlic", "mandi": "Indore", "price_per_quintal": 9000})
+        assert r.status_code == 200
+        trends = {t["crop"]: t for t in client.get("/api/v1/farming/market/trends").json()["trends"]}
+    assert trends["garlic"]["current_price"] == 9000.0
+    assert trends["garlic"]["data_points"] == 2
+    demo_seed_prices(db)
+    assert rollup_trends(db) == legacy_trends(db)
+
+
+def test_trends_fall_back_before_first_rebuild(db):
+    assert db.query(MarketPriceRollup).count() == 0
+    assert rollup_trends(db) == legacy_trends(db)
+
+
+def test_first_write_over_existing_history_keeps_every_crop(db):
+    # Prices predating the rollups table: the first insert must not shrink trends to its own crop
+    app = FastAPI()
+    app.include_router(farming_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    with TestClient(app) as client:
+        assert client.post("/api/v1/farming/market/prices", json={"crop": "wheat", "mandi": "Mandi1", "price_per_quintal": 2400}).status_code == 200
+        trends = client.get("/api/v1/farming/market/trends").json()["trends"]
+    assert trends == legacy_trends(db)
+    assert {t["crop"]: t["data_points"] for t in trends}["wheat"] == 10
+    incremental = _rollups(db)
+    rebuild_rollups(db)
+    assert _rollups(db) == incremental
+
+    # A crop new to an already-populated rollup table is seeded from its own history
+    db.add_all([MarketPrice(crop="jowar", mandi="Pune", price_per_quintal=p) for p in (2000, 2200)])
+    db.commit()
+    row = MarketPrice(crop="jowar", mandi="Pune", price_per_quintal=2600)
+    db.add(row)
+    db.flush()
+    record_prices(db, [row])
+    db.commit()
+    assert rollup_trends(db) == legacy_trends(db)
+
+
+def test_concurrently_seeded_rollup_is_folded_into(db, monkeypatch):
+    import app.services.market_data as market_data
+
+    rebuild_rollups(db)
+    first = MarketPrice(crop="jowar", mandi="Pune", price_per_quintal=2000)
+    db.add(first)
+    db.flush()
+    record_prices(db, [first])
+    db.commit()
+
+    # Another writer seeded ("jowar", *) between our lock query and our seed insert
+    real = market_data._locked_rollups
+    calls = []
+
+    def racing(session, keys):
+        calls.append(keys)
+        return {} if len(calls) == 1 else real(session, keys)
+
+    monkeypatch.setattr(market_data, "_locked_rollups", racing)
+    second = MarketPrice(crop="jowar", mandi="Pune", price_per_quintal=3000)
+    db.add(second)
+    db.flush()
+    record_prices(db, [second])
+    db.commit()
+    rollups = _rollups(db)
+    assert rollups[("jowar", ALL_MANDIS)][:5] == (second.id, 3000.0, 2500.0, 2, 2)
+    assert {mandi for _, mandi in rollups} == {ALL_MANDIS}  # per-crop only; nothing reads per-mandi rows
+
+
+def test_dialects_without_upsert_skip_rollups(db, monkeypatch):
+    import app.services.market_data as market_data
+
+    monkeypatch.setattr(market_data, "_DIALECT_INSERTS", {})
+    rebuild_rollups(db)
+    with _client(db) as client:
+        r = client.post("/api/v1/farming/market/prices", json={"crop": "wheat", "mandi": "Karnal", "price_per_quintal": 9999})
+        trends = client.get("/api/v1/farming/market/trends").json()["trends"]
+    assert r.status_code == 200
+    assert trends == legacy_trends(db)
+    assert next(t for t in trends if t["crop"] == "wheat")["current_price"] == 9999
+
+
+def _query_plans(engine, call):
+    captured = []
+
+    def before(conn, cursor, statement, parameters, *args):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+    with engine.connect() as conn:
+        return [
+            [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+            for statement, parameters in captured
+        ]
+
+
+def test_hot_market_queries_use_indexes(engine, db):
+    hot = {
+        "mandi_rates crop": lambda: mandi_rates(db, crop="rice"),
+        "mandi_rates crop+mandi": lambda: mandi_rates(db, crop="rice", mandi="Mandi3"),
+        "mandi_rates mandi": lambda: mandi_rates(db, mandi="Mandi3"),
+        "latest prices": lambda: latest_market_prices(db),
+        "latest prices crop+mandi": lambda: latest_market_prices(db, ["rice"], mandi="Mandi3"),
+        "latest prices per mandi": lambda: latest_market_prices(db, ["rice", "wheat"], per_mandi=True),
+        "crop prefix": lambda: db.query(MarketPrice).filter(crop_key_matches("Whe")).order_by(MarketPrice.id.desc()).limit(20).all(),
+        "trends": lambda: market_trends(db),
+    }
+    for name, call in hot.items():
+        plans = _query_plans(engine, call)
+        assert plans, name
+        for plan in plans:
+            for line in plan:
+                if "market_prices" in line and line.startswith(("SCAN", "SEARCH")):
+                    assert "INDEX" in line or "PRIMARY KEY" in line, (name, plan)
+    # Unfiltered listing walks the primary key backwards instead of sorting
+    for plan in _query_plans(engine, lambda: mandi_rates(db)):
+        assert not any("TEMP B-TREE" in line for line in plan), plan
+
+
+def test_crop_prefix_lookup_is_case_insensitive(db):
+    db.add(MarketPrice(crop="  WHEAT ", mandi="Karnal", price_per_quintal=2300.0))
+    db.commit()
+    app = FastAPI()
+    app.include_router(farming_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    with TestClient(app) as client:
+        body = client.get("/api/v1/farming/market/prices/Whe").json()
+        missing = client.get("/api/v1/farming/market/prices/heat").json()
+    assert body["prices"] and {p["crop"].strip().lower() for p in body["prices"]} == {"wheat"}
+    assert body["prices"][0]["crop"] == "  WHEAT "
+    assert missing["prices"] == []
+
+
+def _legacy_market_prices(tmp_path, rows):
+    """A database from before crop_key: market_prices as the old create_all left it."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE market_prices (id INTEGER PRIMARY KEY, crop VARCHAR, mandi VARCHAR, price_per_quintal FLOAT, date DATETIME)"
+        )
+        for crop, mandi, price in rows:
+            conn.exec_driver_sql(
+                "INSERT INTO market_prices (crop, mandi, price_per_quintal) VALUES (?, ?, ?)", (crop, mandi, price)
+            )
+    return engine
+
+
+def test_migration_adds_crop_key_and_indexes(tmp_path):
+    engine = _legacy_market_prices(tmp_path, [(" Rice", "Kolkata", 2300)])
+    assert upgrade_schema(engine) == head_revision()
+    assert upgrade_schema(engine) == head_revision()
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("market_prices")}
+    assert {ix.name for ix in MarketPrice.__table__.indexes} <= indexes
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT crop_key FROM market_prices").scalar() == "rice"
+        assert conn.exec_driver_sql("SELECT crop, mandi FROM market_price_rollups").all() == [(" Rice", ALL_MANDIS)]
+
+
+def test_crop_key_backfill_matches_crop_key_for(tmp_path):
+    # More rows than one backfill batch, so the keyset paging is exercised too
+    crops = ["\tWheat\n", "\u00a0Rice ", "ÉPEAUTRE", "Ragi", "  ", None, "Bajra"] * 300
+    engine = _legacy_market_prices(tmp_path, [(crop, "Pune", 2000) for crop in crops])
+    upgrade_schema(engine)
+    with engine.connect() as conn:
+        keys = conn.exec_driver_sql("SELECT crop_key FROM market_prices ORDER BY id").scalars().all()
+    assert keys == [crop_key_for(crop) for crop in crops]
+
+
+def _client(db):
+    app = FastAPI()
+    app.include_router(farming_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    return TestClient(app)
+
+
+def _agent(db, **headers):
+    user = db.query(User).first()
+    if user is None:
+        user = User(email="agent@example.com", name="Agent")
+        db.add(user)
+        db.commit()
+    return {"Authorization": f"Bearer {create_access_token(str(user.id))}", **headers}
+
+
+def test_bulk_ingest_dedupes_and_updates_rollups(engine, db, monkeypatch):
+    monkeypatch.setattr(farming_settings, "price_ingest_batch_size", 50)
+    rebuild_rollups(db)
+    version = price_version(db)
+    rows = [
+        {"crop": "garlic", "mandi": f"Mandi{i % 7}", "price_per_quintal": 8000 + i, "date": f"2024-{i // 28 + 1:02d}-{i % 28 + 1:02d}"}
+        for i in range(120)
+    ]
+    body = "\n".join(json.dumps(r) for r in rows + rows[:10]) + '\n{"crop": "garlic"}\nnot json\n'
+    inserts = []
+    event.listen(engine, "before_cursor_execute", lambda c, cur, st, *a: st.startswith("INSERT INTO market_prices") and inserts.append(st))
+    with _client(db) as client:
+        r = client.post("/api/v1/farming/market/prices/bulk", content=body, headers=_agent(db, **{"Content-Type": "application/x-ndjson"}))
+        again = client.post("/api/v1/farming/market/prices/bulk?format=ndjson", content=body, headers=_agent(db)).json()
+    assert r.status_code == 200
+    report = r.json()
+    assert (report["received"], report["inserted"], report["duplicates"], report["invalid"]) == (132, 120, 10, 2)
+    assert [b["received"] for b in report["batches"]] == [50, 50, 31]
+    assert all("rows_per_s" in b for b in report["batches"])
+    assert {e["line"] for e in report["errors"]} == {131, 132}
+    assert len(inserts) == 3
+    assert price_version(db) > version  # cached plans from before the ingest no longer match
+    assert (again["inserted"], again["duplicates"]) == (0, 130)
+
+    incremental = _rollups(db)
+    rebuild_rollups(db)
+    assert _rollups(db) == incremental
+    assert rollup_trends(db) == legacy_trends(db)
+
+
+def test_bulk_ingest_csv(db):
+    body = "crop,mandi,price_per_quintal,date\r\nOnion,Lasalgaon,1450,2024-05-02T09:30:00+05:30\r\nOnion,\"Pune, MH\",1500,\r\n"
+    with _client(db) as client:
+        report = client.post("/api/v1/farming/market/prices/bulk", content=body, headers=_agent(db, **{"Content-Type": "text/csv"})).json()
+        bad = client.post("/api/v1/farming/market/prices/bulk", content=body, headers=_agent(db, **{"Content-Type": "application/xml"}))
+        anonymous = client.post("/api/v1/farming/market/prices/bulk", content=body, headers={"Content-Type": "text/csv"})
+    assert report["inserted"] == 2 and report["invalid"] == 0
+    row = db.query(MarketPrice).filter(MarketPrice.mandi == "Lasalgaon").one()
+    assert row.date == datetime(2024, 5, 2, 4, 0) and row.crop_key == "onion"
+    assert db.query(MarketPrice).filter(MarketPrice.mandi == "Pune, MH").one().date is not None
+    assert bad.status_code == 415
+    assert anonymous.status_code == 401
+
+
+def test_bulk_ingest_csv_quoted_newlines_across_chunks(db):
+    body = 'crop,mandi,price_per_quintal,date\nOnion,"Nashik\nAPMC",1450,2024-05-02\nbad,row\nOnion,"Pune ""East""",1500,2024-05-02\n'
+    ingestor = price_ingest.PriceIngestor(db, "csv", batch_size=2)
+    for i in range(0, len(body), 7):  # chunk boundaries fall inside quoted fields
+        ingestor.feed(body[i:i + 7])
+    ingestor.finish()
+    report = ingestor.report()
+    assert (report["received"], report["inserted"], report["invalid"]) == (3, 2, 1)
+    assert report["errors"] == [{"line": 4, "error": "expected 4 columns, got 2"}]
+    mandis = {m for (m,) in db.query(MarketPrice.mandi).filter(MarketPrice.crop == "Onion")}
+    assert mandis == {"Nashik\nAPMC", 'Pune "East"'}
+
+
+def test_export_streams_filtered_history(engine, db):
+    db.add_all([
+        MarketPrice(crop="Tomato", mandi="Kolar", price_per_quintal=900 + i, date=datetime(2024, 6, 1 + i % 20))
+        for i in range(1200)
+    ])
+    db.commit()
+    factory = sessionmaker(bind=engine)
+    chunks = list(export_price_history(factory, "ndjson", chunk_rows=250, crop="TOMATO"))
+    assert len(chunks) == 5
+    rows = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+    assert len(rows) == 1200 and rows[0]["crop"] == "Tomato"
+    assert [r["id"] for r in rows] == sorted(r["id"] for r in rows)
+
+    app = FastAPI()
+    app.include_router(ai_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_sessionmaker] = lambda: factory
+    with TestClient(app) as client:
+        r = client.get("/api/v1/ai/mandi-rates/export", params={"crop": "tomato", "date_from": "2024-06-05", "date_to": "2024-06-06"})
+        csv_r = client.get("/api/v1/ai/mandi-rates/export", params={"crop": "tomato", "mandi": "Kolar", "date_to": "2024-06-01", "format": "csv"})
+        empty = client.get("/api/v1/ai/mandi-rates/export", params={"crop": "saffron", "format": "csv"})
+        bad = client.get("/api/v1/ai/mandi-rates/export", params={"format": "xml"})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    dates = {json.loads(line)["date"][:10] for line in r.text.splitlines()}
+    assert dates == {"2024-06-05", "2024-06-06"} and len(r.text.splitlines()) == 120
+    lines = csv_r.text.splitlines()
+    assert lines[0] == "id,crop,mandi,price_per_quintal,date" and len(lines) == 61
+    assert empty.text == "id,crop,mandi,price_per_quintal,date\n"
+    assert bad.status_code == 400
@@ -0,0 +1,117 @@
+"""
+Tests for keyset pagination on the farming list endpoints
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.deps import get_read_db
+from app.api.farming import router as farming_router
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.database.database import Base, get_db
+from app.database.models import FarmField, InsurancePolicy, MarketPrice, SoilTest, User
+from app.services.auth_service import create_access_token
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    me, other = User(email="me@example.com"), User(email="other@example.com")
+    session.add_all([me, other])
+    session.flush()
+    for i in range(130):
+        owner = me if i % 3 else other
+        session.add(SoilTest(user_id=owner.id, ph=6 + i / 100, nitrogen=1, phosphorus=2, potassium=3, recommendation="ok"))
+        session.add(FarmField(user_id=owner.id, name=f"field {i}", area_acres=1.5))
+    session.add(InsurancePolicy(user_id=me.id, policy_number="P-1", crop="wheat", coverage_amount=1, premium=1))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(farming_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    me = db.query(User).filter(User.email == "me@example.com").one()
+    with TestClient(app, headers={"Authorization": f"Bearer {create_access_token(str(me.id))}"}) as c:
+        c.user_id = me.id
+        yield c
+
+
+def walk(client, path, limit):
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        r = client.get(path, params=params)
+        assert r.status_code == 200
+        pages.append(r.json())
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(12345)
+    assert "12345" not in token
+    assert decode_cursor(token) == 12345
+
+
+def test_pages_cover_history_without_offset(engine, db, client):
+    expected = [t.id for t in db.query(SoilTest).filter(SoilTest.user_id == client.user_id).order_by(SoilTest.id.desc())]
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda c, cur, st, params, *a: st.startswith("SELECT soil_tests") and statements.append((st, params)))
+    pages = walk(client, "/api/v1/farming/soil/tests", 25)
+    assert [len(p) for p in pages] == [25, 25, 25, 11]
+    assert [row["id"] for p in pages for row in p] == expected
+    assert set(pages[0][0]) == {c.name for c in SoilTest.__table__.columns}
+    # later pages seek past the cursor id; SQLite renders a constant OFFSET 0
+    assert all("soil_tests.id < ?" in st and params[-1] == 0 for st, params in statements[1:])
+
+
+def test_ascending_lists_keep_insertion_order(db, client):
+    expected = [f.id for f in db.query(FarmField).filter(FarmField.user_id == client.user_id).order_by(FarmField.id)]
+    pages = walk(client, "/api/v1/farming/fields", 50)
+    assert [row["id"] for p in pages for row in p] == expected
+    policies = client.get("/api/v1/farming/insurance/policies")
+    assert [p["policy_number"] for p in policies.json()] == ["P-1"]
+    assert NEXT_CURSOR_HEADER not in policies.headers
+
+
+def test_market_prices_pages_and_bad_input(db, client):
+    db.add_all([MarketPrice(crop="wheat", mandi="Delhi", price_per_quintal=2000 + i) for i in range(60)])
+    db.commit()
+    pages = walk(client, "/api/v1/farming/market/prices", 40)
+    rows = [row for p in pages for row in p]
+    assert len(rows) == 60 and rows[0]["price_per_quintal"] == 2059.0
+    assert {"quality", "unit", "trend", "change_percent"} <= set(rows[0])
+    assert client.get("/api/v1/farming/soil/tests", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/api/v1/farming/soil/tests", params={"limit": 1000}).status_code == 422
+
+
+def test_market_prices_fall_back_to_samples_when_the_seed_fails(db, client, monkeypatch):
+    def locked(session, prices):
+        session.add_all(prices)
+        session.flush()
+        raise OperationalError("INSERT INTO market_price_rollups", {}, Exception("database is locked"))
+
+    monkeypatch.setattr("app.api.farming.store_market_prices", locked)
+    r = client.get("/api/v1/farming/market/prices")
+    assert r.status_code == 200 and len(r.json()) == 12
+    assert all(row["id"] is None and row["price_per_quintal"] for row in r.json())
+    assert db.query(MarketPrice).count() == 0  # the partial seed was rolled back
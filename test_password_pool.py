@@ -0,0 +1,88 @@
+"""
+Tests for off-loop bcrypt hashing and the login admission limit
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.services.password_pool as password_pool
+from app.api.auth import router as auth_router
+from app.database.database import Base, get_db
+from app.services.auth_service import verify_password
+
+
+@pytest.fixture
+def client(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+    def override_db():
+        session = factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = override_db
+    with TestClient(app) as c:
+        yield c
+    engine.dispose()
+
+
+def test_process_pool_hashes_and_verifies(monkeypatch):
+    monkeypatch.setattr(password_pool.settings, "password_pool_workers", 2)
+
+    async def run():
+        hashes = await asyncio.gather(*(password_pool.ahash_password(f"secret{i}") for i in range(4)))
+        checks = await asyncio.gather(
+            password_pool.averify_password("secret0", hashes[0]),
+            password_pool.averify_password("wrong", hashes[1]),
+        )
+        return hashes, checks
+
+    try:
+        hashes, checks = asyncio.run(run())
+        assert password_pool.get_password_pool() is not None
+    finally:
+        password_pool.close_password_pool()
+    assert len(set(hashes)) == 4 and verify_password("secret3", hashes[3])
+    assert checks == [True, False]
+    assert password_pool.password_pool_stats()["in_flight"] == 0
+
+
+def test_register_and_login_run_off_loop(client, monkeypatch):
+    monkeypatch.setattr(password_pool.settings, "password_pool_workers", 0)
+    r = client.post("/api/v1/auth/register", json={"email": "a@example.com", "password": "pw123456", "name": "A"})
+    assert r.status_code == 200
+    assert client.post("/api/v1/auth/register", json={"email": "a@example.com", "password": "x"}).status_code == 400
+    assert client.post("/api/v1/auth/login", json={"email": "a@example.com", "password": "pw123456"}).json()["access_token"]
+    assert client.post("/api/v1/auth/login", json={"email": "a@example.com", "password": "nope"}).status_code == 401
+    assert client.post("/api/v1/auth/login", json={"email": "b@example.com", "password": "nope"}).status_code == 401
+
+
+def test_admission_limit_sheds_load(client, monkeypatch):
+    monkeypatch.setattr(password_pool.settings, "password_pool_workers", 0)
+    client.post("/api/v1/auth/register", json={"email": "a@example.com", "password": "pw123456"})
+    monkeypatch.setattr(password_pool.settings, "password_max_in_flight", 0)
+    r = client.post("/api/v1/auth/login", json={"email": "a@example.com", "password": "pw123456"})
+    assert r.status_code == 503 and r.headers["retry-after"] == "1"
+
+    monkeypatch.setattr(password_pool.settings, "password_max_in_flight", 2)
+
+    async def flood():
+        return await asyncio.gather(
+            *(password_pool.ahash_password("pw") for _ in range(5)), return_exceptions=True
+        )
+
+    results = asyncio.run(flood())
+    assert sum(isinstance(r, password_pool.PasswordPoolBusy) for r in results) == 3
+    assert password_pool.password_pool_stats()["rejected"] >= 4
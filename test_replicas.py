@@ -0,0 +1,147 @@
+"""
+Tests for read-replica routing, replica fallback and read-your-writes pinning
+"""
+
+import json
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+import app.database.database as database
+from app.api.ai import router as ai_router
+from app.api.deps import WRITE_COOKIE
+from app.api.diagnostics import router as diagnostics_router
+from app.api.farming import router as farming_router
+from app.database.database import Base, ReplicaSet, make_engine
+from app.database.models import MarketPrice, User, WeatherAlert
+from app.services.auth_service import create_access_token
+
+
+def _seed(engine, title):
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([User(email="a@example.com", name="A"), User(email="b@example.com", name="B")])
+        db.add(WeatherAlert(user_id=None, title=title, severity="low", message="m"))
+        db.commit()
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch):
+    """Primary plus two replicas (SQLite files told apart by their alert title)."""
+    engines = {name: make_engine(f"sqlite:///{tmp_path / name}.db") for name in ("primary", "r1", "r2")}
+    for name, engine in engines.items():
+        _seed(engine, name)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engines["primary"], autoflush=False, autocommit=False))
+    monkeypatch.setattr(database, "replicas", ReplicaSet([engines["r1"], engines["r2"]], retry_s=60))
+    monkeypatch.setattr(database.settings, "db_diagnostics", True)
+
+    app = FastAPI()
+    app.include_router(farming_router, prefix="/api/v1")
+    app.include_router(ai_router, prefix="/api/v1")
+    app.include_router(diagnostics_router, prefix="/api/v1")
+    with TestClient(app) as client:
+        yield client, engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+def _served_by(client, **headers):
+    return client.get("/api/v1/farming/weather/alerts", headers=headers).json()[0]["title"]
+
+
+def test_reads_round_robin_over_replicas(cluster):
+    client, _ = cluster
+    served = [_served_by(client) for _ in range(4)]
+    assert sorted(served) == ["r1", "r1", "r2", "r2"] and served[0] != served[1]
+    stats = client.get("/api/v1/diagnostics/db/pool").json()
+    assert [r["reads"] for r in stats["replicas"]] == [2, 2]
+    assert stats["primary_fallbacks"] == 0
+
+
+def test_unhealthy_replica_is_benched_then_primary_fallback(cluster, tmp_path, monkeypatch):
+    client, engines = cluster
+    broken = make_engine(f"sqlite:///{tmp_path / 'missing' / 'r3.db'}")
+    replicas = ReplicaSet([broken, engines["r2"]], retry_s=60)
+    monkeypatch.setattr(database, "replicas", replicas)
+    assert {_served_by(client) for _ in range(4)} == {"r2"}
+    assert replicas.failures == [1, 0]  # benched after the first failure, not retried every request
+
+    monkeypatch.setattr(database, "replicas", ReplicaSet([broken], retry_s=60))
+    assert _served_by(client) == "primary"
+    assert database.replicas.fallbacks == 1
+    assert client.get("/api/v1/diagnostics/db/pool").json()["replicas"][0]["healthy"] is False
+
+
+def test_reads_follow_own_writes_to_primary(cluster):
+    client, _ = cluster
+    writer = {"Authorization": f"Bearer {create_access_token('1')}"}
+    other = {"Authorization": f"Bearer {create_access_token('2')}"}
+    r = client.post("/api/v1/farming/weather/alerts", json={"title": "mine", "severity": "high", "message": "m", "scope": "user"}, headers=writer)
+    assert r.status_code == 200 and WRITE_COOKIE in r.cookies
+
+    # The writer sees their alert straight away; others keep reading replicas
+    mine = client.get("/api/v1/farming/weather/alerts/my", headers=writer).json()
+    assert [a["title"] for a in mine] == ["mine", "primary"]
+    with TestClient(client.app) as elsewhere:
+        assert {_served_by(elsewhere, **other) for _ in range(2)} == {"r1", "r2"}
+
+    client.cookies.set(WRITE_COOKIE, str(time.time() - 60))  # window elapsed
+    assert _served_by(client, **writer) in ("r1", "r2")
+
+
+def test_pin_travels_with_the_client_not_the_process(cluster):
+    client, _ = cluster
+    writer = {"Authorization": f"Bearer {create_access_token('1')}"}
+    r = client.post("/api/v1/farming/weather/alerts", json={"title": "mine", "severity": "high", "message": "m", "scope": "user"}, headers=writer)
+    # A worker that did not take the write still routes the follow-up read to the primary
+    with TestClient(client.app, cookies={WRITE_COOKIE: r.cookies[WRITE_COOKIE]}) as other_worker:
+        assert _served_by(other_worker) == "mine"  # only the primary has it
+    with TestClient(client.app, cookies={WRITE_COOKIE: "garbage"}) as forged:
+        assert _served_by(forged) in ("r1", "r2")
+
+
+def test_reads_without_writes_do_not_pin(cluster):
+    client, _ = cluster
+    reader = {"Authorization": f"Bearer {create_access_token('1')}"}
+    r = client.get("/api/v1/farming/soil/tests", headers=reader)
+    assert r.status_code == 200 and WRITE_COOKIE not in r.cookies
+
+
+def test_export_streams_from_a_replica(cluster):
+    client, engines = cluster
+    for name, engine in engines.items():
+        with sessionmaker(bind=engine)() as db:
+            db.add(MarketPrice(crop="Wheat", crop_key="wheat", mandi=name, price_per_quintal=2000))
+            db.commit()
+
+    def exported_from(c):
+        return c.get("/api/v1/ai/mandi-rates/export").text.splitlines()[0]
+
+    assert sorted(json.loads(exported_from(client))["mandi"] for _ in range(2)) == ["r1", "r2"]
+    with TestClient(client.app, cookies={WRITE_COOKIE: str(time.time())}) as writer:
+        assert json.loads(exported_from(writer))["mandi"] == "primary"
+
+
+def test_seeding_read_routes_write_to_the_primary(cluster):
+    client, engines = cluster
+    r = client.get("/api/v1/farming/market/prices")
+    assert r.status_code == 200 and len(r.json()) == 12
+
+    def count(engine, table):
+        with engine.connect() as conn:
+            return conn.exec_driver_sql(f"SELECT count(*) FROM {table}").scalar()
+
+    assert count(engines["primary"], "market_prices") == 12
+    assert count(engines["primary"], "market_price_rollups") > 0
+    assert count(engines["r1"], "market_prices") == count(engines["r2"], "market_prices") == 0
+
+
+def test_routing_adds_no_authorization_parameters(cluster):
+    client, _ = cluster
+    paths = client.get("/openapi.json").json()["paths"]
+    assert "parameters" not in paths["/api/v1/farming/weather/alerts"]["get"]
+    assert "parameters" not in paths["/api/v1/farming/market/trends"]["get"]
+    assert not hasattr(database, "Header") and not hasattr(database, "decode_claims")
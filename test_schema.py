@@ -0,0 +1,83 @@
+"""
+Tests for Alembic-managed schema creation and the startup revision check
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import inspect
+from sqlalchemy.orm import sessionmaker
+
+import app.database.models  # noqa: F401
+from app.database.database import Base, make_engine
+from app.database.models import MarketPrice, MarketPriceRollup
+from app.database.schema import SchemaOutOfDate, alembic_config, head_revision, upgrade_schema, verify_schema
+from app.services.market_data import market_trends, rebuild_rollups, rollup_trends
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'farm.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_builds_the_model_schema(engine):
+    with pytest.raises(SchemaOutOfDate):
+        verify_schema(engine)
+    assert upgrade_schema(engine) == head_revision()
+    assert verify_schema(engine) == head_revision()
+    with engine.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), Base.metadata) == []
+    assert upgrade_schema(engine) == head_revision()  # idempotent
+
+
+def test_head_revision_matches_alembic():
+    from alembic.script import ScriptDirectory
+
+    assert head_revision() == ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def test_upgrade_adopts_a_legacy_create_all_database(engine):
+    legacy = [t for name, t in Base.metadata.tables.items() if name not in ("market_prices", "market_price_rollups")]
+    Base.metadata.create_all(bind=engine, tables=legacy)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE market_prices (id INTEGER PRIMARY KEY, crop VARCHAR, mandi VARCHAR, price_per_quintal FLOAT, date DATETIME)"
+        )
+        conn.exec_driver_sql("INSERT INTO market_prices (crop, mandi, price_per_quintal) VALUES (' Rice', 'Kolkata', 2300)")
+        for i in range(14):
+            conn.exec_driver_sql(
+                "INSERT INTO market_prices (crop, mandi, price_per_quintal) VALUES (?, ?, ?)",
+                ("Wheat" if i % 2 else "Maize", f"Mandi{i % 3}" if i % 5 else None, 2000 + 25 * i),
+            )
+
+    assert upgrade_schema(engine) == head_revision()
+    insp = inspect(engine)
+    assert "market_price_rollups" in insp.get_table_names()
+    assert {ix.name for ix in MarketPrice.__table__.indexes} <= {ix["name"] for ix in insp.get_indexes("market_prices")}
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT crop_key FROM market_prices ORDER BY id").scalar() == "rice"
+    with sessionmaker(bind=engine)() as db:
+        trends = rollup_trends(db)
+        assert [t["crop"] for t in trends] == [" Rice", "Maize", "Wheat"]
+        assert trends == market_trends(db)
+        backfilled = {(r.crop, r.mandi): (r.window, r.total_count) for r in db.query(MarketPriceRollup)}
+        rebuild_rollups(db)
+        assert {(r.crop, r.mandi): (r.window, r.total_count) for r in db.query(MarketPriceRollup)} == backfilled
+
+
+def test_importing_routers_runs_no_ddl(tmp_path):
+    db_file = tmp_path / "cold.db"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_file}"}
+    code = "import sys, app.api.auth, app.api.farming, app.api.ai, app.database.schema; assert 'alembic' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    engine = make_engine(env["DATABASE_URL"])
+    try:
+        assert inspect(engine).get_table_names() == []
+    finally:
+        engine.dispose()